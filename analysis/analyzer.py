@@ -1,19 +1,28 @@
 """
     A grammar analyser for the bnf grammar.
+
+    The analysis runs on the GrammarIR of the rules. Terminals, including EOF,
+    are bit positions, so FIRST, FOLLOW and PREDICT sets are stored as integer
+    bitsets indexed by non-terminal or rule id. Nullable, FIRST and FOLLOW are
+    each solved with a worklist over the dependencies between non-terminals:
+    a non-terminal is only revisited when one of the sets it depends on has
+    grown. The public accessors return the sets as sets of terminal names,
+    converted from the bitsets on first use.
+
+    Only the rules reachable from the start symbol, by default the
+    non-terminal of the first rule, are analysed; the others are not part of
+    its language and are not numbered, nor checked for ambiguity. Every rule
+    is still checked for undefined non-terminals, which is a single pass.
 """
+from typing import Optional
 from def_parser.parser import Rule, Terminal, NonTerminal
-from def_parser.lexer import Token
-
-
-class UndefinedNonTerminal(Exception):
-    def __init__(self, symbol: Token, rule: Rule) -> None:
-        self._symbol = symbol
-        self._rule = rule
-        super().__init__(f"Undefined non-terminal '{symbol.value}' in rule '{rule.id}'")
+from analysis.ir import GrammarIR, UndefinedNonTerminal, reachable
 
 
 class Analyzer:
-    def __init__(self, rules: list[Rule]) -> None:
+    def __init__(self, rules: list[Rule], start: Optional[str] = None) -> None:
+        self._start = start if start is not None else rules[0].id
+        rules = reachable(rules, self._start)
         self._rules = rules
         self._non_terminals: set[str] = set()
         self._terminals: set[str] = set()
@@ -25,12 +34,14 @@ class Analyzer:
         self._ambiguous: dict[str, set[Rule]] = {}
 
         self._init_sets()
-        self._verify()
-        self._init_dicts()
-
-        self._compute_nullable()
-        self._compute_first()
-        self._compute_follow()
+        self._ir = GrammarIR(rules, self._start)
+        self._rule_ids: dict[Rule, int] | None = None
+
+        self.nullable_ids = self._compute_nullable()
+        self.first_bits = self._compute_first()
+        self.follow_bits = self._compute_follow()
+        self.predict_bits: list[int] = []
+        self.predict_non_term_bits: list[int] = []
         self._compute_predict()
 
     def _init_sets(self) -> None:
@@ -40,87 +51,125 @@ class Analyzer:
                 if isinstance(symbol, Terminal):
                     self._terminals.add(symbol.id)
 
-    def _verify(self) -> None:
-        for rule in self._rules:
-            for symbol in rule.production:
-                if isinstance(symbol, NonTerminal):
-                    if symbol.id not in self._non_terminals:
-                        raise UndefinedNonTerminal(symbol.name, rule)
-
-    def _init_dicts(self) -> None:
-        for non_terminal in self._non_terminals:
-            self._nullable[non_terminal] = False
-            self._first[non_terminal] = set()
-            self._follow[non_terminal] = set()
-            self._predict_non_term[non_terminal] = set()
-            self._ambiguous[non_terminal] = set()
-
-        self._follow[self._rules[0].id].add("EOF")
-
-    def _compute_nullable(self) -> None:
-        while True:
-            changed = False
-            for rule in self._rules:
-                if self.nullable(rule.id):
-                    continue
-                for symbol in rule.production:
-                    if isinstance(symbol, NonTerminal):
-                        if not self.nullable(symbol.id):
-                            break
-                    else:
-                        break
-                else:  # no break
-                    self._nullable[rule.id] = True
-                    changed = True
-            if not changed:
-                break
-
-    def _compute_first(self) -> None:
-        while True:
-            changed = False
-            for rule in self._rules:
-                rule_first = self.first_of(rule.production)
-                if len(rule_first - self.first(rule.id)) > 0:
-                    self._first[rule.id].update(rule_first)
-                    changed = True
-            if not changed:
-                break
+    def _compute_nullable(self) -> list[bool]:
+        """
+        Count the symbols of every rule that are not known to be nullable. A rule
+        with a terminal can never reach zero. When a non-terminal becomes
+        nullable, only the rules that use it are updated.
+        """
+        ir = self._ir
+        nullable = [False] * len(ir.non_terminals)
+        pending: list[int] = []
+        uses: list[list[int]] = [[] for _ in ir.non_terminals]
+        worklist: list[int] = []
+        for idx, production in enumerate(ir.productions):
+            pending.append(len(production))
+            for symbol in production:
+                if symbol >= 0:
+                    uses[symbol].append(idx)
+            if not production:
+                worklist.append(ir.lhs[idx])
+
+        while worklist:
+            non_terminal = worklist.pop()
+            if nullable[non_terminal]:
+                continue
+            nullable[non_terminal] = True
+            for idx in uses[non_terminal]:
+                pending[idx] -= 1
+                if pending[idx] == 0 and not nullable[ir.lhs[idx]]:
+                    worklist.append(ir.lhs[idx])
+
+        for name, non_terminal in ir.non_terminal_ids.items():
+            self._nullable[name] = nullable[non_terminal]
+        return nullable
+
+    def _propagate(self, sets: list[int], edges: list[set[int]]) -> None:
+        """Grow sets until sets[target] contains sets[source] for every edge source -> target."""
+        worklist = [idx for idx, bits in enumerate(sets) if bits]
+        queued = [bool(bits) for bits in sets]
+        while worklist:
+            source = worklist.pop()
+            queued[source] = False
+            bits = sets[source]
+            for target in edges[source]:
+                merged = sets[target] | bits
+                if merged != sets[target]:
+                    sets[target] = merged
+                    if not queued[target]:
+                        queued[target] = True
+                        worklist.append(target)
+
+    def _compute_first(self) -> list[int]:
+        ir, nullable = self._ir, self.nullable_ids
+        first = [0] * len(ir.non_terminals)
+        edges: list[set[int]] = [set() for _ in ir.non_terminals]
+        for lhs, production in zip(ir.lhs, ir.productions):
+            for symbol in production:
+                if symbol < 0:
+                    first[lhs] |= 1 << ~symbol
+                    break
+                edges[symbol].add(lhs)
+                if not nullable[symbol]:
+                    break
+        self._propagate(first, edges)
+        return first
 
-    def _compute_follow(self) -> None:
-        while True:
-            changed = False
-            for rule in self._rules:
-                if not rule.production:
+    def _compute_follow(self) -> list[int]:
+        """
+        Scan every production once from right to left, keeping the FIRST set of
+        the suffix and whether it is nullable. A non-terminal followed by a
+        nullable suffix inherits the FOLLOW set of the rule's non-terminal.
+        """
+        ir, nullable, first = self._ir, self.nullable_ids, self.first_bits
+        follow = [0] * len(ir.non_terminals)
+        follow[ir.start] = 1 << ir.eof
+        edges: list[set[int]] = [set() for _ in ir.non_terminals]
+        for lhs, production in zip(ir.lhs, ir.productions):
+            suffix_first = 0
+            suffix_nullable = True
+            for symbol in reversed(production):
+                if symbol < 0:
+                    suffix_first = 1 << ~symbol
+                    suffix_nullable = False
                     continue
-                for idx, symbol in enumerate(rule.production):
-                    if isinstance(symbol, Terminal):
-                        continue
-                    follow = set()
-                    if idx < len(rule.production) - 1:
-                        follow.update(self.first_of(rule.production[idx + 1 :]))
-                        if self.is_nullable(rule.production[idx + 1 :]):
-                            follow.update(self.follow(rule.id))
-                    else:
-                        follow.update(self.follow(rule.id))
-
-                    if len(follow - self.follow(symbol.id)) > 0:
-                        self._follow[symbol.id].update(follow)
-                        changed = True
-            if not changed:
-                break
+                follow[symbol] |= suffix_first
+                if suffix_nullable:
+                    edges[lhs].add(symbol)
+                if nullable[symbol]:
+                    suffix_first |= first[symbol]
+                else:
+                    suffix_first = first[symbol]
+                    suffix_nullable = False
+        self._propagate(follow, edges)
+        return follow
 
     def _compute_predict(self) -> None:
-        for rule in self._rules:
-            self._predict[rule] = self.first_of(rule.production)
-            if self.is_nullable(rule.production):
-                self._predict[rule].update(self.follow(rule.id))
+        ir, nullable = self._ir, self.nullable_ids
+        first, follow = self.first_bits, self.follow_bits
+        predict = self.predict_bits
+        for lhs, production in zip(ir.lhs, ir.productions):
+            bits = 0
+            for symbol in production:
+                if symbol < 0:
+                    bits |= 1 << ~symbol
+                    break
+                bits |= first[symbol]
+                if not nullable[symbol]:
+                    break
+            else:  # no break, the production is nullable
+                bits |= follow[lhs]
+            predict.append(bits)
 
         for non_terminal in self.non_terminals:
-            for rule in self.rules(non_terminal):
-                predict = self.predict_rule(rule)
-                if len(predict.intersection(self.predict_non_term(non_terminal))) > 0:
-                    self._ambiguous[non_terminal].add(rule)
-                self._predict_non_term[non_terminal].update(predict)
+            self._ambiguous[non_terminal] = set()
+        for non_terminal, rules in enumerate(ir.rules_of):
+            seen = 0
+            for rule in rules:
+                if predict[rule] & seen:
+                    self._ambiguous[ir.non_terminals[non_terminal]].add(ir.rules[rule])
+                seen |= predict[rule]
+            self.predict_non_term_bits.append(seen)
 
     def is_nullable(self, prod: tuple[Terminal | NonTerminal]) -> bool:
         for symbol in prod:
@@ -144,33 +193,56 @@ class Analyzer:
         return first
 
     def first(self, non_terminal: str) -> set[str]:
+        if non_terminal not in self._first:
+            bits = self.first_bits[self._ir.non_terminal_ids[non_terminal]]
+            self._first[non_terminal] = self._ir.terminal_set(bits)
         return self._first[non_terminal]
 
     def follow(self, non_terminal: str) -> set[str]:
+        if non_terminal not in self._follow:
+            bits = self.follow_bits[self._ir.non_terminal_ids[non_terminal]]
+            self._follow[non_terminal] = self._ir.terminal_set(bits)
         return self._follow[non_terminal]
 
     def nullable(self, non_terminal: str) -> bool:
         return self._nullable[non_terminal]
 
     def predict_rule(self, rule: Rule) -> set[str]:
+        if rule not in self._predict:
+            if self._rule_ids is None:
+                self._rule_ids = {rule: idx for idx, rule in enumerate(self._rules)}
+            bits = self.predict_bits[self._rule_ids[rule]]
+            self._predict[rule] = self._ir.terminal_set(bits)
         return self._predict[rule]
 
     def predict_non_term(self, non_terminal: str) -> set[str]:
+        if non_terminal not in self._predict_non_term:
+            bits = self.predict_non_term_bits[self._ir.non_terminal_ids[non_terminal]]
+            self._predict_non_term[non_terminal] = self._ir.terminal_set(bits)
         return self._predict_non_term[non_terminal]
 
     def rules(self, non_terminal: str) -> list[Rule]:
-        return [rule for rule in self._rules if rule.id == non_terminal]
+        ir = self._ir
+        return [ir.rules[idx] for idx in ir.rules_of[ir.non_terminal_ids[non_terminal]]]
 
     def is_ambiguous(self) -> bool:
         return any(self._ambiguous.values())
-    
+
     def ambiguous(self) -> dict[str, set[Rule]]:
         return self._ambiguous
 
+    @property
+    def ir(self) -> GrammarIR:
+        return self._ir
+
     @property
     def non_terminals(self) -> set[str]:
         return self._non_terminals
 
+    @property
+    def terminals(self) -> set[str]:
+        return self._terminals
+
     @property
     def start(self) -> str:
-        return self._rules[0].id
+        return self._start
@@ -0,0 +1,114 @@
+"""
+    A persistent on-disk cache for analyzed grammars.
+
+    Entries are keyed by a hash of the grammar text, the start symbol, the
+    tool version, the format version and the sources of the analysis and
+    def_parser packages, whose objects are pickled, so a changed grammar or
+    a changed analysis never sees a stale entry, even if nobody bumped a
+    version. Each file starts with a magic header followed by a pickled
+    payload that repeats the format version and key; anything that does not
+    match is treated as a miss and removed.
+
+    A hit skips reading the grammar file and analysing it. The dispatch
+    table is not stored: it is built from the analysis when a parse first
+    needs it, which costs less than unpickling it would.
+
+    Entries are written to a temporary file and renamed into place, so
+    concurrent workers never read a partially written entry. The cache
+    unpickles its files and must only point at a trusted directory.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Optional
+import def_parser
+from def_parser.parser import Rule
+import analysis
+from analysis.analyzer import Analyzer
+
+TOOL_VERSION = "0.1.0"
+FORMAT_VERSION = 5
+MAGIC = b"BNFCACHE"
+
+_sources: Optional[str] = None
+
+
+def _sources_hash() -> str:
+    """Return a hash of the modules of the packages whose objects are cached, tests left out."""
+    global _sources
+    if _sources is None:
+        digest = hashlib.sha256()
+        for package in (analysis, def_parser):
+            directory = os.path.dirname(package.__file__)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".py") and not name.startswith("test_"):
+                    with open(os.path.join(directory, name), "rb") as file:
+                        digest.update(f"{package.__name__}/{name}\0".encode())
+                        digest.update(file.read())
+        _sources = digest.hexdigest()
+    return _sources
+
+
+class AnalysisCache:
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+
+    def key(self, grammar: str, start: Optional[str] = None) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{TOOL_VERSION}\0{FORMAT_VERSION}\0{_sources_hash()}\0{start or ''}\0".encode())
+        digest.update(grammar.encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.analysis")
+
+    def load(
+        self, grammar: str, start: Optional[str] = None
+    ) -> tuple[list[Rule], Analyzer] | None:
+        """Return the cached rules and analysis of the grammar, or None on a miss."""
+        key = self.key(grammar, start)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        try:
+            if not data.startswith(MAGIC):
+                raise ValueError("bad magic")
+            payload = pickle.loads(data[len(MAGIC) :])
+            if payload["format"] != FORMAT_VERSION or payload["key"] != key:
+                raise ValueError("stale entry")
+            return payload["rules"], payload["analysis"]
+        except Exception:
+            self._discard(path)
+            return None
+
+    def store(
+        self, grammar: str, rules: list[Rule], analysis: Analyzer, start: Optional[str] = None
+    ) -> None:
+        key = self.key(grammar, start)
+        payload = {
+            "format": FORMAT_VERSION,
+            "key": key,
+            "rules": rules,
+            "analysis": analysis,
+        }
+        os.makedirs(self._directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(MAGIC)
+                pickle.dump(payload, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            self._discard(tmp)
+            raise
+
+    def _discard(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
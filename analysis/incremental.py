@@ -0,0 +1,366 @@
+"""
+    An analysis of a grammar that is edited one rule at a time.
+
+    IncrementalAnalyzer answers the same questions as Analyzer, and its
+    answers are always those of an Analyzer built from its current rules, but
+    add_rule and remove_rule only update what the edit can affect.
+
+    Like Analyzer it only analyses the rules reachable from the start symbol;
+    the others are kept and join the analysis when an edit makes them
+    reachable. Terminals are bit positions in integer bitsets, numbered in
+    order of appearance with EOF first, and rules are numbered by slots in
+    grammar order, so a rule that is added goes after every other rule.
+
+    Adding a rule can only make the sets grow, so the sets are grown from
+    their current values: nullable and FIRST from the rule's non-terminal up
+    through the non-terminals that use it, FOLLOW down from the non-terminals
+    whose contributions changed, each only as far as a set actually changes.
+    Removing a rule can make sets shrink. The sets of the non-terminals that
+    may depend on the removed rule are reset and solved again, while all other
+    sets stay fixed. PREDICT sets and the ambiguity report are then
+    recomputed for the rules whose inputs changed.
+
+    Undefined non-terminals are not an error while editing; they have no
+    rules and undefined() lists them. An Analyzer of the same rules would
+    raise UndefinedNonTerminal.
+"""
+from typing import Optional, Union
+from def_parser.parser import Rule, Terminal, NonTerminal
+from analysis.ir import EOF, terminal_set
+
+# A symbol of a production: a non-terminal by name or a terminal ~bit.
+Symbol = Union[str, int]
+
+
+class IncrementalAnalyzer:
+    def __init__(self, rules: list[Rule], start: Optional[str] = None) -> None:
+        if start is None:
+            if not rules:
+                raise ValueError("A start symbol is needed for an empty grammar")
+            start = rules[0].id
+        self._start = start
+        self._bits: dict[str, int] = {EOF: 0}
+        self._names: list[str] = [EOF]
+
+        self._rules: dict[int, Rule] = {}
+        self._lhs: dict[int, str] = {}
+        self._productions: dict[int, tuple[Symbol, ...]] = {}
+        self._slots_of: dict[Rule, list[int]] = {}
+        self._next = 0
+        # Slots in grammar order per non-terminal, reachable or not.
+        self._rules_of: dict[str, list[int]] = {}
+
+        # The analysis of the reachable rules.
+        self._reachable: set[str] = {start}
+        self._uses: dict[str, set[int]] = {}
+        self._terminal_counts: dict[str, int] = {}
+        self._nullable: dict[str, bool] = {start: False}
+        self._first: dict[str, int] = {start: 0}
+        self._follow: dict[str, int] = {start: 1}
+        self._predict: dict[int, int] = {}
+        self._predict_non_term: dict[str, int] = {}
+        self._ambiguous: dict[str, set[Rule]] = {}
+
+        for rule in rules:
+            self._store(rule)
+        self._grow(self._activate({start}))
+
+    def add_rule(self, rule: Rule) -> None:
+        """Add a rule after all others and update the analysis."""
+        slot = self._store(rule)
+        if rule.id not in self._reachable:
+            return
+        new = {
+            symbol
+            for symbol in self._productions[slot]
+            if isinstance(symbol, str) and symbol not in self._reachable
+        }
+        self._grow([slot] + self._activate(new))
+
+    def remove_rule(self, rule: Rule) -> None:
+        """Remove the first rule equal to rule and update the analysis."""
+        slots = self._slots_of.get(rule)
+        if not slots:
+            raise ValueError(f"Rule {rule} is not in the grammar")
+        slot = slots.pop(0)
+        if not slots:
+            del self._slots_of[rule]
+        lhs = self._lhs[slot]
+        self._rules_of[lhs].remove(slot)
+        if lhs not in self._reachable:
+            self._forget(slot)
+            return
+
+        reachable = self._reach()
+        removed = [slot] + [
+            other
+            for name in self._reachable - reachable
+            for other in self._rules_of.get(name, [])
+        ]
+        self._shrink(removed)
+        self._forget(slot)
+        for name in self._reachable - reachable:
+            for table in (self._nullable, self._first, self._follow, self._predict_non_term):
+                table.pop(name, None)
+            self._ambiguous.pop(name, None)
+        self._reachable = reachable
+
+    def _store(self, rule: Rule) -> int:
+        slot = self._next
+        self._next += 1
+        self._rules[slot] = rule
+        self._lhs[slot] = rule.id
+        self._productions[slot] = tuple(self._symbol(symbol) for symbol in rule.production)
+        self._slots_of.setdefault(rule, []).append(slot)
+        self._rules_of.setdefault(rule.id, []).append(slot)
+        return slot
+
+    def _forget(self, slot: int) -> None:
+        del self._rules[slot], self._lhs[slot], self._productions[slot]
+
+    def _symbol(self, symbol: Union[Terminal, NonTerminal]) -> Symbol:
+        if isinstance(symbol, NonTerminal):
+            return symbol.id
+        if symbol.id not in self._bits:
+            self._bits[symbol.id] = len(self._names)
+            self._names.append(symbol.id)
+        return ~self._bits[symbol.id]
+
+    def _activate(self, names: set[str]) -> list[int]:
+        """Make names and everything they reach reachable, returning the slots of their rules."""
+        slots: list[int] = []
+        worklist = list(names)
+        self._reachable |= names
+        while worklist:
+            name = worklist.pop()
+            self._nullable.setdefault(name, False)
+            self._first.setdefault(name, 0)
+            self._follow.setdefault(name, 0)
+            for slot in self._rules_of.get(name, []):
+                slots.append(slot)
+                for symbol in self._productions[slot]:
+                    if isinstance(symbol, str) and symbol not in self._reachable:
+                        self._reachable.add(symbol)
+                        worklist.append(symbol)
+        return slots
+
+    def _reach(self) -> set[str]:
+        """Return the non-terminals reachable from the start symbol."""
+        reachable = {self._start}
+        worklist = [self._start]
+        while worklist:
+            for slot in self._rules_of.get(worklist.pop(), []):
+                for symbol in self._productions[slot]:
+                    if isinstance(symbol, str) and symbol not in reachable:
+                        reachable.add(symbol)
+                        worklist.append(symbol)
+        return reachable
+
+    def _grow(self, added: list[int]) -> None:
+        for slot in added:
+            self._link(slot, 1)
+        self._update(added, shrink=False)
+
+    def _shrink(self, removed: list[int]) -> None:
+        for slot in removed:
+            self._link(slot, -1)
+        self._update(removed, shrink=True)
+        for slot in removed:
+            self._predict.pop(slot, None)
+
+    def _link(self, slot: int, delta: int) -> None:
+        """Add the uses and terminals of a rule to the analysis, or take them out."""
+        for symbol in self._productions[slot]:
+            if isinstance(symbol, str):
+                uses = self._uses.setdefault(symbol, set())
+                if delta > 0:
+                    uses.add(slot)
+                else:
+                    uses.discard(slot)
+            else:
+                name = self._names[~symbol]
+                count = self._terminal_counts.get(name, 0) + delta
+                if count:
+                    self._terminal_counts[name] = count
+                else:
+                    del self._terminal_counts[name]
+
+    def _users(self, names: set[str]) -> set[str]:
+        """Return names and every non-terminal whose rules use one of them, transitively."""
+        closure = set(names)
+        worklist = list(names)
+        while worklist:
+            for slot in self._uses.get(worklist.pop(), ()):
+                lhs = self._lhs[slot]
+                if lhs not in closure:
+                    closure.add(lhs)
+                    worklist.append(lhs)
+        return closure
+
+    def _prefix(self, symbols: tuple[Symbol, ...]) -> tuple[int, bool]:
+        """Return the FIRST set of symbols and whether they are nullable."""
+        bits = 0
+        for symbol in symbols:
+            if not isinstance(symbol, str):
+                return bits | 1 << ~symbol, False
+            bits |= self._first[symbol]
+            if not self._nullable[symbol]:
+                return bits, False
+        return bits, True
+
+    def _followers(self, slot: int) -> list[str]:
+        """Return the non-terminals of a rule followed by a nullable suffix."""
+        followers = []
+        for symbol in reversed(self._productions[slot]):
+            if not isinstance(symbol, str):
+                break
+            followers.append(symbol)
+            if not self._nullable[symbol]:
+                break
+        return followers
+
+    def _update(self, slots: list[int], shrink: bool) -> None:
+        changed = {self._lhs[slot] for slot in slots}
+
+        # Nullable and FIRST flow from a non-terminal to the non-terminals using it.
+        old: dict[str, tuple[bool, int]] = {}
+        region = self._users(changed) if shrink else None
+        if region is not None:
+            for name in region:
+                old[name] = (self._nullable[name], self._first[name])
+                self._nullable[name], self._first[name] = False, 0
+        worklist = list(region if region is not None else changed)
+        while worklist:
+            name = worklist.pop()
+            nullable, first = False, 0
+            for slot in self._rules_of.get(name, []):
+                bits, empty = self._prefix(self._productions[slot])
+                first |= bits
+                nullable = nullable or empty
+            if (nullable, first) == (self._nullable[name], self._first[name]):
+                continue
+            old.setdefault(name, (self._nullable[name], self._first[name]))
+            self._nullable[name], self._first[name] = nullable, first
+            for slot in self._uses.get(name, ()):
+                lhs = self._lhs[slot]
+                if region is None or lhs in region:
+                    worklist.append(lhs)
+        grown = {
+            name for name, value in old.items() if value != (self._nullable[name], self._first[name])
+        }
+
+        # FOLLOW flows from a non-terminal to the non-terminals that end its rules.
+        seeds = {
+            symbol for slot in slots for symbol in self._productions[slot] if isinstance(symbol, str)
+        }
+        for name in grown:
+            for slot in self._uses.get(name, ()):
+                production = self._productions[slot]
+                last = len(production) - 1 - production[::-1].index(name)
+                seeds.update(symbol for symbol in production[:last] if isinstance(symbol, str))
+        old_follow: dict[str, int] = {}
+        region = None
+        if shrink:
+            region = set(seeds)
+            worklist = list(seeds)
+            while worklist:
+                for slot in self._rules_of.get(worklist.pop(), []):
+                    for symbol in self._followers(slot):
+                        if symbol not in region:
+                            region.add(symbol)
+                            worklist.append(symbol)
+            for name in region:
+                old_follow[name] = self._follow[name]
+                self._follow[name] = 0
+        worklist = list(region if region is not None else seeds)
+        while worklist:
+            name = worklist.pop()
+            follow = 1 if name == self._start else 0
+            for slot in self._uses.get(name, ()):
+                production = self._productions[slot]
+                for idx, symbol in enumerate(production):
+                    if symbol == name:
+                        bits, empty = self._prefix(production[idx + 1 :])
+                        follow |= bits
+                        if empty:
+                            follow |= self._follow[self._lhs[slot]]
+            if follow == self._follow[name]:
+                continue
+            old_follow.setdefault(name, self._follow[name])
+            self._follow[name] = follow
+            for slot in self._rules_of.get(name, []):
+                for symbol in self._followers(slot):
+                    if region is None or symbol in region:
+                        worklist.append(symbol)
+
+        # PREDICT of the rules whose symbols or non-terminal changed, then the report.
+        stale = set() if shrink else set(slots)
+        for name in grown:
+            stale.update(self._uses.get(name, ()))
+            stale.update(self._rules_of.get(name, []))
+        for name, follow in old_follow.items():
+            if follow != self._follow[name]:
+                stale.update(self._rules_of.get(name, []))
+        for slot in stale:
+            bits, empty = self._prefix(self._productions[slot])
+            self._predict[slot] = bits | self._follow[self._lhs[slot]] if empty else bits
+            changed.add(self._lhs[slot])
+
+        for name in changed:
+            seen = 0
+            ambiguous = set()
+            for slot in self._rules_of.get(name, []):
+                if self._predict[slot] & seen:
+                    ambiguous.add(self._rules[slot])
+                seen |= self._predict[slot]
+            self._predict_non_term[name] = seen
+            self._ambiguous[name] = ambiguous
+
+    def _terminal_set(self, bits: int) -> set[str]:
+        return terminal_set(self._names, bits)
+
+    def is_nullable(self, prod: tuple[Terminal | NonTerminal]) -> bool:
+        return self._prefix(tuple(self._symbol(symbol) for symbol in prod))[1]
+
+    def first_of(self, prod: tuple[Terminal | NonTerminal]) -> set[str]:
+        return self._terminal_set(self._prefix(tuple(self._symbol(symbol) for symbol in prod))[0])
+
+    def first(self, non_terminal: str) -> set[str]:
+        return self._terminal_set(self._first[non_terminal])
+
+    def follow(self, non_terminal: str) -> set[str]:
+        return self._terminal_set(self._follow[non_terminal])
+
+    def nullable(self, non_terminal: str) -> bool:
+        return self._nullable[non_terminal]
+
+    def predict_rule(self, rule: Rule) -> set[str]:
+        return self._terminal_set(self._predict[self._slots_of[rule][-1]])
+
+    def predict_non_term(self, non_terminal: str) -> set[str]:
+        return self._terminal_set(self._predict_non_term[non_terminal])
+
+    def rules(self, non_terminal: str) -> list[Rule]:
+        return [self._rules[slot] for slot in self._rules_of.get(non_terminal, [])]
+
+    def is_ambiguous(self) -> bool:
+        return any(self._ambiguous.values())
+
+    def ambiguous(self) -> dict[str, set[Rule]]:
+        return {name: rules for name, rules in self._ambiguous.items() if name in self.non_terminals}
+
+    def undefined(self) -> set[str]:
+        """Return the reachable non-terminals without rules."""
+        return {name for name in self._reachable if not self._rules_of.get(name)}
+
+    @property
+    def non_terminals(self) -> set[str]:
+        return {name for name in self._reachable if self._rules_of.get(name)}
+
+    @property
+    def terminals(self) -> set[str]:
+        return set(self._terminal_counts)
+
+    @property
+    def start(self) -> str:
+        return self._start
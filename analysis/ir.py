@@ -0,0 +1,116 @@
+"""
+    The compiled form of a grammar shared by the analyzer and the parser.
+
+    Non-terminals are numbered in order of their first rule and terminals in
+    sorted order, with EOF among them. Rules are numbered in grammar order and
+    their productions are tuples of ints: a non-negative symbol is a
+    non-terminal id, a negative symbol ~t is the terminal with id t. The rules
+    of every non-terminal are listed by index, so the inner loops of the
+    analysis and the parser only index lists and compare ints.
+
+    The Rule objects, with their source tokens, are kept alongside by index
+    for diagnostics and for the Rule based public interfaces.
+
+    Any non-terminal can be the start symbol. reachable selects the rules a
+    start symbol can reach, so a large grammar can be compiled one
+    sub-language at a time.
+"""
+from typing import Optional
+from def_parser.parser import Rule, Terminal, NonTerminal
+from def_parser.lexer import Token
+from def_parser.source import Located
+
+EOF = "EOF"
+
+
+class UndefinedNonTerminal(Located, Exception):
+    def __init__(self, symbol: Token, rule: Rule) -> None:
+        self._symbol = symbol
+        self._rule = rule
+        super().__init__(f"Undefined non-terminal '{symbol.value}' in rule '{rule.id}'")
+
+    @property
+    def offset(self) -> int:
+        return self._symbol.pos
+
+
+def terminal_set(names: list[str], bits: int) -> set[str]:
+    """Return the names of the terminals in a bitset, visiting only its set bits."""
+    terminals = set()
+    while bits:
+        low = bits & -bits
+        terminals.add(names[low.bit_length() - 1])
+        bits ^= low
+    return terminals
+
+
+def reachable(rules: list[Rule], start: str) -> list[Rule]:
+    """
+    Return the rules of the non-terminals reachable from start, in grammar
+    order. Every rule is checked for undefined non-terminals first, reachable
+    or not, so whether a grammar is valid does not depend on its start symbol.
+    """
+    rules_of: dict[str, list[Rule]] = {}
+    for rule in rules:
+        rules_of.setdefault(rule.id, []).append(rule)
+    if start not in rules_of:
+        raise ValueError(f"Unknown start symbol '{start}'")
+    for rule in rules:
+        for symbol in rule.production:
+            if isinstance(symbol, NonTerminal) and symbol.id not in rules_of:
+                raise UndefinedNonTerminal(symbol.name, rule)
+
+    seen = {start}
+    worklist = [start]
+    while worklist:
+        for rule in rules_of[worklist.pop()]:
+            for symbol in rule.production:
+                if isinstance(symbol, NonTerminal) and symbol.id not in seen:
+                    seen.add(symbol.id)
+                    worklist.append(symbol.id)
+    if len(seen) == len(rules_of):
+        return rules
+    return [rule for rule in rules if rule.id in seen]
+
+
+class GrammarIR:
+    def __init__(self, rules: list[Rule], start: Optional[str] = None) -> None:
+        self.rules: list[Rule] = rules
+        self.non_terminals: list[str] = []
+        self.non_terminal_ids: dict[str, int] = {}
+        self.rules_of: list[list[int]] = []
+        for idx, rule in enumerate(rules):
+            if rule.id not in self.non_terminal_ids:
+                self.non_terminal_ids[rule.id] = len(self.non_terminals)
+                self.non_terminals.append(rule.id)
+                self.rules_of.append([])
+            self.rules_of[self.non_terminal_ids[rule.id]].append(idx)
+
+        terminals = {EOF}
+        for rule in rules:
+            for symbol in rule.production:
+                if isinstance(symbol, Terminal):
+                    terminals.add(symbol.id)
+                elif symbol.id not in self.non_terminal_ids:
+                    raise UndefinedNonTerminal(symbol.name, rule)
+        self.terminals: list[str] = sorted(terminals)
+        self.terminal_ids: dict[str, int] = {
+            name: idx for idx, name in enumerate(self.terminals)
+        }
+        self.eof: int = self.terminal_ids[EOF]
+        self.start: int = 0 if start is None else self.non_terminal_ids[start]
+
+        self.lhs: list[int] = [self.non_terminal_ids[rule.id] for rule in rules]
+        self.productions: list[tuple[int, ...]] = [
+            tuple(self._symbol(symbol) for symbol in rule.production) for rule in rules
+        ]
+        self.positions: list[int] = [rule.name.pos for rule in rules]
+
+    def _symbol(self, symbol: Terminal | NonTerminal) -> int:
+        if isinstance(symbol, Terminal):
+            return ~self.terminal_ids[symbol.id]
+        return self.non_terminal_ids[symbol.id]
+
+    def terminal_set(self, bits: int) -> set[str]:
+        """Return the names of the terminals in a bitset indexed by terminal id."""
+        return terminal_set(self.terminals, bits)
@@ -53,4 +53,46 @@ def test_predict_sets2() -> None:
     assert analyzer.predict_rule(rules[3]) == {"b"}
     assert analyzer.predict_rule(rules[4]) == {"c", "EOF"}
     assert analyzer.predict_rule(rules[5]) == {"c"}
-    assert analyzer.predict_rule(rules[6]) == {"EOF"}
\ No newline at end of file
+    assert analyzer.predict_rule(rules[6]) == {"EOF"}
+
+def test_long_nullable_chain() -> None:
+    size = 2000
+    grammar = " ".join(f"r{idx}: r{idx + 1} 'a{idx}' | ! ;" for idx in range(size))
+    rules = parse(grammar + f" r{size}: 'x' | ! ;")
+    analyzer = Analyzer(rules)
+    assert analyzer.nullable("r0")
+    assert analyzer.first("r0") == {f"a{idx}" for idx in range(size)} | {"x"}
+    assert analyzer.follow(f"r{size}") == {f"a{size - 1}"}
+    assert analyzer.follow("r1") == {"a0"}
+    assert analyzer.predict_rule(rules[1]) == {"EOF"}
+    assert not analyzer.is_ambiguous()
+
+
+def test_ambiguous() -> None:
+    rules = parse("S: A | B ; A: 'a' ; B: 'a' | ! ;")
+    analyzer = Analyzer(rules)
+    assert analyzer.ambiguous()["S"] == {rules[1]}
+    assert analyzer.predict_non_term("S") == {"a", "EOF"}
+
+
+def test_start_symbol() -> None:
+    rules = parse("S: A 'x' ; A: 'a' B | ! ; B: 'b' ; C: 'c' C | A ;")
+    analyzer = Analyzer(rules)
+    assert analyzer.non_terminals == {"S", "A", "B"}
+    assert analyzer.ir.non_terminals == ["S", "A", "B"]
+
+    analyzer = Analyzer(rules, start="A")
+    assert analyzer.start == "A"
+    assert analyzer.non_terminals == {"A", "B"}
+    assert analyzer.follow("A") == {"EOF"}
+    assert analyzer.predict_rule(rules[2]) == {"EOF"}
+    assert Analyzer(rules, start="C").non_terminals == {"C", "A", "B"}
+    with pytest.raises(ValueError):
+        Analyzer(rules, start="D")
+
+
+def test_unreachable_rules_are_checked_for_undefined() -> None:
+    rules = parse("S: 'x' ; C: 'c' C | D ;")
+    for start in ("S", "C"):
+        with pytest.raises(UndefinedNonTerminal):
+            Analyzer(rules, start=start)
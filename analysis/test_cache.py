@@ -0,0 +1,87 @@
+import os
+from analysis import cache as cache_module
+from analysis.cache import AnalysisCache
+from analysis.analyzer import Analyzer
+from def_parser.parser import parse
+from parser.parser import ParseTree, Token, AmbiguousGrammarError
+from parser.test_parser import TestLexer
+from bnf import Grammar
+import pytest
+
+GRAMMAR = "s: 'a' s 'b' | ! ;"
+
+
+def test_cache_roundtrip(tmp_path) -> None:
+    cache = AnalysisCache(str(tmp_path))
+    assert cache.load(GRAMMAR) is None
+    rules = parse(GRAMMAR)
+    cache.store(GRAMMAR, rules, Analyzer(rules))
+    cached_rules, analysis = cache.load(GRAMMAR)
+    assert cached_rules == rules
+    assert analysis.predict_rule(cached_rules[0]) == {"a"}
+    assert analysis.predict_rule(cached_rules[1]) == {"b", "EOF"}
+    assert analysis.rules("s")[0] is cached_rules[0]
+
+
+def test_cache_invalidation(tmp_path, monkeypatch) -> None:
+    cache = AnalysisCache(str(tmp_path))
+    rules = parse(GRAMMAR)
+    cache.store(GRAMMAR, rules, Analyzer(rules))
+    assert cache.load("s: 'a' ;") is None
+
+    monkeypatch.setattr(cache_module, "TOOL_VERSION", "999")
+    assert cache.load(GRAMMAR) is None
+    monkeypatch.undo()
+    assert cache.load(GRAMMAR) is not None
+
+    # A changed analysis misses entries stored by the old one, whatever the versions say.
+    monkeypatch.setattr(cache_module, "_sources", "changed")
+    assert cache.load(GRAMMAR) is None
+
+
+def test_cache_corrupt_entry(tmp_path) -> None:
+    cache = AnalysisCache(str(tmp_path))
+    path = tmp_path / f"{cache.key(GRAMMAR)}.analysis"
+    path.write_bytes(b"BNFCACHE garbage")
+    assert cache.load(GRAMMAR) is None
+    assert not path.exists()
+
+
+def test_grammar_uses_cache(tmp_path, monkeypatch) -> None:
+    Grammar(GRAMMAR, cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+
+    def fail(*args) -> None:
+        raise AssertionError("grammar analysed again")
+
+    monkeypatch.setattr("bnf.Analyzer", fail)
+    monkeypatch.setattr("bnf.parse", fail)
+    grammar = Grammar(GRAMMAR, cache_dir=str(tmp_path))
+    assert grammar.parse(TestLexer("ab")) == ParseTree(
+        "s", [Token("a", "a", 0), ParseTree("s", []), Token("b", "b", 1)]
+    )
+
+
+def test_grammar_caches_ambiguity(tmp_path) -> None:
+    for _ in range(2):
+        with pytest.raises(AmbiguousGrammarError):
+            Grammar("s: 'a' | 'a' 'b' ;", cache_dir=str(tmp_path))
+
+
+def test_cache_key_includes_start(tmp_path) -> None:
+    cache = AnalysisCache(str(tmp_path))
+    rules = parse(GRAMMAR)
+    cache.store(GRAMMAR, rules, Analyzer(rules), "s")
+    assert cache.load(GRAMMAR) is None
+    assert cache.load(GRAMMAR, "s")[1].start == "s"
+
+
+def test_cache_hit_does_not_build_table(tmp_path, monkeypatch) -> None:
+    Grammar(GRAMMAR, cache_dir=str(tmp_path))
+
+    def fail(*args) -> None:
+        raise AssertionError("table built")
+
+    monkeypatch.setattr("parser.parser.ParseTable", fail)
+    grammar = Grammar(GRAMMAR, cache_dir=str(tmp_path))
+    assert grammar.start == "s"
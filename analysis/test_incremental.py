@@ -0,0 +1,89 @@
+import random
+from def_parser.parser import parse, Rule
+from analysis.analyzer import Analyzer
+from analysis.incremental import IncrementalAnalyzer
+import pytest
+
+
+def assert_same(incremental: IncrementalAnalyzer, rules: list[Rule]) -> None:
+    full = Analyzer(rules, incremental.start)
+    assert incremental.non_terminals == full.non_terminals
+    assert incremental.terminals == full.terminals
+    for name in full.non_terminals:
+        assert incremental.nullable(name) == full.nullable(name)
+        assert incremental.first(name) == full.first(name)
+        assert incremental.follow(name) == full.follow(name)
+        assert incremental.predict_non_term(name) == full.predict_non_term(name)
+    for rule in full.ir.rules:
+        assert incremental.predict_rule(rule) == full.predict_rule(rule)
+    assert incremental.ambiguous() == full.ambiguous()
+
+
+def test_add_and_remove() -> None:
+    rules = parse("e: p et; et: '+' p et | !; p: '1';")
+    analyzer = IncrementalAnalyzer(rules)
+    assert analyzer.first("e") == {"1"}
+
+    group = parse("p: '(' e ')' ;")[0]
+    analyzer.add_rule(group)
+    assert analyzer.first("e") == {"1", "("}
+    assert analyzer.follow("e") == {"EOF", ")"}
+    assert_same(analyzer, rules + [group])
+
+    analyzer.remove_rule(group)
+    assert analyzer.follow("e") == {"EOF"}
+    assert_same(analyzer, rules)
+    with pytest.raises(ValueError):
+        analyzer.remove_rule(group)
+
+
+def test_ambiguity_and_reachability() -> None:
+    rules = parse("s: 'a' ; t: 'a' 'b' ;")
+    analyzer = IncrementalAnalyzer(rules)
+    assert analyzer.non_terminals == {"s"}
+
+    link = parse("s: t ;")[0]
+    analyzer.add_rule(link)
+    assert analyzer.non_terminals == {"s", "t"}
+    assert analyzer.ambiguous()["s"] == {link}
+
+    analyzer.remove_rule(link)
+    assert analyzer.non_terminals == {"s"}
+    assert not analyzer.is_ambiguous()
+
+
+def test_undefined() -> None:
+    analyzer = IncrementalAnalyzer(parse("s: 'a' u ;"))
+    assert analyzer.undefined() == {"u"}
+    analyzer.add_rule(parse("u: 'b' | ! ;")[0])
+    assert analyzer.undefined() == set()
+    assert analyzer.follow("u") == {"EOF"}
+
+
+def test_matches_full_analysis() -> None:
+    names = "ABCDE"
+    for seed in range(200):
+        rng = random.Random(seed)
+
+        def rule() -> Rule:
+            symbols = [
+                rng.choice(names) if rng.random() < 0.5 else f"'{rng.choice('xyz')}'"
+                for _ in range(rng.randint(0, 3))
+            ]
+            return parse(f"{rng.choice(names)}: {' '.join(symbols) or '!'} ;")[0]
+
+        base = [parse(f"{name}: 'x' ;")[0] for name in names]
+        rules = base + [rule() for _ in range(4)]
+        analyzer = IncrementalAnalyzer(rules)
+        assert_same(analyzer, rules)
+        for _ in range(10):
+            removable = [rule for rule in rules if rule not in base]
+            if removable and rng.random() < 0.5:
+                edit = rng.choice(removable)
+                analyzer.remove_rule(edit)
+                rules.remove(edit)
+            else:
+                edit = rule()
+                analyzer.add_rule(edit)
+                rules.append(edit)
+            assert_same(analyzer, rules)
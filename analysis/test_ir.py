@@ -0,0 +1,29 @@
+from analysis.ir import GrammarIR, UndefinedNonTerminal, reachable
+from def_parser.parser import parse
+import pytest
+
+
+def test_ir() -> None:
+    rules = parse("e: p et; et: '+' p et | !; p: '1';")
+    ir = GrammarIR(rules)
+    assert ir.non_terminals == ["e", "et", "p"]
+    assert ir.terminals == ["+", "1", "EOF"]
+    assert ir.lhs == [0, 1, 1, 2]
+    assert ir.productions == [(2, 1), (~0, 2, 1), (), (~1,)]
+    assert ir.rules_of == [[0], [1, 2], [3]]
+    assert ir.positions == [0, 9, 9, 27]
+    assert ir.terminal_set(0b101) == {"+", "EOF"}
+
+
+def test_ir_undefined() -> None:
+    with pytest.raises(UndefinedNonTerminal):
+        GrammarIR(parse("S: 'a' | B ;"))
+
+
+def test_reachable() -> None:
+    rules = parse("e: p; p: '1' | '(' e ')'; q: '2';")
+    assert reachable(rules, "p") == rules[:3]
+    assert reachable(rules, "q") == rules[3:]
+    ir = GrammarIR(reachable(rules, "p"), "p")
+    assert ir.non_terminals == ["e", "p"]
+    assert ir.start == 1
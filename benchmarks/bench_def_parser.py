@@ -0,0 +1,32 @@
+"""
+    Measure the grammar-file front end on a synthetic grammar with 100k rules.
+
+    Run with: python -m benchmarks.bench_def_parser
+"""
+import time
+from def_parser.parser import parse
+
+RULES = 100_000
+
+
+def grammar(rules: int = RULES) -> str:
+    lines = ["# synthetic grammar", "~# generated by bench_def_parser #~"]
+    for idx in range(rules):
+        lines.append(f"rule_{idx}: 'kw_{idx}' rule_{idx + 1} | 'alt {idx}' ; # rule {idx}")
+    lines.append(f"rule_{rules}: ! ;")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    text = grammar()
+    start = time.perf_counter()
+    rules = parse(text)
+    elapsed = time.perf_counter() - start
+    print(f"grammar size: {len(text) / 1e6:8.2f} MB")
+    print(f"rules:        {len(rules):8d}")
+    print(f"parse time:   {elapsed:8.2f} s")
+    print(f"throughput:   {len(text) / elapsed / 1e6:8.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
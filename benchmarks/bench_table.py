@@ -0,0 +1,50 @@
+"""
+    Compare the table-driven parser against the interpreted one, and the
+    driver it runs against the recursive descent over the same table.
+
+    The grammar has one statement rule per keyword, so the interpreted parser
+    scans hundreds of rules for every decision.
+
+    Run with: python -m benchmarks.bench_table
+"""
+from benchmarks.common import CharLexer, best_of
+from def_parser.parser import parse
+from parser.parser import Parser
+
+KEYWORDS = 300
+STATEMENTS = 200
+
+
+def keyword(idx: int) -> str:
+    return chr(0x100 + idx)
+
+
+def grammar() -> str:
+    stmts = " | ".join(f"k{idx}" for idx in range(KEYWORDS))
+    keywords = " ".join(f"k{idx}: '{keyword(idx)}' ';' ;" for idx in range(KEYWORDS))
+    return f"prog: stmt prog | ! ; stmt: {stmts} ; {keywords}"
+
+
+def source() -> str:
+    return "".join(keyword(idx % KEYWORDS) + ";" for idx in range(STATEMENTS))
+
+
+def main() -> None:
+    rules = parse(grammar())
+    text = source()
+    compiled = Parser(rules)
+    interpreted = Parser(rules, compiled=False)
+    assert compiled.parse(CharLexer(text)) == interpreted.parse(CharLexer(text))
+    assert compiled.parse(CharLexer(text)) == compiled.parse_recursive(CharLexer(text))
+
+    slow = best_of(lambda: interpreted.parse(CharLexer(text)))
+    recursive = best_of(lambda: compiled.parse_recursive(CharLexer(text)))
+    fast = best_of(lambda: compiled.parse(CharLexer(text)))
+    print(f"interpreted: {slow * 1000:8.2f} ms")
+    print(f"recursive:   {recursive * 1000:8.2f} ms")
+    print(f"compiled:    {fast * 1000:8.2f} ms")
+    print(f"speedup:     {slow / fast:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
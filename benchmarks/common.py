@@ -0,0 +1,39 @@
+"""
+    Shared helpers for the benchmark scripts.
+"""
+import time
+from typing import Callable
+from parser.parser import Lexer, Token, UnexpectedToken
+
+
+class CharLexer(Lexer):
+    """A lexer that turns every character of the input into a token."""
+
+    def __init__(self, string: str) -> None:
+        self._string = string
+        self._pos = 0
+
+    def peek(self) -> Token:
+        if self._pos >= len(self._string):
+            return Token("EOF", "", self._pos)
+        return Token(self._string[self._pos], self._string[self._pos], self._pos)
+
+    def has(self, tokens: set[str]) -> bool:
+        return self.peek().type in tokens
+
+    def expect(self, tokens: set[str]) -> Token:
+        token = self.peek()
+        if token.type not in tokens:
+            raise UnexpectedToken(token, tokens)
+        self._pos += 1
+        return token
+
+
+def best_of(func: Callable[[], object], repeat: int = 5) -> float:
+    """Return the fastest wall time of several runs of func, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
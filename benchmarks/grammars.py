@@ -0,0 +1,171 @@
+"""
+    Grammars and input generators for the benchmark suite.
+
+    Every benchmark is a grammar, the lexer patterns for its token classes and
+    a function that generates an input of roughly the requested number of
+    tokens. The realistic grammars are an arithmetic language, JSON and a
+    small configuration language; the synthetic ones scale one dimension of
+    the grammar or the input at a time.
+"""
+import random
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    grammar: str
+    source: Callable[[int], str]
+    size: int
+    patterns: dict[str, str] = field(default_factory=dict)
+    skip: tuple[str, ...] = (r"\s+",)
+
+
+ARITHMETIC = """
+expr: term expr_tail ;
+expr_tail: '+' term expr_tail | '-' term expr_tail | ! ;
+term: factor term_tail ;
+term_tail: '*' factor term_tail | '/' factor term_tail | ! ;
+factor: 'num' | '(' expr ')' | '-' factor ;
+"""
+
+
+def arithmetic(tokens: int) -> str:
+    rng = random.Random(1)
+    parts: list[str] = []
+
+    def expr(budget: int) -> None:
+        factor(budget // 2)
+        while budget > 0:
+            parts.append(rng.choice("+-*/"))
+            factor(min(budget, 8))
+            budget -= 10
+
+    def factor(budget: int) -> None:
+        if budget > 20 and rng.random() < 0.3:
+            parts.append("(")
+            expr(budget // 2)
+            parts.append(")")
+        else:
+            parts.append(str(rng.randrange(1000)))
+
+    while len(parts) < tokens:
+        if parts:
+            parts.append("+")
+        expr(200)
+    return " ".join(parts)
+
+
+JSON = """
+value: object | array | 'string' | 'number' | 'true' | 'false' | 'null' ;
+object: '{' members '}' ;
+members: pair members_tail | ! ;
+members_tail: ',' pair members_tail | ! ;
+pair: 'string' ':' value ;
+array: '[' elements ']' ;
+elements: value elements_tail | ! ;
+elements_tail: ',' value elements_tail | ! ;
+"""
+
+JSON_PATTERNS = {
+    "string": r'"(?:[^"\\]|\\.)*"',
+    "number": r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?",
+}
+
+
+def json(tokens: int) -> str:
+    rng = random.Random(2)
+    records = []
+    for idx in range(max(1, tokens // 30)):
+        records.append(
+            f'{{"id": {idx}, "name": "item {idx}", "price": {rng.random() * 100:.2f}, '
+            f'"tags": ["a", "b", "c"], "active": {rng.choice(["true", "false"])}, '
+            f'"parent": null}}'
+        )
+    return "[" + ",\n".join(records) + "]"
+
+
+CONFIG = """
+config: section config | ! ;
+section: '[' 'name' ']' entries ;
+entries: entry entries | ! ;
+entry: 'name' '=' val ';' ;
+val: 'string' | 'number' | 'name' | '{' list '}' ;
+list: val list_tail | ! ;
+list_tail: ',' val list_tail | ! ;
+"""
+
+CONFIG_PATTERNS = {
+    "name": r"[A-Za-z_][A-Za-z0-9_.]*",
+    "string": r'"[^"\n]*"',
+    "number": r"\d+",
+}
+
+
+def config(tokens: int) -> str:
+    lines = []
+    for section in range(max(1, tokens // 40)):
+        lines.append(f"[section_{section}]  # generated")
+        lines.append(f'host = "host{section}.example.com";')
+        lines.append(f"port = {8000 + section};")
+        lines.append(f"parent = section_{max(0, section - 1)}.host;")
+        lines.append(f'tags = {{"web", "db", {section}, nested.name}};')
+    return "\n".join(lines)
+
+
+DEEP = "s: '(' s ')' | 'x' ;"
+
+
+def deep(tokens: int) -> str:
+    depth = tokens // 2
+    return "(" * depth + "x" + ")" * depth
+
+
+WIDE_ALTERNATIVES = 500
+
+
+def wide_grammar(alternatives: int = WIDE_ALTERNATIVES) -> str:
+    items = " | ".join(f"'k{idx}'" for idx in range(alternatives))
+    return f"s: item s | ! ; item: {items} ;"
+
+
+def wide(tokens: int) -> str:
+    rng = random.Random(3)
+    return " ".join(f"k{rng.randrange(WIDE_ALTERNATIVES)}" for _ in range(tokens))
+
+
+LIST = "list: 'x' tail ; tail: ',' 'x' tail | ! ;"
+
+
+def long_list(tokens: int) -> str:
+    return ",".join("x" * ((tokens + 1) // 2))
+
+
+MANY_RULES = 2000
+
+
+def many_rules_grammar(rules: int = MANY_RULES) -> str:
+    lines = [f"r{idx}: 'kw{idx}' r{idx + 1} | 'alt{idx}' ;" for idx in range(rules)]
+    lines.append(f"r{rules}: ! ;")
+    return "\n".join(lines)
+
+
+def many_rules(tokens: int) -> str:
+    count = min(tokens, MANY_RULES) - 1
+    return " ".join(f"kw{idx}" for idx in range(count)) + f" alt{count}"
+
+
+def benchmarks(scale: float = 1.0) -> list[Benchmark]:
+    def size(tokens: int) -> int:
+        return max(10, int(tokens * scale))
+
+    return [
+        Benchmark("arithmetic", ARITHMETIC, arithmetic, size(100_000), {"num": r"\d+"}),
+        Benchmark("json", JSON, json, size(100_000), JSON_PATTERNS),
+        Benchmark("config", CONFIG, config, size(100_000), CONFIG_PATTERNS, (r"\s+", r"#[^\n]*")),
+        Benchmark("deep_nesting", DEEP, deep, size(100_000)),
+        Benchmark("wide_alternatives", wide_grammar(), wide, size(50_000)),
+        Benchmark("long_list", LIST, long_list, size(200_000)),
+        Benchmark("many_rules", many_rules_grammar(), many_rules, size(2_000)),
+    ]
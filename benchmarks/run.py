@@ -0,0 +1,157 @@
+"""
+    The benchmark suite.
+
+    For every benchmark in benchmarks.grammars this measures the stages of a
+    parse separately: reading the grammar file, analysing it, building the
+    parser, lexing the input and parsing it, both from a Lexer and from bulk
+    token chunks. Each stage reports its best wall time over several runs,
+    tokens per second for the input stages and the peak memory allocated
+    while it ran, measured with tracemalloc in a separate run so tracing does
+    not distort the timings.
+
+    Results are written as JSON. Given a baseline file from an earlier run,
+    every stage that got slower by more than the threshold is reported as a
+    regression and the exit status is 1.
+
+    Run with: python -m benchmarks.run [--output FILE] [--baseline FILE]
+                                       [--threshold 0.1] [--scale 1.0]
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable
+from analysis.analyzer import Analyzer
+from benchmarks.common import best_of
+from benchmarks.grammars import Benchmark, benchmarks
+from def_parser.parser import parse
+from parser.lexer import LexerSpec
+from parser.parser import Parser
+from parser.table import ParseTable
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def count_tokens(spec: LexerSpec, text: str) -> int:
+    lexer = spec.lexer(text)
+    count = 0
+    while lexer.peek().type != "EOF":
+        lexer.expect({lexer.peek().type})
+        count += 1
+    return count
+
+
+def run_benchmark(benchmark: Benchmark, repeat: int) -> dict[str, dict[str, float]]:
+    text = benchmark.source(benchmark.size)
+    rules = parse(benchmark.grammar)
+    analysis = Analyzer(rules)
+    parser = Parser(rules, analysis=analysis)
+    spec = LexerSpec(analysis.terminals, benchmark.skip, benchmark.patterns)
+    tokens = count_tokens(spec, text)
+
+    stages: dict[str, tuple[Callable[[], object], bool]] = {
+        "grammar": (lambda: parse(benchmark.grammar), False),
+        "analysis": (lambda: Analyzer(rules), False),
+        "table": (lambda: ParseTable(analysis), False),
+        "lex": (lambda: count_tokens(spec, text), True),
+        "parse": (lambda: parser.parse_iterative(spec.lexer(text)), True),
+        "bulk": (lambda: parser.parse_tokens(spec.lexer(text)), True),
+    }
+    results = {}
+    for name, (func, per_token) in stages.items():
+        seconds = best_of(func, repeat)
+        result = {"seconds": seconds, "peak_bytes": peak_memory(func)}
+        if per_token:
+            result["tokens"] = tokens
+            result["tokens_per_second"] = tokens / seconds if seconds else 0.0
+        results[name] = result
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, dict[str, float]]],
+    baseline: dict[str, dict[str, dict[str, float]]],
+    threshold: float,
+) -> list[str]:
+    """Return a message for every stage that is slower than its baseline by more than threshold."""
+    regressions = []
+    for name, stages in results.items():
+        for stage, result in stages.items():
+            before = baseline.get(name, {}).get(stage)
+            if before is None or before["seconds"] <= 0:
+                continue
+            ratio = result["seconds"] / before["seconds"]
+            if ratio > 1 + threshold:
+                regressions.append(
+                    f"{name}/{stage}: {before['seconds'] * 1000:.2f} ms -> "
+                    f"{result['seconds'] * 1000:.2f} ms ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def report(results: dict[str, dict[str, dict[str, float]]]) -> None:
+    print(f"{'benchmark':<20}{'stage':<10}{'time (ms)':>12}{'tokens/s':>14}{'peak (KiB)':>12}")
+    for name, stages in results.items():
+        for stage, result in stages.items():
+            rate = result.get("tokens_per_second")
+            rate_text = f"{rate:14.0f}" if rate is not None else f"{'':>14}"
+            print(
+                f"{name:<20}{stage:<10}{result['seconds'] * 1000:12.2f}"
+                f"{rate_text}{result['peak_bytes'] / 1024:12.1f}"
+            )
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    args.add_argument("--output", help="write the results as JSON to this file")
+    args.add_argument("--baseline", help="compare against the results in this JSON file")
+    args.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, 0.1 is 10%%")
+    args.add_argument("--scale", type=float, default=1.0, help="scale the input sizes")
+    args.add_argument("--repeat", type=int, default=3, help="timed runs per stage")
+    args.add_argument("--only", nargs="*", help="names of the benchmarks to run")
+    options = args.parse_args(argv)
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10_000))
+    results = {}
+    for benchmark in benchmarks(options.scale):
+        if options.only and benchmark.name not in options.only:
+            continue
+        results[benchmark.name] = run_benchmark(benchmark, options.repeat)
+    report(results)
+
+    if options.output:
+        document = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "scale": options.scale,
+            },
+            "results": results,
+        }
+        with open(options.output, "w") as file:
+            json.dump(document, file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, options.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,250 @@
-from parser.parser import Parser, Lexer, ParseTree
-from def_parser.parser import parse, Rule
+import asyncio
+import copy
+import hashlib
+import mmap
+import os
+from typing import AsyncIterable, Callable, Iterable, Iterator, Optional, Union
+from parser.parser import Parser, Lexer, ParseTree, Event, UnexpectedToken
+from parser.batch import ParseResult, parse_many
+from parser.cache import ParseCache
+from parser.codegen import generate
+from parser.flat import FlatTree, parse_flat
+from parser.incremental import IncrementalParser
+from parser.parallel import parse_parallel
+from parser.profile import ParseStats, profile_parse
+from parser.push import PushParser, parse_stream
+from parser.shape import Shaping, ShapedParser
+from parser.lexer import LexerSpec, GeneratedLexer, Buffer, DEFAULT_SKIP
+from def_parser.parser import parse, Rule, Terminal
+from def_parser.lexer import UnexpectedCharacter
+from def_parser.source import SourceMap
+from analysis.analyzer import Analyzer
+from analysis.ir import UndefinedNonTerminal
+from analysis.cache import AnalysisCache
+
+
+def _identity(
+    string: str, skip: Iterable[str], patterns: Optional[dict[str, str]], shaping: Optional[Shaping]
+) -> str:
+    """Return a hash of everything that determines the trees a Grammar builds from text."""
+    digest = hashlib.sha256()
+    for part in (string, *sorted(skip), *sorted((patterns or {}).items())):
+        digest.update(f"{part}\0".encode())
+    if shaping is not None:
+        for name, shape in (("", shaping.default), *sorted(shaping.rules.items())):
+            digest.update(f"{name}\0{shape.action}\0{sorted(shape.drop_tokens)}\0".encode())
+    return digest.hexdigest()
+
+
+def _located(source_map: SourceMap, parse: Callable[[], ParseTree]) -> ParseTree:
+    """Run parse and give source_map to the error it raises, or to a new root for the tree it returns."""
+    try:
+        tree = parse()
+    except (UnexpectedToken, UnexpectedCharacter) as error:
+        error.source_map = source_map
+        raise
+    return ParseTree(tree.id, tree.children, source_map)
 
 
 class Grammar:
-    def __init__(self, string: str) -> None:
-        self._rules = parse(string)
-        self._parser = Parser(self._rules)
+    def __init__(
+        self,
+        string: str,
+        cache_dir: str | None = None,
+        skip: Iterable[str] = DEFAULT_SKIP,
+        patterns: Optional[dict[str, str]] = None,
+        shaping: Optional[Shaping] = None,
+        start: Optional[str] = None,
+        parse_cache: Optional[ParseCache] = None,
+    ) -> None:
+        """
+        Only the rules reachable from start, by default the non-terminal of
+        the first rule, are analysed up front; other start symbols are
+        analysed when for_start first asks for them. With a parse_cache,
+        parse returns cached trees for text it has seen before.
+
+        Errors in the grammar, and errors in text or buffers given to parse
+        and parse_file, have a SourceMap for their line and column; so have
+        the trees parse and parse_file return.
+        """
+        self._source_map = SourceMap(string)
+        cache = AnalysisCache(cache_dir) if cache_dir is not None else None
+        cached = cache.load(string, start) if cache is not None else None
+        if cached is not None:
+            self._rules, analysis = cached
+        else:
+            self._rules = parse(string)
+            try:
+                analysis = Analyzer(self._rules, start)
+            except UndefinedNonTerminal as error:
+                error.source_map = self._source_map
+                raise
+            if cache is not None:
+                cache.store(string, self._rules, analysis, start)
+        self._parser = Parser(self._rules, analysis=analysis)
+        self._shaping = shaping
+        self._shaped = ShapedParser(self._parser, shaping) if shaping is not None else None
+        terminals = {
+            symbol.id
+            for rule in self._rules
+            for symbol in rule.production
+            if isinstance(symbol, Terminal)
+        }
+        self._lexer_spec = LexerSpec(terminals, skip, patterns)
+        self._starts: dict[str, Grammar] = {self._parser.start: self}
+        self._parse_cache = parse_cache
+        self._identity = _identity(string, skip, patterns, shaping)
+
+    @property
+    def start(self) -> str:
+        return self._parser.start
+
+    def for_start(self, start: str) -> "Grammar":
+        """
+        Return this grammar with start as its start symbol. It shares the
+        rules and the lexer, and all its methods parse the language of start.
+        """
+        if start not in self._starts:
+            grammar = copy.copy(self)
+            try:
+                grammar._parser = self._parser.for_start(start)
+            except UndefinedNonTerminal as error:
+                error.source_map = self._source_map
+                raise
+            if self._shaping is not None:
+                grammar._shaped = ShapedParser(grammar._parser, self._shaping)
+            self._starts[start] = grammar
+        return self._starts[start]
+
+    @property
+    def _tree_parser(self) -> Union[Parser, ShapedParser]:
+        # The parser whose trees the tree building methods return.
+        return self._shaped if self._shaped is not None else self._parser
+
+    def lexer(self, text: str, pos: int = 0) -> GeneratedLexer:
+        """Return the built-in lexer for this grammar's terminals over text."""
+        return self._lexer_spec.lexer(text, pos)
+
+    def _lexer(self, input: Union[Lexer, str, Buffer]) -> Lexer:
+        if isinstance(input, str):
+            return self._lexer_spec.lexer(input)
+        if isinstance(input, (bytes, bytearray, memoryview, mmap.mmap)):
+            return self._lexer_spec.bytes_lexer(input)
+        return input
     
-    def parse(self, lexer: Lexer) -> ParseTree:
-        return self._parser.parse(lexer)
\ No newline at end of file
+    def parse(self, input: Union[Lexer, str, Buffer], start: Optional[str] = None) -> ParseTree:
+        """
+        Parse a lexer, or a string or utf-8 buffer with the built-in lexer.
+        The tree is shaped by the grammar's shaping, if it has one. start
+        selects another start symbol, see for_start. Text found in the parse
+        cache is neither lexed nor parsed; its trees are frozen and shared.
+        """
+        if start is not None and start != self.start:
+            return self.for_start(start).parse(input)
+        if not isinstance(input, (str, bytes, bytearray, memoryview, mmap.mmap)):
+            return self._parse(input)
+        if self._parse_cache is None or not isinstance(input, str):
+            return _located(SourceMap(input), lambda: self._parse(input))
+        key = self._parse_cache.key(self._identity, self.start, input)
+        source_map = SourceMap(input)
+        tree = self._parse_cache.get(key, source_map)
+        if tree is None:
+            return self._parse_cache.put(key, _located(source_map, lambda: self._parse(input)))
+        return tree
+
+    def _parse(self, input: Union[Lexer, str, Buffer]) -> ParseTree:
+        if self._shaped is not None:
+            return self._shaped.parse(self._lexer(input))
+        if isinstance(input, str):
+            return self._parser.parse_tokens(self._lexer_spec.lexer(input))
+        return self._parser.parse(self._lexer(input))
+
+    def parse_file(self, path: str, encoding: str = "utf-8") -> ParseTree:
+        """
+        Parse a file through a read-only memory map, without decoding it.
+        The tokens of the tree refer to the map, which stays open while they live.
+        """
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                buffer: Buffer = b""
+            else:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        parse = self._shaped.parse if self._shaped is not None else self._parser.parse_iterative
+        return _located(
+            SourceMap(buffer, encoding),
+            lambda: parse(self._lexer_spec.bytes_lexer(buffer, encoding=encoding)),
+        )
+
+    def parse_many(
+        self,
+        inputs: Iterable[object],
+        lexer_factory: Optional[Callable[[object], Lexer]] = None,
+        processes: Optional[int] = None,
+        chunksize: int = 1,
+        ordered: bool = True,
+    ) -> Iterator[ParseResult]:
+        """Parse a batch of inputs over a process pool, see parser.batch.parse_many."""
+        if lexer_factory is None:
+            lexer_factory = self._lexer_spec.lexer
+        return parse_many(self._tree_parser, inputs, lexer_factory, processes, chunksize, ordered)
+
+    def profile(
+        self, input: Union[Lexer, str, Buffer], stats: Optional[ParseStats] = None
+    ) -> tuple[ParseTree, ParseStats]:
+        """Parse the input while recording per non-terminal counts and timings into stats."""
+        stats = stats if stats is not None else ParseStats()
+        return profile_parse(self._tree_parser, self._lexer(input), stats), stats
+
+    def push_parser(self) -> PushParser:
+        """Return a parser that is fed text or tokens as they arrive."""
+        return PushParser(self._tree_parser, self._lexer_spec)
+
+    async def parse_stream(
+        self,
+        stream: Union[asyncio.StreamReader, AsyncIterable[Union[str, bytes]]],
+        encoding: str = "utf-8",
+    ) -> ParseTree:
+        """Parse a stream of text or encoded chunks while it is being read."""
+        return await parse_stream(self._tree_parser, self._lexer_spec, stream, encoding)
+
+    def parse_parallel(
+        self,
+        source: Union[str, os.PathLike],
+        record: str,
+        sync: str,
+        processes: Optional[int] = None,
+        parts: Optional[int] = None,
+    ) -> ParseTree:
+        """
+        Parse text, or a file given by its path, that is a sequence of record
+        non-terminals starting with the sync terminal, on several cores.
+        See parser.parallel.
+        """
+        return parse_parallel(self._tree_parser, self._lexer_spec, source, record, sync, processes, parts)
+
+    def events(self, input: Union[Lexer, str, Buffer]) -> Iterator[Event]:
+        """
+        Parse the input lazily as a stream of ENTER, TOKEN and EXIT events.
+        The events are those of the unshaped tree, whatever the grammar's shaping.
+        """
+        return self._parser.events(self._lexer(input))
+
+    def parse_flat(self, source: str, lexer: Optional[Lexer] = None) -> FlatTree:
+        """
+        Parse the source into a compact array-backed tree. The tree is
+        unshaped, whatever the grammar's shaping.
+        """
+        return parse_flat(self._parser, lexer if lexer is not None else self._lexer(source), source)
+
+    def incremental(
+        self, lexer_factory: Optional[Callable[[str, int], Lexer]] = None
+    ) -> IncrementalParser:
+        """Return a parser that reparses only the damaged region after edits."""
+        return IncrementalParser(self._tree_parser, lexer_factory or self._lexer_spec.lexer)
+
+    def generate(self) -> str:
+        """
+        Return the source of a standalone parser module for the language of
+        this grammar's start symbol, from the analysis it already has.
+        """
+        return generate(self._rules, analysis=self._parser.analysis)
\ No newline at end of file
@@ -7,6 +7,8 @@
         - Pipe          - the pipe symbol
         - Semicolon     - the semicolon symbol
         - Empty         - the empty symbol ('!')
+        - Brackets      - '(' ')' for groups, '[' ']' for optional parts
+                          and '{' '}' for repetitions
 
     Comments and whitespaces are ignored.
 
@@ -17,9 +19,10 @@
     Single-line comments start with a '#' and end with a newline.
     Multi-line comments start with a ~# and end with a #~.
 """
+import re
 from dataclasses import dataclass
 from enum import Enum
-from typing import Callable
+from def_parser.source import Located
 
 
 class TokenType(Enum):
@@ -29,9 +32,47 @@ class TokenType(Enum):
     PIPE = "|"
     SEMICOLON = ";"
     EMPTY = "!"
+    LPAREN = "("
+    RPAREN = ")"
+    LBRACKET = "["
+    RBRACKET = "]"
+    LBRACE = "{"
+    RBRACE = "}"
     EOF = "eof"
 
 
+_PUNCTUATION = {
+    ":": TokenType.COLON,
+    "|": TokenType.PIPE,
+    ";": TokenType.SEMICOLON,
+    "!": TokenType.EMPTY,
+    "(": TokenType.LPAREN,
+    ")": TokenType.RPAREN,
+    "[": TokenType.LBRACKET,
+    "]": TokenType.RBRACKET,
+    "{": TokenType.LBRACE,
+    "}": TokenType.RBRACE,
+}
+
+# Whitespace and comments, then one token. Every token is a named group, so
+# match.lastgroup tells which one matched; it is None for an unexpected character.
+# \w and \s match exactly the characters for which str.isalnum() (or '_')
+# and str.isspace() are true. An unterminated comment or terminal runs to the end.
+_TOKEN = re.compile(
+    r"""
+    (?: \s+ | \#[^\n]* | ~\#(?:.*?\#~|.*) )*
+    (?:
+        (?P<non_terminal> \w+ )
+      | (?P<terminal> '[^']*' )
+      | (?P<unterminated> '.* )
+      | (?P<punctuation> [:|;!()\[\]{}] )
+      | (?P<eof> \Z )
+    )?
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+
 @dataclass(frozen=True, eq=True)
 class Token:
     type: TokenType
@@ -40,105 +81,58 @@ class Token:
     len: int
 
 
-class Chars:
-    def __init__(self, text: str) -> None:
-        self._text = text
-        self._pos = 0
-
-    @property
-    def done(self) -> bool:
-        return self._pos >= len(self._text)
-
-    @property
-    def pos(self) -> int:
-        return self._pos
-
-    def peek(self) -> str:
-        return self._text[self._pos]
-
-    def next(self) -> str:
-        char = self._text[self._pos]
-        self._pos += 1
-        return char
-
-    def has(self, pred: Callable[[str], bool]) -> bool:
-        return not self.done and pred(self.peek())
-
-    def has_str(self, string: str) -> bool:
-        return self._text.startswith(string, self._pos)
-
-    def next_while(self, pred: Callable[[str], bool]) -> str:
-        result = ""
-        while self.has(pred):
-            result += self.next()
-        return result
-
-    def next_str(self, string: str) -> bool:
-        if self.has_str(string):
-            self._pos += len(string)
-            return True
-        return False
-
-    def next_until(self, string: str) -> str:
-        start = self._pos
-        while not self.done and not self.next_str(string):
-            self.next()
-        return self._text[start : self._pos]
-
-
-class UnexpectedCharacter(Exception):
+class UnexpectedCharacter(Located, Exception):
     def __init__(self, char: str, pos: int) -> None:
         self.char = char
         self.pos = pos
         super().__init__(f"Unexpected character '{char}' at position {pos}")
 
+    @property
+    def offset(self) -> int:
+        return self.pos
+
 
-class UnexpectedToken(Exception):
+class UnexpectedToken(Located, Exception):
     def __init__(self, expected: set[TokenType], actual: Token, pos: int) -> None:
         self.expected = expected
         self.actual = actual
         self.pos = pos
         super().__init__(f"Expected {expected} but got {actual} at <{pos}>")
 
+    @property
+    def offset(self) -> int:
+        return self.actual.pos
+
 
 
 class Lexer:
     def __init__(self, string: str) -> None:
-        self._chars: Chars = Chars(string)
+        self._text = string
+        self._pos = 0
         self._peek: Token = self._next_token()
 
-    def _skip(self) -> None:
-        """Skip whitespace and comments."""
-        while True:
-            self._chars.next_while(str.isspace)
-            if self._chars.next_str("#"):
-                self._chars.next_while(lambda c: c != "\n")
-            elif self._chars.next_str("~#"):
-                self._chars.next_until("#~")
-            else:
-                break
-
     def _next_token(self) -> Token:
-        self._skip()
-        if self._chars.done:
-            return Token(TokenType.EOF, "", self._chars.pos, 0)
-        pos = self._chars.pos
-        if self._chars.has(lambda c: c.isalnum() or c == "_"):
-            value = self._chars.next_while(lambda c: c.isalnum() or c == "_")
+        """Skip whitespace and comments and scan the next token with a single match."""
+        text = self._text
+        match = _TOKEN.match(text, self._pos)
+        kind = match.lastgroup
+        if kind is None:
+            raise UnexpectedCharacter(text[match.end()], match.end())
+        pos = match.start(kind)
+        self._pos = match.end()
+        if kind == "non_terminal":
+            value = match.group(kind)
             return Token(TokenType.NON_TERMINAL, value, pos, len(value))
-        if self._chars.next_str("'"):
-            value = self._chars.next_until("'")[:-1]  # remove trailing '
+        if kind == "terminal":
+            value = match.group(kind)[1:-1]
             return Token(TokenType.TERMINAL, value, pos, len(value) + 2)
-        if self._chars.next_str(":"):
-            return Token(TokenType.COLON, ":", pos, 1)
-        if self._chars.next_str("|"):
-            return Token(TokenType.PIPE, "|", pos, 1)
-        if self._chars.next_str(";"):
-            return Token(TokenType.SEMICOLON, ";", pos, 1)
-        if self._chars.next_str("!"):
-            return Token(TokenType.EMPTY, "!", pos, 1)
-
-        raise UnexpectedCharacter(self._chars.peek(), self._chars.pos)
+        if kind == "unterminated":
+            value = match.group(kind)[1:-1]  # no closing ', drop the last character
+            return Token(TokenType.TERMINAL, value, pos, len(value) + 2)
+        if kind == "eof":
+            return Token(TokenType.EOF, "", pos, 0)
+        char = match.group(kind)
+        return Token(_PUNCTUATION[char], char, pos, 1)
 
     @property
     def eof(self) -> bool:
@@ -148,14 +142,16 @@ class Lexer:
         return self._peek
 
     def next(self) -> Token:
-        token = self.peek()
+        token = self._peek
         self._peek = self._next_token()
         return token
 
     def has(self, types: set[TokenType]) -> bool:
-        return not self.eof and self.peek().type in types
+        return self._peek is not None and self._peek.type in types
 
     def expect(self, types: set[TokenType]) -> Token:
-        if self.has(types):
-            return self.next()
-        raise UnexpectedToken(types, self.peek(), self._chars.pos)
+        token = self._peek
+        if token is not None and token.type in types:
+            self._peek = self._next_token()
+            return token
+        raise UnexpectedToken(types, self.peek(), self._pos)
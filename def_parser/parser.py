@@ -2,13 +2,50 @@
     Parser for bnf grammar files.
     The grammar is:
         - grammar: rule { rule } ;
-        - rule: non-terminal ":" production { "|" production } ";" ;
+        - rule: non-terminal ":" alternatives ";" ;
+        - alternatives: production { "|" production } ;
         - production: term { term } | "!" ;
-        - term: non-terminal | terminal ;
+        - term: non-terminal | terminal | "(" alternatives ")"
+              | "[" alternatives "]" | "{" alternatives "}" ;
+
+    Groups, optional parts and repetitions are rewritten into synthetic
+    rules named after the rule they occur in, '#' and a number, like 'list#1'.
+    Names with a '#' cannot be written in a grammar file, so they never clash
+    with a user's rule. For a group the synthetic rule has the alternatives
+    of the group; an optional part adds the one empty alternative, and a
+    repetition is a right-recursive rule; empty alternatives written inside
+    either are left out:
+        - [ a | b ]  =>  r#1: a | b | ! ;
+        - { a | b }  =>  r#1: a r#1 | b r#1 | ! ;
+    The parser splices the children of synthetic rules into their parent and
+    runs repetitions as loops, so they never show up in a ParseTree.
 """
-from def_parser.lexer import Lexer, TokenType, Token
+from def_parser.lexer import Lexer, TokenType, Token, UnexpectedCharacter, UnexpectedToken
+from def_parser.source import SourceMap
 from dataclasses import dataclass
 
+_TERM = frozenset({TokenType.NON_TERMINAL, TokenType.TERMINAL})
+_NON_TERMINAL = frozenset({TokenType.NON_TERMINAL})
+_COLON = frozenset({TokenType.COLON})
+_PIPE = frozenset({TokenType.PIPE})
+_SEMICOLON = frozenset({TokenType.SEMICOLON})
+_EMPTY = frozenset({TokenType.EMPTY})
+_EOF = frozenset({TokenType.EOF})
+_OPEN = frozenset({TokenType.LPAREN, TokenType.LBRACKET, TokenType.LBRACE})
+_CLOSE = {
+    TokenType.LPAREN: frozenset({TokenType.RPAREN}),
+    TokenType.LBRACKET: frozenset({TokenType.RBRACKET}),
+    TokenType.LBRACE: frozenset({TokenType.RBRACE}),
+}
+_ITEM = _TERM | _OPEN
+
+SYNTHETIC = "#"
+
+
+def is_synthetic(non_terminal: str) -> bool:
+    """Return True for the name of a rule generated from a group, option or repetition."""
+    return SYNTHETIC in non_terminal
+
 
 @dataclass(frozen=True, eq=True)
 class NonTerminal:
@@ -38,38 +75,82 @@ class Rule:
         return self.name.value
 
 
-def _parse_term(lex: Lexer) -> Terminal | NonTerminal:
-    tok = lex.expect({TokenType.NON_TERMINAL, TokenType.TERMINAL})
+@dataclass
+class _Synthetic:
+    """The synthetic rules generated for one rule of the grammar file."""
+
+    name: Token
+    rules: list[Rule]
+    count: int = 0
+
+    def new_name(self, pos: int) -> Token:
+        self.count += 1
+        return Token(TokenType.NON_TERMINAL, f"{self.name.value}{SYNTHETIC}{self.count}", pos, 1)
+
+
+def _parse_term(lex: Lexer, synthetic: _Synthetic) -> Terminal | NonTerminal:
+    if lex.has(_OPEN):
+        return _parse_nested(lex, synthetic)
+    tok = lex.expect(_TERM)
     if tok.type == TokenType.NON_TERMINAL:
         return NonTerminal(tok)
     return Terminal(tok)
 
 
-def _parse_production(lex: Lexer) -> list[Terminal | NonTerminal]:
-    if lex.has({TokenType.EMPTY}):
-        lex.expect({TokenType.EMPTY})
+def _parse_nested(lex: Lexer, synthetic: _Synthetic) -> NonTerminal:
+    """Parse a group, optional part or repetition into a synthetic rule."""
+    bracket = lex.expect(_OPEN)
+    name = synthetic.new_name(bracket.pos)
+    idx = len(synthetic.rules)
+    productions = _parse_alternatives(lex, synthetic)
+    lex.expect(_CLOSE[bracket.type])
+
+    if bracket.type == TokenType.LBRACE:
+        productions = [prod + [NonTerminal(name)] for prod in productions if prod]
+    elif bracket.type == TokenType.LBRACKET:
+        productions = [prod for prod in productions if prod]
+    if bracket.type != TokenType.LPAREN:
+        productions.append([])
+    synthetic.rules[idx:idx] = [Rule(name, tuple(prod)) for prod in productions]
+    return NonTerminal(name)
+
+
+def _parse_production(lex: Lexer, synthetic: _Synthetic) -> list[Terminal | NonTerminal]:
+    if lex.has(_EMPTY):
+        lex.expect(_EMPTY)
         return []
-    terms: list[Terminal | NonTerminal] = [_parse_term(lex)]
-    while lex.has({TokenType.NON_TERMINAL, TokenType.TERMINAL}):
-        terms.append(_parse_term(lex))
+    terms: list[Terminal | NonTerminal] = [_parse_term(lex, synthetic)]
+    while lex.has(_ITEM):
+        terms.append(_parse_term(lex, synthetic))
     return terms
 
 
+def _parse_alternatives(lex: Lexer, synthetic: _Synthetic) -> list[list[Terminal | NonTerminal]]:
+    productions = [_parse_production(lex, synthetic)]
+    while lex.has(_PIPE):
+        lex.expect(_PIPE)
+        productions.append(_parse_production(lex, synthetic))
+    return productions
+
+
 def _parse_rule(lex: Lexer) -> list[Rule]:
-    name = lex.expect({TokenType.NON_TERMINAL})
-    lex.expect({TokenType.COLON})
-    productions: list[list[Terminal | NonTerminal]] = [_parse_production(lex)]
-    while lex.has({TokenType.PIPE}):
-        lex.expect({TokenType.PIPE})
-        productions.append(_parse_production(lex))
-    lex.expect({TokenType.SEMICOLON})
-    return [Rule(name, tuple(prod)) for prod in productions]
+    name = lex.expect(_NON_TERMINAL)
+    lex.expect(_COLON)
+    synthetic = _Synthetic(name, [])
+    productions = _parse_alternatives(lex, synthetic)
+    lex.expect(_SEMICOLON)
+    return [Rule(name, tuple(prod)) for prod in productions] + synthetic.rules
 
 
 def parse(string: str) -> list[Rule]:
-    lex = Lexer(string)
-    rules: list[Rule] = _parse_rule(lex)
-    while lex.has({TokenType.NON_TERMINAL}):
-        rules.extend(_parse_rule(lex))
-    lex.expect({TokenType.EOF})
+    """Parse a grammar; its syntax errors have a SourceMap of the string."""
+    try:
+        lex = Lexer(string)
+        rules: list[Rule] = _parse_rule(lex)
+        while lex.has(_NON_TERMINAL):
+            rules.extend(_parse_rule(lex))
+        lex.expect(_EOF)
+    except (UnexpectedCharacter, UnexpectedToken) as error:
+        error.source_map = SourceMap(string)
+        raise
     return rules
\ No newline at end of file
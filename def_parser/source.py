@@ -0,0 +1,98 @@
+"""
+    Line and column positions for offsets into a source.
+
+    Tokens and errors only carry absolute offsets. A SourceMap translates
+    them on demand: the offsets at which lines start are found with one scan
+    of the source when the first question is asked, and every question after
+    that is a bisection of that array. Nothing is tracked per token while
+    lexing or parsing.
+
+    A source is text or an encoded buffer; offsets, and so columns, count
+    characters in text and bytes in a buffer. Lines and columns are 1-based.
+
+    Errors raised at an offset in a source are Located: whoever knows the
+    source sets their source_map, and location and snippet answer from it.
+"""
+import re
+from array import array
+from bisect import bisect_right
+from typing import Optional, Union
+
+Source = Union[str, bytes, bytearray, memoryview]
+
+_NEWLINE = re.compile("\n")
+_NEWLINE_BYTES = re.compile(b"\n")
+
+
+class SourceMap:
+    def __init__(self, source: Source, encoding: str = "utf-8") -> None:
+        self.source = source
+        self.encoding = encoding
+        self._starts: Optional[array] = None
+
+    @property
+    def starts(self) -> array:
+        """The offsets at which the lines start, computed on first use."""
+        if self._starts is None:
+            newline = _NEWLINE if isinstance(self.source, str) else _NEWLINE_BYTES
+            self._starts = array("q", [0])
+            self._starts.extend(match.end() for match in newline.finditer(self.source))
+        return self._starts
+
+    @property
+    def lines(self) -> int:
+        return len(self.starts)
+
+    def location(self, offset: int) -> tuple[int, int]:
+        """Return the line and column of an offset."""
+        starts = self.starts
+        line = bisect_right(starts, offset)
+        return line, offset - starts[line - 1] + 1
+
+    def line(self, number: int) -> str:
+        """Return the text of a line without its line break."""
+        starts = self.starts
+        start = starts[number - 1]
+        end = starts[number] if number < len(starts) else len(self.source)
+        text = self.source[start:end]
+        if not isinstance(text, str):
+            text = str(text, self.encoding, "replace")
+        return text.rstrip("\r\n")
+
+    def snippet(self, start: int, end: Optional[int] = None) -> str:
+        """
+        Return the lines of the span from start to end, numbered, with the
+        part of the span on its first line marked by carets.
+        """
+        stop = end if end is not None else start + 1
+        first, column = self.location(start)
+        last = self.location(max(start, stop - 1))[0]
+        text = self.line(first)
+        length = max(1, min(stop - start, len(text) - column + 1))
+        width = len(str(last))
+        lines = [f"{first:>{width}} | {text}", f"{'':>{width}} | {' ' * (column - 1)}{'^' * length}"]
+        lines.extend(f"{number:>{width}} | {self.line(number)}" for number in range(first + 1, last + 1))
+        return "\n".join(lines)
+
+
+class Located:
+    """An error at an offset in a source, which may have a SourceMap of that source."""
+
+    source_map: Optional[SourceMap] = None
+
+    @property
+    def offset(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def location(self) -> Optional[tuple[int, int]]:
+        """The line and column of the error, if its source map is known."""
+        if self.source_map is None:
+            return None
+        return self.source_map.location(self.offset)
+
+    def snippet(self) -> Optional[str]:
+        """The line of the error with its offset marked, if its source map is known."""
+        if self.source_map is None:
+            return None
+        return self.source_map.snippet(self.offset)
@@ -0,0 +1,44 @@
+from def_parser.lexer import Lexer, Token, TokenType, UnexpectedCharacter
+import pytest
+
+
+def tokens(string: str) -> list[Token]:
+    lex = Lexer(string)
+    result = [lex.peek()]
+    while lex.peek().type != TokenType.EOF:
+        lex.next()
+        result.append(lex.peek())
+    return result
+
+
+def test_tokens() -> None:
+    assert tokens("S : 'a b' | !;") == [
+        Token(TokenType.NON_TERMINAL, "S", 0, 1),
+        Token(TokenType.COLON, ":", 2, 1),
+        Token(TokenType.TERMINAL, "a b", 4, 5),
+        Token(TokenType.PIPE, "|", 10, 1),
+        Token(TokenType.EMPTY, "!", 12, 1),
+        Token(TokenType.SEMICOLON, ";", 13, 1),
+        Token(TokenType.EOF, "", 14, 0),
+    ]
+
+
+def test_comments() -> None:
+    assert tokens("# line\nA ~# multi\nline #~ B ~# open") == [
+        Token(TokenType.NON_TERMINAL, "A", 7, 1),
+        Token(TokenType.NON_TERMINAL, "B", 26, 1),
+        Token(TokenType.EOF, "", 35, 0),
+    ]
+
+
+def test_unterminated_terminal() -> None:
+    assert tokens("'abc") == [
+        Token(TokenType.TERMINAL, "ab", 0, 4),
+        Token(TokenType.EOF, "", 4, 0),
+    ]
+
+
+def test_unexpected_character() -> None:
+    with pytest.raises(UnexpectedCharacter) as info:
+        tokens("A  ~ B")
+    assert (info.value.char, info.value.pos) == ("~", 3)
@@ -23,3 +23,28 @@ def test_invalid() -> None:
 
     with pytest.raises(UnexpectedToken):
         parse("S: a; |")
+
+
+def test_ebnf_rules() -> None:
+    rules = parse("S: '[' [ x { ',' x } ] ']' | ( 'a' | ! ) ;")
+    assert [(rule.id, [symbol.id for symbol in rule.production]) for rule in rules] == [
+        ("S", ["[", "S#1", "]"]),
+        ("S", ["S#3"]),
+        ("S#1", ["x", "S#2"]),
+        ("S#1", []),
+        ("S#2", [",", "x", "S#2"]),
+        ("S#2", []),
+        ("S#3", ["a"]),
+        ("S#3", []),
+    ]
+    assert rules[2].name == Token(TokenType.NON_TERMINAL, "S#1", 7, 1)
+
+    with pytest.raises(UnexpectedToken):
+        parse("S: [ 'a' ) ;")
+
+
+def test_ebnf_empty_alternatives() -> None:
+    for grammar in ("S: [ 'a' | ! ] ;", "S: { 'a' | ! } ;"):
+        rules = parse(grammar)
+        assert [symbol.id for symbol in rules[-1].production] == []
+        assert sum(not rule.production for rule in rules) == 1
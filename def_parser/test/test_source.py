@@ -0,0 +1,39 @@
+from def_parser.source import SourceMap
+from def_parser.parser import parse
+from def_parser.lexer import UnexpectedToken
+import pytest
+
+TEXT = "first\nsecond line\r\n\nlast"
+
+
+def test_location() -> None:
+    source_map = SourceMap(TEXT)
+    assert source_map.lines == 4
+    assert source_map.location(0) == (1, 1)
+    assert source_map.location(5) == (1, 6)
+    assert source_map.location(6) == (2, 1)
+    assert source_map.location(13) == (2, 8)
+    assert source_map.location(19) == (3, 1)
+    assert source_map.location(20) == (4, 1)
+    assert source_map.location(len(TEXT)) == (4, 5)
+    assert [source_map.line(number) for number in range(1, 5)] == ["first", "second line", "", "last"]
+
+
+def test_bytes() -> None:
+    source_map = SourceMap("ä\nb".encode())
+    assert source_map.location(3) == (2, 1)
+    assert source_map.line(1) == "ä"
+
+
+def test_snippet() -> None:
+    source_map = SourceMap(TEXT)
+    assert source_map.snippet(13, 17) == "2 | second line\n  | " + " " * 7 + "^^^^"
+    assert source_map.snippet(7, 22) == "2 | second line\n  |  ^^^^^^^^^^\n3 | \n4 | last"
+    assert source_map.snippet(len(TEXT)) == "4 | last\n  |     ^"
+
+
+def test_grammar_errors() -> None:
+    with pytest.raises(UnexpectedToken) as error:
+        parse("S: 'a' ;\nB: 'b' 'c'\n")
+    assert error.value.location == (3, 1)
+    assert error.value.snippet() == "3 | \n  | ^"
@@ -0,0 +1,63 @@
+"""
+    Parses batches of independent inputs with one grammar over a process pool.
+
+    The parser, with its analysis and dispatch table, is sent to every worker
+    once when the pool starts. Tasks only carry the inputs, which are turned
+    into lexers in the worker by lexer_factory, so both the inputs and the
+    factory must be picklable. A ShapedParser is sent the same way, and its
+    workers return shaped trees.
+"""
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Callable, Iterable, Iterator, Optional, Union
+from parser.parser import Parser, Lexer, ParseTree
+from parser.shape import ShapedParser
+
+_parser: Union[Parser, ShapedParser, None] = None
+_lexer_factory: Optional[Callable[[object], Lexer]] = None
+
+
+@dataclass(frozen=True)
+class ParseResult:
+    """The outcome of parsing one input. Exactly one of tree and error is set."""
+
+    index: int
+    tree: Optional[ParseTree]
+    error: Optional[Exception]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _init_worker(parser: Union[Parser, ShapedParser], lexer_factory: Callable[[object], Lexer]) -> None:
+    global _parser, _lexer_factory
+    _parser = parser
+    _lexer_factory = lexer_factory
+
+
+def _parse_item(item: tuple[int, object]) -> ParseResult:
+    index, value = item
+    try:
+        return ParseResult(index, _parser.parse(_lexer_factory(value)), None)
+    except Exception as error:
+        return ParseResult(index, None, error)
+
+
+def parse_many(
+    parser: Union[Parser, ShapedParser],
+    inputs: Iterable[object],
+    lexer_factory: Callable[[object], Lexer],
+    processes: Optional[int] = None,
+    chunksize: int = 1,
+    ordered: bool = True,
+) -> Iterator[ParseResult]:
+    """
+    Parse every input in a pool of worker processes.
+    Results are yielded in input order, or as they complete if ordered is False.
+    An input that fails to parse yields a result with the error set; it does
+    not stop the batch. Larger chunk sizes send several inputs per message.
+    """
+    with Pool(processes, initializer=_init_worker, initargs=(parser, lexer_factory)) as pool:
+        mapper = pool.imap if ordered else pool.imap_unordered
+        yield from mapper(_parse_item, enumerate(inputs), chunksize)
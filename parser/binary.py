@@ -0,0 +1,264 @@
+"""
+    A compact binary encoding of parse trees, read lazily.
+
+    The encoding starts with a magic header, then a table of the names of
+    the non-terminals and terminals in the tree, each stored once, then the
+    nodes in preorder. All integers are unsigned LEB128 varints, so small
+    numbers take a single byte.
+        - name table:   count, then per name its utf-8 length and bytes
+        - ParseTree:    name index * 2, number of children, size in bytes of
+                        the children, then the children
+        - Token:        name index * 2 + 1, position, utf-8 length and bytes
+                        of the value
+    The size of the children lets a reader step over a whole subtree without
+    decoding it.
+
+    BinaryTree wraps bytes, a memoryview or an mmap without copying it; only
+    the name table is decoded up front. A BinaryNode or BinaryToken is just
+    an offset into the buffer: each attribute read decodes the few varints it
+    needs, so reaching one node decodes the headers on its path and skips
+    every sibling before it by size. to_parse_tree decodes a whole subtree
+    in one forward pass over its bytes. Positions are stored as they are, so
+    the tokens of a bytes lexer keep their byte offsets but come back as
+    Tokens.
+"""
+import mmap
+import os
+from typing import BinaryIO, Union
+from parser.parser import ParseTree, Token, gc_paused, make_token
+
+MAGIC = b"BNFB\x01"
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+_SMALL = [bytes([value]) for value in range(0x80)]
+
+
+def _varint(value: int) -> bytes:
+    if value < 0x80:
+        return _SMALL[value]
+    if value < 0x4000:
+        return bytes((value & 0x7F | 0x80, value >> 7))
+    if value < 0x200000:
+        return bytes((value & 0x7F | 0x80, value >> 7 & 0x7F | 0x80, value >> 14))
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _read(data: memoryview, offset: int) -> tuple[int, int]:
+    """Return the varint at offset and the offset after it."""
+    byte = data[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    value, shift = byte & 0x7F, 7
+    while True:
+        offset += 1
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset + 1
+        shift += 7
+
+
+def dumps(tree: ParseTree) -> bytes:
+    """Encode a tree."""
+    names: dict[str, int] = {}
+    # The encoded tag of every node name and token type.
+    node_tags: dict[str, bytes] = {}
+    token_tags: dict[str, bytes] = {}
+    # The nodes are written back to front, children before their header, so
+    # the size of the children is known when the header is written.
+    pieces: list[bytes] = []
+    append, varint = pieces.append, _varint
+    total = 0
+    stack: list[tuple[Union[ParseTree, Token], int]] = [(tree, -1)]
+    pop = stack.pop
+    while stack:
+        node, start = pop()
+        if isinstance(node, ParseTree):
+            if start < 0:
+                stack.append((node, total))
+                stack.extend([(child, -1) for child in node.children])
+                continue
+            tag = node_tags.get(node.id)
+            if tag is None:
+                tag = node_tags[node.id] = _varint(names.setdefault(node.id, len(names)) << 1)
+            piece = tag + varint(len(node.children)) + varint(total - start)
+        else:
+            tag = token_tags.get(node.type)
+            if tag is None:
+                tag = token_tags[node.type] = _varint(names.setdefault(node.type, len(names)) << 1 | 1)
+            value = node.value.encode()
+            piece = b"".join((tag, varint(node.pos), varint(len(value)), value))
+        append(piece)
+        total += len(piece)
+
+    header = [MAGIC, _varint(len(names))]
+    for name in names:
+        encoded = name.encode()
+        header.append(_varint(len(encoded)))
+        header.append(encoded)
+    pieces.extend(reversed(header))
+    pieces.reverse()
+    return b"".join(pieces)
+
+
+def dump(tree: ParseTree, file: BinaryIO) -> None:
+    file.write(dumps(tree))
+
+
+class BinaryTree:
+    def __init__(self, data: Buffer) -> None:
+        view = memoryview(data)
+        if view[: len(MAGIC)] != MAGIC:
+            raise ValueError("not an encoded parse tree")
+        self.data = view
+        count, offset = _read(view, len(MAGIC))
+        self.names: list[str] = []
+        for _ in range(count):
+            length, offset = _read(view, offset)
+            self.names.append(str(view[offset : offset + length], "utf-8"))
+            offset += length
+        self._root = offset
+
+    @classmethod
+    def from_file(cls, path: Union[str, os.PathLike]) -> "BinaryTree":
+        """Read an encoded tree through a read-only memory map of the file."""
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                raise ValueError("not an encoded parse tree")
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def node(self, offset: int) -> Union["BinaryNode", "BinaryToken"]:
+        tag, _ = _read(self.data, offset)
+        if tag & 1:
+            return BinaryToken(self, offset)
+        return BinaryNode(self, offset)
+
+    @property
+    def root(self) -> "BinaryNode":
+        return BinaryNode(self, self._root)
+
+    def to_parse_tree(self) -> ParseTree:
+        return self.root.to_parse_tree()
+
+    def _skip(self, offset: int) -> int:
+        """Return the offset after the node at offset."""
+        # Both kinds of node are a tag, a position or number of children, then a byte count.
+        data = self.data
+        _, offset = _read(data, offset)
+        _, offset = _read(data, offset)
+        size, offset = _read(data, offset)
+        return offset + size
+
+
+class BinaryNode:
+    """A view of a rule node in a BinaryTree."""
+
+    __slots__ = ("_tree", "_offset")
+
+    def __init__(self, tree: BinaryTree, offset: int) -> None:
+        self._tree = tree
+        self._offset = offset
+
+    @property
+    def id(self) -> str:
+        tag, _ = _read(self._tree.data, self._offset)
+        return self._tree.names[tag >> 1]
+
+    @property
+    def children(self) -> list[Union["BinaryNode", "BinaryToken"]]:
+        tree = self._tree
+        _, offset = _read(tree.data, self._offset)
+        count, offset = _read(tree.data, offset)
+        _, offset = _read(tree.data, offset)
+        children = []
+        for _ in range(count):
+            children.append(tree.node(offset))
+            offset = tree._skip(offset)
+        return children
+
+    def to_parse_tree(self) -> ParseTree:
+        """Decode the subtree into ParseTree and Token objects."""
+        with gc_paused():
+            return self._decode()
+
+    def _decode(self) -> ParseTree:
+        data, names = self._tree.data, self._tree.names
+        offset = self._offset
+        tag, offset = _read(data, offset)
+        count, offset = _read(data, offset)
+        _, offset = _read(data, offset)
+        root = ParseTree(names[tag >> 1], [])
+        # The children lists still to fill, with the number of children each still needs.
+        stack = [(root.children, count)]
+        children, count = stack[-1]
+        while True:
+            if len(children) == count:
+                stack.pop()
+                if not stack:
+                    return root
+                children, count = stack[-1]
+                continue
+            # Most varints are a single byte, read those inline.
+            tag = data[offset]
+            offset += 1
+            if tag >= 0x80:
+                tag, offset = _read(data, offset - 1)
+            if tag & 1:
+                pos, offset = _read(data, offset)
+                length = data[offset]
+                offset += 1
+                if length >= 0x80:
+                    length, offset = _read(data, offset - 1)
+                value = str(data[offset : offset + length], "utf-8")
+                children.append(make_token(names[tag >> 1], value, pos))
+                offset += length
+            else:
+                count, offset = _read(data, offset)
+                _, offset = _read(data, offset)
+                tree = ParseTree(names[tag >> 1], [])
+                children.append(tree)
+                children = tree.children
+                stack.append((children, count))
+
+    def __repr__(self) -> str:
+        return f"BinaryNode(id={self.id!r})"
+
+
+class BinaryToken:
+    """A view of a token in a BinaryTree. The value is decoded on access."""
+
+    __slots__ = ("_tree", "_offset")
+
+    def __init__(self, tree: BinaryTree, offset: int) -> None:
+        self._tree = tree
+        self._offset = offset
+
+    @property
+    def type(self) -> str:
+        tag, _ = _read(self._tree.data, self._offset)
+        return self._tree.names[tag >> 1]
+
+    @property
+    def pos(self) -> int:
+        _, offset = _read(self._tree.data, self._offset)
+        return _read(self._tree.data, offset)[0]
+
+    @property
+    def value(self) -> str:
+        data = self._tree.data
+        _, offset = _read(data, self._offset)
+        _, offset = _read(data, offset)
+        length, offset = _read(data, offset)
+        return str(data[offset : offset + length], "utf-8")
+
+    def to_token(self) -> Token:
+        return Token(self.type, self.value, self.pos)
+
+    def __repr__(self) -> str:
+        return f"BinaryToken(type={self.type!r}, value={self.value!r}, pos={self.pos})"
@@ -0,0 +1,204 @@
+"""
+    A bounded cache of parse results, keyed by the content of the input.
+
+    An entry is keyed by a hash of the grammar's identity, the start symbol
+    and the input text, so a hit returns the tree without lexing or parsing
+    the input again. The entries are kept in least recently used order and
+    evicted when there are more than max_entries or their approximate size,
+    the sum of sys.getsizeof over their nodes, child lists, tokens and token
+    values and over the source and line starts of the root's source map, is
+    above max_bytes. A tree larger than max_bytes is not kept.
+
+    Cached trees are shared by every caller that gets them, so they are
+    frozen when they are stored: their child lists are FrozenChildren, lists
+    that cannot be changed, which also makes the trees hashable. Trees compare
+    equal to the trees built by the parser. A root keeps its source map in
+    memory, but not on disk, where it would repeat the input; a tree read back
+    from disk gets the source map passed to get.
+
+    With a directory the entries are also kept on disk, in the format of
+    analysis.cache.AnalysisCache: a magic header, then a pickled payload that
+    repeats the format version and key. Disk entries outlive the process and
+    are not evicted. Trees too deep to pickle are only kept in memory. What
+    AnalysisCache says about the directory it is given holds here too.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Union
+from def_parser.source import SourceMap
+from parser.parser import ParseTree, Token
+
+FORMAT_VERSION = 1
+MAGIC = b"BNFTREE"
+
+
+class FrozenChildren(list):
+    """The children of a cached ParseTree; every method that would change them raises TypeError."""
+
+    def _frozen(self, *args: object, **kwargs: object) -> None:
+        raise TypeError("the children of a cached ParseTree cannot be changed")
+
+    append = extend = insert = pop = remove = clear = sort = reverse = _frozen
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _frozen
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __reduce__(self) -> tuple[type, tuple[list[Union[Token, ParseTree]]]]:
+        return FrozenChildren, (list(self),)
+
+
+def freeze(tree: ParseTree) -> tuple[ParseTree, int]:
+    """Return a copy of tree with frozen children and its approximate size in bytes."""
+    size = 0
+    # Post-order without recursion, trees may be deeper than the recursion limit.
+    stack: list[tuple[ParseTree, int]] = [(tree, 0)]
+    built: list[list[Union[Token, ParseTree]]] = [[], []]
+    while stack:
+        node, idx = stack.pop()
+        if idx < len(node.children):
+            stack.append((node, idx + 1))
+            child = node.children[idx]
+            if isinstance(child, ParseTree):
+                stack.append((child, 0))
+                built.append([])
+            else:
+                size += sys.getsizeof(child) + sys.getsizeof(child.value)
+                built[-1].append(child)
+            continue
+        children = FrozenChildren(built.pop())
+        size += sys.getsizeof(node) + sys.getsizeof(children)
+        built[-1].append(ParseTree(node.id, children, node.source_map))
+    if tree.source_map is not None:
+        # The root keeps the whole input alive; its line starts are found now so they are counted.
+        size += sys.getsizeof(tree.source_map.source) + sys.getsizeof(tree.source_map.starts)
+    return built[0][0], size
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    disk_hits: int = 0
+
+
+class ParseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        directory: Optional[str] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._directory = directory
+        self._entries: OrderedDict[str, tuple[ParseTree, int]] = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """The approximate size of the cached trees in bytes."""
+        return self._bytes
+
+    def key(self, identity: str, start: str, text: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{FORMAT_VERSION}\0{identity}\0{start}\0".encode())
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, key: str, source_map: Optional[SourceMap] = None) -> Optional[ParseTree]:
+        """Return the cached tree, or None on a miss. A tree read back from disk gets source_map."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+        tree = self._load(key) if self._directory is not None else None
+        if tree is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        self.stats.disk_hits += 1
+        tree, size = freeze(ParseTree(tree.id, tree.children, source_map))
+        self._insert(key, tree, size)
+        return tree
+
+    def put(self, key: str, tree: ParseTree) -> ParseTree:
+        """Cache tree and return its frozen copy, which callers get from now on."""
+        frozen, size = freeze(tree)
+        self._insert(key, frozen, size)
+        if self._directory is not None:
+            self._store(key, frozen)
+        return frozen
+
+    def clear(self) -> None:
+        """Drop the entries in memory; entries on disk are kept."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def _insert(self, key: str, tree: ParseTree, size: int) -> None:
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (tree, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+            self.stats.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.tree")
+
+    def _load(self, key: str) -> Optional[ParseTree]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        try:
+            if not data.startswith(MAGIC):
+                raise ValueError("bad magic")
+            payload = pickle.loads(data[len(MAGIC) :])
+            if payload["format"] != FORMAT_VERSION or payload["key"] != key:
+                raise ValueError("stale entry")
+            return payload["tree"]
+        except Exception:
+            self._discard(path)
+            return None
+
+    def _store(self, key: str, tree: ParseTree) -> None:
+        payload = {"format": FORMAT_VERSION, "key": key, "tree": ParseTree(tree.id, tree.children)}
+        try:
+            data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(MAGIC)
+                file.write(data)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            self._discard(tmp)
+            raise
+
+    def _discard(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
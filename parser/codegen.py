@@ -0,0 +1,160 @@
+"""
+    Generates a standalone python module that parses the language of a grammar.
+
+    The generated module has one function per non-terminal with the predict
+    sets of its rules inlined as constants, so it needs neither the grammar
+    nor the Analyzer at runtime. It defines its own Token, ParseTree and
+    UnexpectedToken, with the fields of those in parser.parser, and imports
+    nothing from this package, so it can be shipped on its own. Its trees
+    have the shape of the trees Parser builds.
+
+    Usage: python -m parser.codegen grammar.bnf > grammar_parser.py
+"""
+import sys
+from typing import Optional
+from def_parser.parser import Rule, parse
+from analysis.analyzer import Analyzer
+from parser.parser import Parser
+
+# The definitions the generated module needs at runtime.
+RUNTIME = '''from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Token:
+    """A token in the input."""
+
+    type: str
+    value: str
+    pos: int
+
+
+@dataclass(frozen=True, eq=True)
+class ParseTree:
+    id: str
+    children: list
+
+
+class UnexpectedToken(Exception):
+    """Exception raised when the parser encounters an unexpected token."""
+
+    def __init__(self, token, expected):
+        super().__init__(token, expected)
+        self.token = token
+        self.expected = expected
+
+    def __str__(self):
+        return f"Unexpected token {self.token} at position {self.token.pos}, expected {self.expected}"
+'''
+
+
+class _Generator:
+    def __init__(self, parser: Parser) -> None:
+        self._table = parser.table
+        self._analysis = parser.analysis
+        self._rules_of = parser.analysis.ir.rules_of
+        self._constants: list[str] = []
+        self._constant_names: dict[frozenset[str], str] = {}
+
+    def _function(self, non_terminal: int) -> str:
+        name = self._table.non_terminals[non_terminal]
+        if name.isidentifier():
+            return f"parse_{name}"
+        return f"_parse_{non_terminal}"
+
+    def _constant(self, terminals: set[str]) -> str:
+        key = frozenset(terminals)
+        if key not in self._constant_names:
+            name = f"_SET_{len(self._constant_names)}"
+            self._constant_names[key] = name
+            self._constants.append(f"{name} = frozenset({sorted(key)!r})")
+        return self._constant_names[key]
+
+    def _symbol(self, symbol: int) -> str:
+        if symbol < 0:
+            return f"lexer.expect({self._constant({self._table.terminals[~symbol]})})"
+        if self._table.synthetic[symbol]:
+            return f"*{self._function(symbol)}(lexer)"
+        return f"{self._function(symbol)}(lexer)"
+
+    def _non_terminal(self, non_terminal: int) -> list[str]:
+        table = self._table
+        name = table.non_terminals[non_terminal]
+        if table.synthetic[non_terminal]:
+            return self._synthetic(non_terminal)
+        lines = [
+            f"def {self._function(non_terminal)}(lexer):",
+            f"    token = lexer.peek()",
+            f"    kind = token.type",
+        ]
+        for idx in self._rules_of[non_terminal]:
+            predict = self._constant(self._analysis.predict_rule(table.rules[idx]))
+            children = ", ".join(self._symbol(symbol) for symbol in table.productions[idx])
+            lines.append(f"    if kind in {predict}:")
+            lines.append(f"        return ParseTree({name!r}, [{children}])")
+        expected = sorted(table.predict(non_terminal))
+        lines.append(f"    raise UnexpectedToken(token, set({expected!r}))")
+        return lines
+
+    def _synthetic(self, non_terminal: int) -> list[str]:
+        """A synthetic non-terminal returns its children, and a repetition loops."""
+        table = self._table
+        lines = [
+            f"def {self._function(non_terminal)}(lexer):",
+            f"    children = []",
+            f"    while True:",
+            f"        token = lexer.peek()",
+            f"        kind = token.type",
+        ]
+        for idx in self._rules_of[non_terminal]:
+            predict = self._constant(self._analysis.predict_rule(table.rules[idx]))
+            production = table.productions[idx]
+            if table.loops[idx]:
+                production = production[:-1]
+            children = ", ".join(self._symbol(symbol) for symbol in production)
+            lines.append(f"        if kind in {predict}:")
+            lines.append(f"            children.extend([{children}])")
+            lines.append(f"            continue" if table.loops[idx] else f"            return children")
+        expected = sorted(table.predict(non_terminal))
+        lines.append(f"        raise UnexpectedToken(token, set({expected!r}))")
+        return lines
+
+    def generate(self) -> str:
+        functions: list[str] = []
+        for non_terminal in range(len(self._table.non_terminals)):
+            functions.extend(["", ""])
+            functions.extend(self._non_terminal(non_terminal))
+
+        lines = [
+            '"""',
+            "    Generated ll(1) parser. Do not edit.",
+            '"""',
+            RUNTIME,
+            "",
+            *self._constants,
+            "",
+            "",
+            "def parse(lexer):",
+            f"    return {self._function(self._table.start)}(lexer)",
+            *functions,
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def generate(
+    rules: list[Rule], start: Optional[str] = None, analysis: Optional[Analyzer] = None
+) -> str:
+    """
+    Return the source of a python module that parses the language of start
+    in the given grammar. An analysis of the rules for start, for example a
+    cached one, is used instead of analysing them again; an analysis of
+    another start symbol is not, the rules are analysed for start instead.
+    """
+    if analysis is not None and start is not None and start != analysis.start:
+        analysis = None
+    return _Generator(Parser(rules, analysis=analysis, start=start)).generate()
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as file:
+        sys.stdout.write(generate(parse(file.read())))
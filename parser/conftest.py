@@ -0,0 +1,14 @@
+import pytest
+
+# Grammars with inputs in their language, for the tests that compare two ways of parsing.
+GRAMMARS = [
+    ("s: 'a' s 'b' | ! ;", ["", "ab", "aabb"]),
+    ("e: p et; et: '+' p et | !; p: '1' | '(' e ')';", ["1", "1+1", "(1+1)+1"]),
+    ("l: '[' [ i { ',' i } ] ']' ; i: 'x' | ( 'a' | 'b' ) [ 'c' ] ;", ["[]", "[x,ac,b]"]),
+]
+
+
+@pytest.fixture(params=GRAMMARS, ids=["nested", "expression", "ebnf"])
+def grammar_inputs(request: pytest.FixtureRequest) -> tuple[str, list[str]]:
+    """A grammar and inputs in its language."""
+    return request.param
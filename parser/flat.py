@@ -0,0 +1,183 @@
+"""
+    A compact parse tree stored as parallel arrays.
+
+    Every node, rule or token, is a row in five arrays: its kind, start and
+    end offsets in the source, and the indices of its first child and next
+    sibling (-1 when absent). Rows are in preorder, so the root is row 0.
+    A non-negative kind is a non-terminal id, a negative kind ~t is a token
+    of terminal t. Token text is not stored; it is sliced from the source
+    on access, so the lexer must produce tokens whose value is the source
+    text at source[pos : pos + len(value)].
+
+    FlatNode and FlatToken are light views that mirror the ParseTree and
+    Token attributes, and FlatTree.to_parse_tree converts back.
+"""
+from array import array
+from typing import Union
+from parser.parser import Parser, Lexer, ParseTree, Token, Builder, build
+from parser.table import ParseTable
+
+
+class FlatTree:
+    def __init__(self, source: str, non_terminals: list[str], terminals: list[str]) -> None:
+        self.source = source
+        self.non_terminals = non_terminals
+        self.terminals = terminals
+        self.kinds = array("i")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.first_child = array("q")
+        self.next_sibling = array("q")
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def add(self, kind: int, start: int, end: int) -> int:
+        """Append a childless node and return its index."""
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        return len(self.kinds) - 1
+
+    def node(self, index: int) -> Union["FlatNode", "FlatToken"]:
+        if self.kinds[index] < 0:
+            return FlatToken(self, index)
+        return FlatNode(self, index)
+
+    @property
+    def root(self) -> "FlatNode":
+        return FlatNode(self, 0)
+
+    def to_parse_tree(self) -> ParseTree:
+        """Convert the tree to nested ParseTree and Token objects."""
+        kinds, starts, ends = self.kinds, self.starts, self.ends
+        first_child, next_sibling = self.first_child, self.next_sibling
+        root = ParseTree(self.non_terminals[kinds[0]], [])
+        stack = [(0, root.children)]
+        while stack:
+            index, children = stack.pop()
+            child = first_child[index]
+            while child >= 0:
+                kind = kinds[child]
+                if kind < 0:
+                    value = self.source[starts[child] : ends[child]]
+                    children.append(Token(self.terminals[~kind], value, starts[child]))
+                else:
+                    tree = ParseTree(self.non_terminals[kind], [])
+                    children.append(tree)
+                    stack.append((child, tree.children))
+                child = next_sibling[child]
+        return root
+
+
+class FlatNode:
+    """A view of a rule node in a FlatTree."""
+
+    __slots__ = ("_tree", "_index")
+
+    def __init__(self, tree: FlatTree, index: int) -> None:
+        self._tree = tree
+        self._index = index
+
+    @property
+    def id(self) -> str:
+        return self._tree.non_terminals[self._tree.kinds[self._index]]
+
+    @property
+    def children(self) -> list[Union["FlatNode", "FlatToken"]]:
+        tree = self._tree
+        children = []
+        child = tree.first_child[self._index]
+        while child >= 0:
+            children.append(tree.node(child))
+            child = tree.next_sibling[child]
+        return children
+
+    @property
+    def start(self) -> int:
+        return self._tree.starts[self._index]
+
+    @property
+    def end(self) -> int:
+        return self._tree.ends[self._index]
+
+    def __repr__(self) -> str:
+        return f"FlatNode(id={self.id!r}, start={self.start}, end={self.end})"
+
+
+class FlatToken:
+    """A view of a token in a FlatTree. The value is read from the source on access."""
+
+    __slots__ = ("_tree", "_index")
+
+    def __init__(self, tree: FlatTree, index: int) -> None:
+        self._tree = tree
+        self._index = index
+
+    @property
+    def type(self) -> str:
+        return self._tree.terminals[~self._tree.kinds[self._index]]
+
+    @property
+    def value(self) -> str:
+        return self._tree.source[self.pos : self.end]
+
+    @property
+    def pos(self) -> int:
+        return self._tree.starts[self._index]
+
+    @property
+    def end(self) -> int:
+        return self._tree.ends[self._index]
+
+    def __repr__(self) -> str:
+        return f"FlatToken(type={self.type!r}, value={self.value!r}, pos={self.pos})"
+
+
+class FlatBuilder(Builder):
+    """Adds the nodes of a parse to a FlatTree."""
+
+    def __init__(self, table: ParseTable, source: str) -> None:
+        self.tree = FlatTree(source, table.non_terminals, table.terminals)
+        self._terminal_ids = table.terminal_ids
+        self._lhs = [table.non_terminal_ids[name] for name in table.names]
+        self._parents: list[int] = []
+        self._last_child: list[int] = []
+        self._last_end = 0
+
+    def _add(self, node: int) -> None:
+        if self._parents:
+            if self._last_child[-1] < 0:
+                self.tree.first_child[self._parents[-1]] = node
+            else:
+                self.tree.next_sibling[self._last_child[-1]] = node
+            self._last_child[-1] = node
+
+    def token(self, token: Token) -> None:
+        self._last_end = token.pos + len(token.value)
+        terminal = self._terminal_ids[token.type]
+        self._add(self.tree.add(~terminal, token.pos, self._last_end))
+
+    def enter(self, rule: int, pos: int) -> None:
+        node = self.tree.add(self._lhs[rule], pos, pos)
+        self._add(node)
+        self._parents.append(node)
+        self._last_child.append(-1)
+
+    def exit(self, rule: int) -> None:
+        node = self._parents.pop()
+        self._last_child.pop()
+        self.tree.ends[node] = max(self.tree.starts[node], self._last_end)
+
+    def result(self) -> FlatTree:
+        return self.tree
+
+
+def parse_flat(parser: Parser, lexer: Lexer, source: str) -> FlatTree:
+    """
+    Parse the input straight into a FlatTree, without building ParseTree nodes.
+    Like Parser.parse_iterative, this runs in constant Python stack depth.
+    """
+    return build(parser.table, lexer, FlatBuilder(parser.table, source))
@@ -0,0 +1,366 @@
+"""
+    Incremental reparsing of a document after text edits.
+
+    After an edit, the old tree is searched top-down for subtrees whose tokens
+    and lookahead token lie entirely before the edit, or entirely after it.
+    An ll(1) parse of a non-terminal only depends on its own tokens and the
+    one token that follows it, so when the new parse expands the same
+    non-terminal at the corresponding position the old subtree is reused as
+    is, and the lexer resumes at the old lookahead token. Subtrees after the
+    edit are reused as ShiftedTrees, which add the change in length to the
+    positions of their tokens when they are read, so an edit costs the same
+    whether or not it changes the length of the text.
+
+    The children of a node on the path to the edit are binary searched by the
+    positions of their first tokens, so only the damaged ones are visited and
+    the unchanged siblings on either side are kept as Runs. Where the new
+    parse reaches the first node of a run, a repetition like { stmt } takes
+    all the following nodes of the run in one step, with one new lexer, so
+    an edit in a flat list of statements costs little more than reparsing the
+    damaged statement. The nodes on the path to the edit are still rebuilt,
+    so an edit deep in a right-recursive list costs time in its depth.
+
+    This relies on two properties of the lexer: the token at a position only
+    depends on the text from that position onwards, and a token's value is
+    the source text at its position. lexer_factory(text, pos) must return a
+    lexer that starts scanning text at pos.
+
+    The old tree is kept without shapes, since finding the extents of its
+    subtrees needs every token. With a ShapedParser, parse and edit return
+    the tree shaped by ShapedParser.shape, which only shapes what is read.
+"""
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, replace
+from typing import Callable, Optional, Sequence, Union
+from parser.parser import Parser, Lexer, ParseTree, Token, TreeBuilder, build, gc_paused
+from parser.shape import ShapedParser
+from parser.table import ParseTable
+
+# Child lists up to this length are scanned whole instead of searched.
+SHORT = 8
+
+
+@dataclass(frozen=True)
+class Edit:
+    """Replace removed characters at offset with the inserted text."""
+
+    offset: int
+    removed: int
+    inserted: str
+
+
+def _first_token(tree: Union[Token, ParseTree]) -> Optional[Token]:
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, ParseTree):
+            return node
+        stack.extend(reversed(node.children))
+    return None
+
+
+def _span(token: Token) -> tuple[int, int]:
+    # An EOF token reaches past the text, so an edit at the end of the text touches it.
+    return token.pos, token.pos + max(len(token.value), 1)
+
+
+class ShiftedTree(ParseTree):
+    """
+    A subtree reused delta characters from where it was parsed. Its children
+    are shifted one level at a time when they are first read, so reusing it
+    costs the same whatever its size, and parts that are never read are
+    never copied.
+    """
+
+    def __init__(self, tree: ParseTree, delta: int) -> None:
+        if isinstance(tree, ShiftedTree) and tree._pending is not None:
+            tree, delta = tree._pending, tree._delta + delta
+        attributes = self.__dict__
+        attributes["id"] = tree.id
+        attributes["_pending"] = tree
+        attributes["_delta"] = delta
+
+    @property
+    def children(self) -> list[Union[Token, ParseTree]]:
+        attributes = self.__dict__
+        pending = attributes["_pending"]
+        if pending is not None:
+            delta = attributes["_delta"]
+            attributes["_children"] = [
+                ShiftedTree(child, delta)
+                if isinstance(child, ParseTree)
+                else replace(child, pos=child.pos + delta)
+                for child in pending.children
+            ]
+            attributes["_pending"] = None
+        return attributes["_children"]
+
+
+class IncrementalParser:
+    def __init__(
+        self, parser: Union[Parser, ShapedParser], lexer_factory: Callable[[str, int], Lexer]
+    ) -> None:
+        self._shaped = parser if isinstance(parser, ShapedParser) else None
+        self._parser = parser.parser if isinstance(parser, ShapedParser) else parser
+        self._lexer_factory = lexer_factory
+        self._text = ""
+        self._tree: Optional[ParseTree] = None
+        # The (start, end) of the token after the tree, which may stop before the end of the text.
+        self._lookahead = (0, 1)
+        self.reused = 0
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def tree(self) -> Optional[ParseTree]:
+        if self._tree is None or self._shaped is None:
+            return self._tree
+        return self._shaped.shape(self._tree)
+
+    def parse(self, text: str) -> ParseTree:
+        """Parse the whole text, and remember it as the base for later edits."""
+        lexer = self._lexer_factory(text, 0)
+        self._tree = self._parser.parse_iterative(lexer)
+        self._lookahead = _span(lexer.peek())
+        self._text = text
+        return self.tree
+
+    def edit(self, edit: Edit) -> ParseTree:
+        """Apply the edit to the text and reparse only the damaged region."""
+        if self._tree is None:
+            raise ValueError("edit() called before parse()")
+        text = (
+            self._text[: edit.offset]
+            + edit.inserted
+            + self._text[edit.offset + edit.removed :]
+        )
+        with gc_paused():
+            self._tree = self._reparse(text, self._runs(edit))
+        self._text = text
+        return self.tree
+
+    def _runs(self, edit: Edit) -> list["Run"]:
+        """Return the runs of old siblings that lie entirely before or after the edit."""
+        delta = len(edit.inserted) - edit.removed
+        damage_end = edit.offset + edit.removed
+        runs: list[Run] = []
+
+        # Lookaheads are (start, end) of the token after a node.
+        stack = [Siblings([self._tree], self._lookahead)]
+        while stack:
+            siblings = stack.pop()
+            children = siblings.children
+            before, after = siblings.damaged(edit.offset, damage_end)
+            if before:
+                runs.append(Run(siblings, 0, before, 0, False))
+            if after < len(children):
+                runs.append(Run(siblings, after, len(children), delta, True))
+            for idx in range(before, after):
+                child = children[idx]
+                if isinstance(child, ParseTree):
+                    stack.append(Siblings(child.children, siblings.after(idx + 1)))
+        return runs
+
+    def _reparse(self, text: str, runs: list["Run"]) -> ParseTree:
+        table = self._parser.table
+        lexer = self._lexer_factory(text, 0)
+        builder = ReuseBuilder(table, text, self._lexer_factory, {}, runs)
+        tree = build(table, lexer, builder)
+        self.reused = builder.reused
+        self._lookahead = _span((builder.lexer or lexer).peek())
+        return tree
+
+
+class Siblings:
+    """The children of an old node and the (start, end) of the old token after the node."""
+
+    def __init__(self, children: list[Union[Token, ParseTree]], lookahead: tuple[int, int]) -> None:
+        self.children = children
+        self.lookahead = lookahead
+        # The spans of a short list are found at once, those of a long one as it is searched.
+        self.spans: Optional[list[tuple[int, int]]] = None
+        self._spans: dict[int, tuple[int, int]] = {}
+        count = len(children)
+        if count <= SHORT:
+            spans = [lookahead] * (count + 1)
+            for idx in range(count - 1, -1, -1):
+                first = _first_token(children[idx])
+                spans[idx] = _span(first) if first is not None else spans[idx + 1]
+            self.spans = spans
+
+    def after(self, idx: int) -> tuple[int, int]:
+        """Return the old (start, end) of the first token of children[idx:], or the lookahead."""
+        if self.spans is not None:
+            return self.spans[idx]
+        children, spans = self.children, self._spans
+        empty = []
+        while True:
+            if idx >= len(children):
+                span = self.lookahead
+                break
+            span = spans.get(idx)
+            if span is not None:
+                break
+            first = _first_token(children[idx])
+            if first is not None:
+                span = spans[idx] = _span(first)
+                break
+            empty.append(idx)
+            idx += 1
+        for idx in empty:
+            spans[idx] = span
+        return span
+
+    def damaged(self, offset: int, end: int) -> tuple[int, int]:
+        """
+        Return the range of the children that are damaged by replacing the old
+        text from offset to end: the children before it have a lookahead that
+        ends before offset, and those after it start at end or later.
+        """
+        if self.spans is not None:
+            spans, count = self.spans, len(self.children)
+            before = 0
+            while before < count and spans[before + 1][1] < offset:
+                before += 1
+            after = before
+            while after < count and spans[after][0] < end:
+                after += 1
+            return before, after
+        indices = range(len(self.children))
+        before = bisect_left(indices, offset, key=lambda idx: self.after(idx + 1)[1])
+        return before, max(before, bisect_left(indices, end, key=lambda idx: self.after(idx)[0]))
+
+
+class Run:
+    """
+    Old siblings children[start:stop] that are reused shifted by delta. Before
+    the edit the new parse takes up a run at its first node and goes through
+    it in order; after the edit, where it may take up a run at any node, the
+    run is searched.
+    """
+
+    __slots__ = ("siblings", "start", "stop", "delta", "searched")
+
+    def __init__(self, siblings: Siblings, start: int, stop: int, delta: int, searched: bool) -> None:
+        self.siblings = siblings
+        self.start = start
+        self.stop = stop
+        self.delta = delta
+        self.searched = searched
+
+    def pos(self, idx: int) -> int:
+        """Return the position in the new text of the child at idx, or of the token after the run."""
+        return self.siblings.after(idx)[0] + self.delta
+
+
+class ReuseBuilder(TreeBuilder):
+    """Builds the tree of a reparse, taking the candidate subtrees and runs of siblings where they fit."""
+
+    def __init__(
+        self,
+        table: ParseTable,
+        text: str,
+        lexer_factory: Callable[[str, int], Lexer],
+        candidates: dict[tuple[str, int], tuple[ParseTree, int, int]],
+        runs: Sequence[Run] = (),
+    ) -> None:
+        super().__init__(table)
+        self._non_terminals = table.non_terminals
+        # The lexer returned for the last reused subtree, which the parse continues with.
+        self.lexer: Optional[Lexer] = None
+        self._text = text
+        self._lexer_factory = lexer_factory
+        self._candidates = candidates
+        # The non-terminal X of every repetition R: X R, whose iterations are single nodes.
+        self._repeated: list[Optional[str]] = [None] * len(table.non_terminals)
+        for idx, production in enumerate(table.productions):
+            if table.loops[idx] and len(production) == 2 and not table.synthetic[production[0]]:
+                self._repeated[production[-1]] = table.non_terminals[production[0]]
+        # The next node of every run, and the searched runs by their position in the new text.
+        self._next: dict[tuple[str, int], tuple[Run, int]] = {}
+        for run in runs:
+            self._expect(run, run.start)
+        self._runs = sorted((run for run in runs if run.searched), key=lambda run: run.pos(run.start))
+        self._starts = [run.pos(run.start) for run in self._runs]
+        self.reused = 0
+
+    def reuse(self, non_terminal: int, token: Token) -> Optional[Lexer]:
+        repeated = self._repeated[non_terminal]
+        if repeated is not None:
+            # Take every iteration of the repetition from the run in one step.
+            found = self._find(repeated, token.pos)
+            if found is None:
+                return None
+            run, idx = found
+            children, stop = run.siblings.children, idx + 1
+            while stop < run.stop and isinstance(children[stop], ParseTree) and children[stop].id == repeated:
+                stop += 1
+            return self._take(run, idx, stop)
+
+        name = self._non_terminals[non_terminal]
+        candidate = self._candidates.get((name, token.pos))
+        if candidate is not None:
+            node, delta, resume = candidate
+            self.children.append(ShiftedTree(node, delta) if delta else node)
+            self.reused += 1
+            self.lexer = self._lexer_factory(self._text, resume)
+            return self.lexer
+        found = self._find(name, token.pos)
+        if found is None:
+            return None
+        run, idx = found
+        return self._take(run, idx, idx + 1)
+
+    def _find(self, name: str, pos: int) -> Optional[tuple[Run, int]]:
+        """Return the run and index of an old node of name at pos."""
+        found = self._next.get((name, pos))
+        if found is not None:
+            return found
+        # The parse left the old one before pos, look for the node in the run around pos.
+        at = bisect_right(self._starts, pos) - 1
+        if at < 0:
+            return None
+        run = self._runs[at]
+        children = run.siblings.children
+        idx = bisect_left(range(run.start, run.stop), pos, key=run.pos) + run.start
+        while idx < run.stop and run.pos(idx) == pos:
+            child = children[idx]
+            if isinstance(child, ParseTree) and child.id == name:
+                return run, idx
+            idx += 1
+        return None
+
+    def _take(self, run: Run, start: int, stop: int) -> Lexer:
+        children, delta = run.siblings.children[start:stop], run.delta
+        self.children.extend([ShiftedTree(child, delta) for child in children] if delta else children)
+        self.reused += len(children)
+        self._expect(run, stop)
+        self.lexer = self._lexer_factory(self._text, run.pos(stop))
+        return self.lexer
+
+    def _expect(self, run: Run, idx: int) -> None:
+        # The first node of the run from idx on is where the parse will most likely take from it next.
+        children = run.siblings.children
+        while idx < run.stop and not isinstance(children[idx], ParseTree):
+            idx += 1
+        if idx < run.stop:
+            self._next.setdefault((children[idx].id, run.pos(idx)), (run, idx))
+
+
+def reparse(
+    parser: Parser,
+    text: str,
+    lexer_factory: Callable[[str, int], Lexer],
+    candidates: dict[tuple[str, int], tuple[ParseTree, int, int]],
+) -> tuple[ParseTree, int]:
+    """
+    Parse text, reusing the candidate subtrees keyed by (non-terminal, position).
+    A candidate is (tree, shift, resume): the tree is used with its token
+    positions shifted, and the lexer restarts at resume. Return the tree and
+    the number of reused subtrees.
+    """
+    builder = ReuseBuilder(parser.table, text, lexer_factory, candidates)
+    tree = build(parser.table, lexer_factory(text, 0), builder)
+    return tree, builder.reused
@@ -0,0 +1,377 @@
+"""
+    A lexer generated from the terminals of a grammar.
+
+    Terminals are literal strings, so they are compiled into one regular
+    expression with the longest literals first, which makes a single match
+    the maximal munch. Terminals that stand for a class of strings, like
+    numbers or identifiers, can be given a pattern instead. When a pattern
+    and a literal both match, the longest match wins and a literal wins a
+    tie, so keywords are not lexed as identifiers.
+
+    Whitespace and comments are removed by the skip patterns before every
+    token. LexerSpec.incomplete tells a streaming caller whether text that
+    could not be lexed might still become a token once more text arrives; it
+    walks the parsed patterns, since re cannot match partially. Token types are the terminal names, so the tokens can be fed
+    straight to a Parser for the same grammar. GeneratedLexer is also a
+    TokenSource, so Parser.parse_tokens can take its tokens in bulk.
+
+    BytesLexer scans bytes, memoryview or mmap.mmap buffers in place with the
+    same rules compiled to bytes patterns. Its SpanTokens only hold byte
+    offsets into the buffer and decode their value when it is read, so a
+    memory-mapped file is parsed without ever decoding or copying all of it.
+    Positions of SpanTokens are byte offsets, and character classes in
+    patterns only match ascii characters.
+"""
+import mmap
+import re
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional, Union
+from def_parser.lexer import UnexpectedCharacter
+from parser.parser import Lexer, Token, TokenChunk, TokenSource, UnexpectedToken
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # before Python 3.11
+    import sre_constants, sre_parse
+
+DEFAULT_SKIP = (r"\s+",)
+
+_CATEGORIES = {
+    name: re.compile(pattern)
+    for name, pattern in [
+        ("CATEGORY_DIGIT", r"\d"),
+        ("CATEGORY_NOT_DIGIT", r"\D"),
+        ("CATEGORY_SPACE", r"\s"),
+        ("CATEGORY_NOT_SPACE", r"\S"),
+        ("CATEGORY_WORD", r"\w"),
+        ("CATEGORY_NOT_WORD", r"\W"),
+    ]
+}
+
+
+def _in_set(items: list, char: str) -> bool:
+    negate, found = False, False
+    for op, value in items:
+        name = str(op)
+        if name == "NEGATE":
+            negate = True
+        elif name == "LITERAL":
+            found = found or char == chr(value)
+        elif name == "NOT_LITERAL":
+            found = found or char != chr(value)
+        elif name == "RANGE":
+            found = found or value[0] <= ord(char) <= value[1]
+        elif name == "CATEGORY" and str(value) in _CATEGORIES:
+            found = found or _CATEGORIES[str(value)].match(char) is not None
+        else:
+            return True
+    return found != negate
+
+
+def _prefix_ends(items: list, text: str, starts: set[int], flags: int) -> Optional[set[int]]:
+    """
+    Return the offsets at which the sequence of parsed regex items can stop
+    matching text from any of starts, or None if it can run into the end of
+    text. Constructs that are not understood match anything, so None errs on
+    the side of text that could still grow into a match.
+    """
+    length = len(text)
+    for op, value in items:
+        name = str(op)
+        if name in ("LITERAL", "NOT_LITERAL", "ANY", "IN"):
+            if length in starts:
+                return None
+            if flags & re.IGNORECASE:
+                ends = {pos + 1 for pos in starts}
+            elif name == "LITERAL":
+                ends = {pos + 1 for pos in starts if text[pos] == chr(value)}
+            elif name == "NOT_LITERAL":
+                ends = {pos + 1 for pos in starts if text[pos] != chr(value)}
+            elif name == "ANY":
+                ends = {pos + 1 for pos in starts if flags & re.DOTALL or text[pos] != "\n"}
+            else:
+                ends = {pos + 1 for pos in starts if _in_set(value, text[pos])}
+            starts = ends
+        elif name == "BRANCH":
+            ends = set()
+            for branch in value[1]:
+                branch_ends = _prefix_ends(branch, text, starts, flags)
+                if branch_ends is None:
+                    return None
+                ends |= branch_ends
+            starts = ends
+        elif name in ("SUBPATTERN", "ATOMIC_GROUP"):
+            group = value[-1] if name == "SUBPATTERN" else value
+            group_flags = (flags | value[1]) & ~value[2] if name == "SUBPATTERN" else flags
+            starts = _prefix_ends(group, text, starts, group_flags)
+            if starts is None:
+                return None
+        elif name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+            low, high, repeated = value
+            ends = set(starts) if low == 0 else set()
+            current, count = set(starts), 0
+            while current and count != high:
+                current = _prefix_ends(repeated, text, current, flags)
+                if current is None:
+                    return None
+                count += 1
+                if count >= low:
+                    current -= ends
+                    ends |= current
+            starts = ends
+        elif name in ("AT", "ASSERT", "ASSERT_NOT"):
+            continue
+        else:
+            return None
+        if not starts:
+            return starts
+    return starts
+
+
+def could_extend(pattern: re.Pattern, text: str, pos: int) -> bool:
+    """
+    Return True if text[pos:] might be the start of a match of pattern that
+    needs more text, that is if matching it can run into the end of text.
+    """
+    try:
+        items = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return True
+    return _prefix_ends(list(items), text, {pos}, pattern.flags) is None
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+class LexerSpec:
+    def __init__(
+        self,
+        terminals: Iterable[str],
+        skip: Iterable[str] = DEFAULT_SKIP,
+        patterns: Optional[dict[str, str]] = None,
+    ) -> None:
+        terminals, skip, patterns = tuple(terminals), tuple(skip), dict(patterns or {})
+        self._rules = (terminals, skip, patterns)
+        self._bytes: dict[str, "_BytesSpec"] = {}
+        literals = sorted(
+            (terminal for terminal in terminals if terminal not in patterns),
+            key=lambda literal: (-len(literal), literal),
+        )
+        self.literals = re.compile("|".join(map(re.escape, literals))) if literals else None
+        self._literals = literals
+        self.longest_literal = len(literals[0]) if literals else 0
+        self.patterns = [(name, re.compile(pattern)) for name, pattern in patterns.items()]
+        skip = "|".join(f"(?:{pattern})" for pattern in skip)
+        self.skip = re.compile(f"(?:{skip})*") if skip else None
+
+    def scan(self, text: str, pos: int) -> tuple[int, Optional[str], int]:
+        """
+        Skip to the next token at or after pos and return its start, type and
+        end. The type is None when only skipped text is left.
+        """
+        if self.skip is not None:
+            pos = self.skip.match(text, pos).end()
+        if pos >= len(text):
+            return pos, None, pos
+
+        end, kind = pos, None
+        if self.literals is not None:
+            match = self.literals.match(text, pos)
+            if match is not None:
+                end, kind = match.end(), match.group()
+        for name, pattern in self.patterns:
+            match = pattern.match(text, pos)
+            if match is not None and match.end() > end:
+                end, kind = match.end(), name
+
+        if kind is None or end == pos:
+            raise UnexpectedCharacter(text[pos], pos)
+        return pos, kind, end
+
+    def incomplete(self, text: str, pos: int) -> bool:
+        """
+        Return True if more text could turn text[pos:], which scan could not
+        lex, into skipped text or a token: it is a proper prefix of a literal,
+        or a skip pattern or a pattern could still match there.
+        """
+        rest = text[pos:]
+        if len(rest) < self.longest_literal and any(literal.startswith(rest) for literal in self._literals):
+            return True
+        patterns = [pattern for _, pattern in self.patterns]
+        if self.skip is not None:
+            patterns.append(self.skip)
+        return any(could_extend(pattern, text, pos) for pattern in patterns)
+
+    def lexer(self, text: str, pos: int = 0) -> "GeneratedLexer":
+        """Return a lexer over text that starts scanning at pos."""
+        return GeneratedLexer(self, text, pos)
+
+    def bytes_lexer(self, buffer: Buffer, pos: int = 0, encoding: str = "utf-8") -> "BytesLexer":
+        """Return a lexer over an encoded buffer that starts scanning at byte offset pos."""
+        if encoding not in self._bytes:
+            self._bytes[encoding] = _BytesSpec(*self._rules, encoding)
+        return BytesLexer(self._bytes[encoding], buffer, pos)
+
+
+class GeneratedLexer(Lexer, TokenSource):
+    def __init__(self, spec: LexerSpec, text: str, pos: int = 0) -> None:
+        self._spec = spec
+        self._text = text
+        self._end = pos
+        self._peek = self._scan(pos)
+
+    def _scan(self, pos: int) -> Token:
+        start, kind, self._end = self._spec.scan(self._text, pos)
+        if kind is None:
+            return Token("EOF", "", start)
+        return Token(kind, self._text[start : self._end], start)
+
+    def peek(self) -> Token:
+        return self._peek
+
+    def has(self, tokens: set[str]) -> bool:
+        return self._peek.type in tokens
+
+    def expect(self, tokens: set[str]) -> Token:
+        token = self._peek
+        if token.type not in tokens:
+            raise UnexpectedToken(token, tokens)
+        self._peek = self._scan(self._end)
+        return token
+
+    def chunks(
+        self, terminal_ids: dict[str, int], unknown: int, size: int = 4096
+    ) -> Iterator[TokenChunk]:
+        """
+        Scan the rest of the text into chunks of size tokens, without creating
+        Tokens. Text that cannot be lexed ends the chunk before it, and the
+        error is raised when the chunk after it is asked for, so it is only
+        reported if the parse gets that far, as with the lexer.
+        """
+        spec, text = self._spec, self._text
+        skip, literals = spec.skip, spec.literals
+        patterns = [(terminal_ids.get(name, unknown), name, pattern) for name, pattern in spec.patterns]
+        length = len(text)
+        pos = self._peek.pos
+        types, starts, ends, names = array("i"), array("q"), array("q"), {}
+        while True:
+            if skip is not None:
+                pos = skip.match(text, pos).end()
+            if pos >= length:
+                types.append(terminal_ids.get("EOF", unknown))
+                starts.append(pos)
+                ends.append(pos)
+                self._end = pos
+                self._peek = Token("EOF", "", pos)
+                yield TokenChunk(types, starts, ends, text, names=names)
+                return
+
+            end, kind, name = pos, -1, None
+            if literals is not None:
+                match = literals.match(text, pos)
+                if match is not None:
+                    end, name = match.end(), match.group()
+                    kind = terminal_ids.get(name, unknown)
+            for terminal, pattern_name, pattern in patterns:
+                match = pattern.match(text, pos)
+                if match is not None and match.end() > end:
+                    end, kind, name = match.end(), terminal, pattern_name
+            if kind == -1 or end == pos:
+                if types:
+                    yield TokenChunk(types, starts, ends, text, names=names)
+                raise UnexpectedCharacter(text[pos], pos)
+
+            if kind == unknown:
+                names[len(types)] = name
+            types.append(kind)
+            starts.append(pos)
+            ends.append(end)
+            pos = end
+            if len(types) == size:
+                yield TokenChunk(types, starts, ends, text, names=names)
+                types, starts, ends, names = array("i"), array("q"), array("q"), {}
+
+
+class _BytesSpec:
+    """The rules of a LexerSpec compiled to bytes patterns for one encoding."""
+
+    def __init__(
+        self,
+        terminals: tuple[str, ...],
+        skip: tuple[str, ...],
+        patterns: dict[str, str],
+        encoding: str,
+    ) -> None:
+        self.encoding = encoding
+        self.types = {
+            terminal.encode(encoding): terminal
+            for terminal in terminals
+            if terminal not in patterns
+        }
+        literals = sorted(self.types, key=lambda literal: (-len(literal), literal))
+        self.literals = re.compile(b"|".join(map(re.escape, literals))) if literals else None
+        self.patterns = [
+            (name, re.compile(pattern.encode(encoding))) for name, pattern in patterns.items()
+        ]
+        skip_pattern = b"|".join(b"(?:" + pattern.encode(encoding) + b")" for pattern in skip)
+        self.skip = re.compile(b"(?:" + skip_pattern + b")*") if skip_pattern else None
+
+
+@dataclass(frozen=True)
+class SpanToken:
+    """A token that refers to its bytes in the buffer and decodes its value on access."""
+
+    type: str
+    pos: int
+    end: int
+    source: Buffer = field(repr=False, compare=False)
+    encoding: str = field(default="utf-8", repr=False, compare=False)
+
+    @property
+    def value(self) -> str:
+        return str(self.source[self.pos : self.end], self.encoding)
+
+
+class BytesLexer(Lexer):
+    def __init__(self, spec: _BytesSpec, buffer: Buffer, pos: int = 0) -> None:
+        self._spec = spec
+        self._buffer = buffer
+        self._end = pos
+        self._peek = self._scan(pos)
+
+    def _scan(self, pos: int) -> SpanToken:
+        spec, buffer = self._spec, self._buffer
+        if spec.skip is not None:
+            pos = spec.skip.match(buffer, pos).end()
+        if pos >= len(buffer):
+            self._end = pos
+            return SpanToken("EOF", pos, pos, buffer, spec.encoding)
+
+        end, kind = pos, None
+        if spec.literals is not None:
+            match = spec.literals.match(buffer, pos)
+            if match is not None:
+                end, kind = match.end(), spec.types[match.group()]
+        for name, pattern in spec.patterns:
+            match = pattern.match(buffer, pos)
+            if match is not None and match.end() > end:
+                end, kind = match.end(), name
+
+        if kind is None or end == pos:
+            char = bytes(buffer[pos : pos + 1]).decode(spec.encoding, "replace")
+            raise UnexpectedCharacter(char, pos)
+        self._end = end
+        return SpanToken(kind, pos, end, buffer, spec.encoding)
+
+    def peek(self) -> SpanToken:
+        return self._peek
+
+    def has(self, tokens: set[str]) -> bool:
+        return self._peek.type in tokens
+
+    def expect(self, tokens: set[str]) -> SpanToken:
+        token = self._peek
+        if token.type not in tokens:
+            raise UnexpectedToken(token, tokens)
+        self._peek = self._scan(self._end)
+        return token
@@ -0,0 +1,188 @@
+"""
+    Parses one large input on several cores.
+
+    The input must be a sequence of records, subtrees of one non-terminal
+    that start with a synchronizing terminal. It is cut into ranges just
+    before an occurrence of the synchronizing terminal, and every range is
+    parsed in a worker process as a run of records: a record is parsed at each
+    token that can start one, and tokens between records are skipped. The
+    records come back with global token positions and the position of the
+    token that follows them.
+
+    The cuts are only guesses: a synchronizing terminal may also occur inside
+    a comment or a string, and the tokens skipped between records may not be
+    separators. So the workers' records are only candidates, and the tree is
+    stitched in the main process by parser.incremental.reparse. It parses the
+    whole input from the start and, where it expands the record non-terminal
+    at the position of a candidate, takes the candidate and moves the lexer
+    past it. A record only depends on the tokens from its first token on and
+    on the token after it, so a candidate that is used is exactly the subtree
+    a serial parse would build there, and input that no worker parsed
+    correctly is parsed in the main process.
+
+    Two parts of the work stay serial and bound the speedup: the main process
+    unpickles the records of every range as they arrive, and the stitching
+    reparse visits every token between records and every record root. Both
+    grow with the input, and unpickling a record costs a fair part of
+    parsing it, so the speedup levels off as processes are added however
+    many there are.
+
+    Text is passed to the workers once per worker. A file is opened by every
+    worker through its own memory map, and by the main process through one
+    that is closed when the parse is done; its tokens are decoded Tokens with
+    byte offsets as positions. Garbage collection is off in the workers and
+    paused in the main process while it collects and stitches the records.
+
+    The records and the stitched tree are built without shapes, since the
+    stitching needs every token; a ShapedParser shapes the tree it returns,
+    see ShapedParser.shape.
+"""
+import gc
+import mmap
+import os
+import re
+from multiprocessing import Pool
+from typing import Optional, Union
+from parser.incremental import reparse
+from parser.lexer import LexerSpec, SpanToken
+from parser.parser import Parser, Lexer, ParseTree, Token, UnexpectedToken, gc_paused
+from parser.shape import ShapedParser
+from def_parser.lexer import UnexpectedCharacter
+
+Candidates = dict[tuple[str, int], tuple[ParseTree, int, int]]
+
+_parser: Optional[Parser] = None
+_spec: Optional[LexerSpec] = None
+_source: Union[str, mmap.mmap, None] = None
+_record: str = ""
+
+
+class DecodedLexer(Lexer):
+    """A lexer that turns the SpanTokens of a bytes lexer into Tokens."""
+
+    def __init__(self, lexer: Lexer) -> None:
+        self._lexer = lexer
+        self._peek = self._decode(lexer.peek())
+
+    @staticmethod
+    def _decode(token: SpanToken) -> Token:
+        return Token(token.type, token.value, token.pos)
+
+    def peek(self) -> Token:
+        return self._peek
+
+    def has(self, tokens: set[str]) -> bool:
+        return self._peek.type in tokens
+
+    def expect(self, tokens: set[str]) -> Token:
+        token = self._peek
+        if token.type not in tokens:
+            raise UnexpectedToken(token, tokens)
+        self._lexer.expect(tokens)
+        self._peek = self._decode(self._lexer.peek())
+        return token
+
+
+def _open(path: str) -> Union[bytes, mmap.mmap]:
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _lexer(spec: LexerSpec, source: Union[str, bytes, mmap.mmap], pos: int) -> Lexer:
+    if isinstance(source, str):
+        return spec.lexer(source, pos)
+    return DecodedLexer(spec.bytes_lexer(source, pos))
+
+
+def boundaries(
+    source: Union[str, bytes, mmap.mmap], spec: LexerSpec, sync: str, parts: int
+) -> list[int]:
+    """Return the start of every range: 0 and an occurrence of sync after every cut."""
+    patterns = {name: pattern.pattern for name, pattern in spec.patterns}
+    pattern = patterns.get(sync, re.escape(sync))
+    if not isinstance(source, str):
+        pattern = pattern.encode()
+    search = re.compile(pattern).search
+    starts = [0]
+    for part in range(1, parts):
+        match = search(source, max(starts[-1] + 1, len(source) * part // parts))
+        if match is None:
+            break
+        starts.append(match.start())
+    return starts
+
+
+def _init_worker(
+    parser: Parser, spec: LexerSpec, source: Union[str, tuple[str]], record: str
+) -> None:
+    global _parser, _spec, _source, _record
+    gc.disable()
+    _parser, _spec, _record = parser, spec, record
+    _source = source if isinstance(source, str) else _open(source[0])
+
+
+def _parse_range(bounds: tuple[int, int]) -> list[tuple[int, ParseTree, int]]:
+    """Parse the records that start in [start, end) into (position, tree, resume) triples."""
+    start, end = bounds
+    record = _parser.table.non_terminal_ids[_record]
+    first = _parser.table.predict(record)
+    records = []
+    try:
+        lexer = _lexer(_spec, _source, start)
+        while True:
+            token = lexer.peek()
+            if token.type == "EOF" or token.pos >= end:
+                break
+            if token.type not in first:
+                lexer.expect({token.type})
+                continue
+            tree = _parser.parse_iterative(lexer, _record)
+            records.append((token.pos, tree, lexer.peek().pos))
+    except (UnexpectedToken, UnexpectedCharacter):
+        # A bad guess at a boundary; what is missing is parsed by the main process.
+        pass
+    return records
+
+
+def parse_parallel(
+    parser: Union[Parser, ShapedParser],
+    spec: LexerSpec,
+    source: Union[str, os.PathLike],
+    record: str,
+    sync: str,
+    processes: Optional[int] = None,
+    parts: Optional[int] = None,
+) -> ParseTree:
+    """
+    Parse text, or the file at a path, in a pool of worker processes. The
+    tree is the same as a serial parse with the built-in lexer would build.
+    """
+    shaped = parser if isinstance(parser, ShapedParser) else None
+    if shaped is not None:
+        parser = shaped.parser
+    if isinstance(source, str):
+        data: Union[str, bytes, mmap.mmap] = source
+        shared: Union[str, tuple[str]] = source
+    else:
+        data = _open(os.fspath(source))
+        shared = (os.fspath(source),)
+
+    processes = processes or os.cpu_count() or 1
+    try:
+        starts = boundaries(data, spec, sync, parts or processes * 4)
+        ranges = list(zip(starts, starts[1:] + [len(data)]))
+
+        candidates: Candidates = {}
+        with gc_paused():
+            with Pool(processes, initializer=_init_worker, initargs=(parser, spec, shared, record)) as pool:
+                for records in pool.imap(_parse_range, ranges):
+                    for pos, tree, resume in records:
+                        candidates[(record, pos)] = (tree, 0, resume)
+            tree, _ = reparse(parser, data, lambda text, pos: _lexer(spec, text, pos), candidates)
+    finally:
+        # The tokens are decoded, so nothing in the tree refers to the map.
+        if isinstance(data, mmap.mmap):
+            data.close()
+    return shaped.shape(tree) if shaped is not None else tree
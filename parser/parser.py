@@ -1,10 +1,24 @@
 """
     A ll(1) parser for the language defined in the grammar file.
+
+    Tokens come either from a Lexer, one method call per decision, or in bulk
+    from a TokenSource. A TokenSource hands over chunks of tokens as arrays of
+    terminal ids with their offsets, which parse_tokens consumes by index.
+
+    All table-driven parses run the one explicit stack driver, drive. What a
+    parse produces is up to the Builder whose hooks the driver calls: trees,
+    events, or, in other modules, flat arrays, profiles and shaped trees.
 """
-from dataclasses import dataclass
-from typing import Union
-from def_parser.parser import Rule, Terminal, NonTerminal
+import gc
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Iterator, Optional, Union
+from def_parser.parser import Rule, Terminal, NonTerminal, is_synthetic
 from analysis.analyzer import Analyzer
+from def_parser.source import Located, SourceMap
+from parser.table import ParseTable, ERROR
 
 
 @dataclass(frozen=True)
@@ -16,10 +30,35 @@ class Token:
     pos: int
 
 
-@dataclass(frozen=True, eq=True)
+@dataclass(frozen=True, eq=False)
 class ParseTree:
     id: str
     children: list[Union[Token, "ParseTree"]]
+    # Given to the root of a tree parsed from a known source, see def_parser.source.
+    source_map: Optional[SourceMap] = field(default=None, compare=False, repr=False)
+
+    def __eq__(self, other: object) -> bool:
+        # By content, so subclasses like parser.incremental.ShiftedTree compare equal too.
+        if not isinstance(other, ParseTree):
+            return NotImplemented
+        return self.id == other.id and self.children == other.children
+
+    def __hash__(self) -> int:
+        return hash((self.id, self.children))
+
+
+class EventType(Enum):
+    ENTER = "enter"
+    TOKEN = "token"
+    EXIT = "exit"
+
+
+@dataclass(frozen=True)
+class Event:
+    """A parse event. The value is the rule id for ENTER and EXIT, the token for TOKEN."""
+
+    type: EventType
+    value: Union[str, Token]
 
 
 class AmbiguousGrammarError(Exception):
@@ -28,16 +67,21 @@ class AmbiguousGrammarError(Exception):
         super().__init__(f"Ambiguous grammar: {rules}")
 
 
-class UnexpectedToken(Exception):
+class UnexpectedToken(Located, Exception):
     """Exception raised when the parser encounters an unexpected token."""
 
     def __init__(self, token: Token, expected: set[str]) -> None:
+        super().__init__(token, expected)
         self.token = token
         self.expected = expected
 
     def __str__(self) -> str:
         return f"Unexpected token {self.token} at position {self.token.pos}, expected {self.expected}"
 
+    @property
+    def offset(self) -> int:
+        return self.token.pos
+
 
 class Lexer:
     """Abstract lexer class."""
@@ -55,33 +99,454 @@ class Lexer:
         raise NotImplementedError
 
 
+@dataclass(frozen=True)
+class TokenChunk:
+    """
+    A run of tokens: types[i] is the terminal id of token i and starts[i] and
+    ends[i] delimit its value in source. The offsets are 64-bit arrays ("q"),
+    so sources past 2 GiB fit. A source that cannot be sliced for the values,
+    like the one of an adapted Lexer, passes the tokens instead. Tokens of
+    terminals the parser does not know have the unknown id; names holds
+    their types by index, for error messages.
+    """
+
+    types: array
+    starts: array
+    ends: array
+    source: str = ""
+    tokens: Optional[list[Token]] = None
+    names: Optional[dict[int, str]] = None
+
+    def token(self, idx: int, terminals: list[str]) -> Token:
+        if self.tokens is not None:
+            return self.tokens[idx]
+        start, kind = self.starts[idx], self.types[idx]
+        name = terminals[kind] if kind < len(terminals) else self.names[idx]
+        return Token(name, self.source[start : self.ends[idx]], start)
+
+
+class TokenSource:
+    """Abstract bulk token source."""
+
+    def chunks(self, terminal_ids: dict[str, int], unknown: int) -> Iterator[TokenChunk]:
+        """
+        Yield the remaining tokens in chunks, the last one ending with EOF.
+        Terminals are numbered by terminal_ids, unknown terminals as unknown.
+        """
+        raise NotImplementedError
+
+
+class LexerTokenSource(TokenSource):
+    """A TokenSource that reads the tokens from a Lexer."""
+
+    def __init__(self, lexer: Lexer, size: int = 4096) -> None:
+        self._lexer = lexer
+        self._size = size
+
+    def chunks(self, terminal_ids: dict[str, int], unknown: int) -> Iterator[TokenChunk]:
+        lexer = self._lexer
+        while True:
+            types, starts, ends, tokens = array("i"), array("q"), array("q"), []
+            for _ in range(self._size):
+                token = lexer.peek()
+                types.append(terminal_ids.get(token.type, unknown))
+                starts.append(token.pos)
+                ends.append(token.pos + len(token.value))
+                tokens.append(token)
+                if token.type == "EOF":
+                    yield TokenChunk(types, starts, ends, tokens=tokens)
+                    return
+                lexer.expect({token.type})
+            yield TokenChunk(types, starts, ends, tokens=tokens)
+
+
 class Parser:
-    def __init__(self, rules: list[Rule]) -> None:
+    def __init__(
+        self,
+        rules: list[Rule],
+        compiled: bool = True,
+        analysis: Analyzer | None = None,
+        start: Optional[str] = None,
+    ) -> None:
         self._rules = rules
-        self._analysis = Analyzer(rules)
+        self._analysis = analysis if analysis is not None else Analyzer(rules, start)
         if self._analysis.is_ambiguous():
             raise AmbiguousGrammarError(self._analysis.ambiguous())
+        # Built on first use, a parser that is not compiled may never need it.
+        self._table: Optional[ParseTable] = None
+        self._compiled = compiled
+        # The parsers of all start symbols used so far, shared by all of them.
+        self._starts: dict[str, Parser] = {self._analysis.start: self}
+
+    @property
+    def table(self) -> ParseTable:
+        if self._table is None:
+            self._table = ParseTable(self._analysis)
+        return self._table
+
+    @property
+    def analysis(self) -> Analyzer:
+        return self._analysis
+
+    @property
+    def start(self) -> str:
+        return self._analysis.start
+
+    def for_start(self, start: str) -> "Parser":
+        """
+        Return a parser for the language of the non-terminal start. It is
+        analysed over the rules reachable from start when it is first asked for.
+        """
+        if start not in self._starts:
+            parser = Parser(self._rules, self._compiled, start=start)
+            parser._starts = self._starts
+            self._starts[start] = parser
+        return self._starts[start]
     
+    def builder(self) -> "TreeBuilder":
+        """Return a new builder of the trees this parser returns, for the drivers of other modules."""
+        return TreeBuilder(self.table)
+
     def parse(self, lexer: Lexer) -> ParseTree:
+        """
+        Parse the input with the table-driven driver, which keeps its stack
+        in a list, so input of any depth parses. A parser that is not
+        compiled interprets the analysis recursively, as a baseline.
+        """
+        if self._compiled:
+            table = self.table
+            return build(table, lexer, TreeBuilder(table))
         return self._parse(lexer, self._analysis.start)
+
+    def parse_recursive(self, lexer: Lexer) -> ParseTree:
+        """
+        Parse the input with the table by recursive descent, one Python call
+        per node. Input nested deeper than the recursion limit raises
+        RecursionError; this is the baseline the driver is measured against.
+        """
+        return self._parse_compiled(lexer, self.table.start)
+
+    def parse_iterative(self, lexer: Lexer, start: Optional[str] = None) -> ParseTree:
+        """
+        Parse the input with an explicit stack instead of recursion.
+        The Python stack depth stays constant however deeply the input nests.
+        start names the non-terminal to parse, by default the parser's start
+        symbol; its predictions follow from the parser's start symbol, not
+        from its own, see for_start. Parsing stops when it is complete,
+        without looking for EOF.
+        """
+        table = self.table
+        symbol = None if start is None else table.non_terminal_ids[start]
+        return build(table, lexer, TreeBuilder(table), symbol)
+
+    def parse_tokens(self, source: Union[TokenSource, Lexer]) -> ParseTree:
+        """
+        Parse a bulk token source with an explicit stack. Terminals are matched
+        by comparing ids in the chunk arrays, without calls into the lexer.
+        A plain Lexer is read through a LexerTokenSource.
+        """
+        if not isinstance(source, TokenSource):
+            source = LexerTokenSource(source)
+        table = self.table
+        return build(table, source.chunks(table.terminal_ids, table.unknown), TreeBuilder(table))
+
+    def events(self, lexer: Lexer) -> Iterator[Event]:
+        """
+        Parse the input lazily, yielding ENTER, TOKEN and EXIT events instead of
+        building a tree. Tokens are pulled from the lexer only as events are
+        consumed, and memory is bounded by the nesting depth of the input.
+        """
+        builder = EventBuilder(self.table)
+        events = builder.events
+        for _ in drive(self.table, lexer, builder, lazy=True):
+            yield from events
+            events.clear()
+        yield from events
+
+    def _parse_compiled(self, lexer: Lexer, nonterm: int) -> ParseTree:
+        """Parse the input using the dispatch table, one lookup per decision."""
+        table = self.table
+        token = lexer.peek()
+        rule = table.lookup(nonterm, token.type)
+        if rule == ERROR:
+            raise UnexpectedToken(token, table.predict(nonterm))
+
+        children: list[Union[Token, ParseTree]] = []
+        self._parse_symbols(lexer, table.productions[rule], children)
+        return ParseTree(table.names[rule], children)
+
+    def _parse_symbols(
+        self, lexer: Lexer, production: tuple[int, ...], children: list[Union[Token, ParseTree]]
+    ) -> None:
+        """
+        Parse the symbols of a production into children. A synthetic
+        non-terminal adds its symbols to the same children, and a repetition
+        runs as a loop over its iterations.
+        """
+        table = self.table
+        for symbol in production:
+            if symbol < 0:
+                children.append(lexer.expect(table.expects[~symbol]))
+            elif not table.synthetic[symbol]:
+                children.append(self._parse_compiled(lexer, symbol))
+            else:
+                while True:
+                    token = lexer.peek()
+                    rule = table.lookup(symbol, token.type)
+                    if rule == ERROR:
+                        raise UnexpectedToken(token, table.predict(symbol))
+                    if not table.loops[rule]:
+                        self._parse_symbols(lexer, table.productions[rule], children)
+                        break
+                    self._parse_symbols(lexer, table.productions[rule][:-1], children)
     
     def _parse(self, lexer: Lexer, nonterm: str) -> ParseTree:
         """Parse the input using the given nonterminal."""
+        return self._parse_rule(lexer, self._predict(lexer, nonterm))
+
+    def _predict(self, lexer: Lexer, nonterm: str) -> Rule:
         if not lexer.has(self._analysis.predict_non_term(nonterm)):
             raise UnexpectedToken(lexer.peek(), self._analysis.predict_non_term(nonterm))
         
         for rule in self._analysis.rules(nonterm):
             if lexer.has(self._analysis.predict_rule(rule)):
-                return self._parse_rule(lexer, rule)
+                return rule
         
         assert False, "Unreachable"
     
     def _parse_rule(self, lexer: Lexer, rule: Rule) -> ParseTree:
-        children = []
-        for symbol in rule.production:
+        children: list[Union[Token, ParseTree]] = []
+        self._parse_production(lexer, rule.production, children)
+        return ParseTree(rule.id, children)
+
+    def _parse_production(
+        self,
+        lexer: Lexer,
+        production: tuple[Terminal | NonTerminal, ...],
+        children: list[Union[Token, ParseTree]],
+    ) -> None:
+        for symbol in production:
             if isinstance(symbol, Terminal):
                 children.append(lexer.expect({symbol.id}))
-            else:
+            elif not is_synthetic(symbol.id):
                 children.append(self._parse(lexer, symbol.id))
-        
-        return ParseTree(rule.id, children)
+            else:
+                while True:
+                    rule = self._predict(lexer, symbol.id)
+                    if not rule.production or rule.production[-1].id != symbol.id:
+                        self._parse_production(lexer, rule.production, children)
+                        break
+                    self._parse_production(lexer, rule.production[:-1], children)
+
+
+def make_token(type: str, value: str, pos: int) -> Token:
+    """
+    Return Token(type, value, pos). Its fields are filled in directly: the
+    generated __init__ of a frozen dataclass costs more than a parse step.
+    """
+    token = _new(Token)
+    attributes = token.__dict__
+    attributes["type"] = type
+    attributes["value"] = value
+    attributes["pos"] = pos
+    return token
+
+
+_new = object.__new__
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """
+    Pause garbage collection for a block that builds a large tree. Trees hold
+    no reference cycles, so the collector's scans of the growing heap would
+    find nothing to free.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class Builder:
+    """
+    What drive does with a parse. token receives every token that is
+    matched, enter is called when a rule is chosen for a node, with the
+    position of the node's first token, and exit when the node is complete.
+    Rules of synthetic non-terminals are inline and open no node.
+    """
+
+    # Expansions that replace those of the table, see drive.
+    expansions: Optional[list[tuple[int, ...]]] = None
+    # Called as reuse(non_terminal, token) before a rule is chosen, see drive.
+    reuse: Optional[Callable[[int, Token], Optional[Lexer]]] = None
+
+    def token(self, token: Token) -> None:
+        pass
+
+    def enter(self, rule: int, pos: int) -> None:
+        pass
+
+    def exit(self, rule: int) -> None:
+        pass
+
+    def result(self) -> object:
+        return None
+
+
+class TreeBuilder(Builder):
+    """Builds the ParseTree of the input."""
+
+    def __init__(self, table: ParseTable) -> None:
+        self.names = table.names
+        self.children: list[Union[Token, ParseTree]] = []
+        # The children lists of the enclosing nodes.
+        self.parents: list[list[Union[Token, ParseTree]]] = []
+
+    def token(self, token: Token) -> None:
+        self.children.append(token)
+
+    def enter(self, rule: int, pos: int) -> None:
+        self.parents.append(self.children)
+        self.children = []
+
+    def exit(self, rule: int) -> None:
+        node = ParseTree(self.names[rule], self.children)
+        self.children = self.parents.pop()
+        self.children.append(node)
+
+    def result(self) -> ParseTree:
+        return self.children[0]
+
+
+class EventBuilder(Builder):
+    """Collects the ENTER, TOKEN and EXIT events of the input in events."""
+
+    def __init__(self, table: ParseTable) -> None:
+        self.events: list[Event] = []
+        self._enters = [Event(EventType.ENTER, name) for name in table.names]
+        self._exits = [Event(EventType.EXIT, name) for name in table.names]
+
+    def token(self, token: Token) -> None:
+        self.events.append(Event(EventType.TOKEN, token))
+
+    def enter(self, rule: int, pos: int) -> None:
+        self.events.append(self._enters[rule])
+
+    def exit(self, rule: int) -> None:
+        self.events.append(self._exits[rule])
+
+
+def drive(
+    table: ParseTable,
+    tokens: Union[Lexer, Iterator[TokenChunk]],
+    builder: Builder,
+    start: Optional[int] = None,
+    lazy: bool = False,
+) -> Iterator[None]:
+    """
+    The explicit stack ll(1) driver behind every table-driven parse. It
+    parses the non-terminal start, by default the table's start symbol, and
+    stops when it is complete, without looking for EOF.
+
+    Tokens come from a Lexer, or from the chunks of a TokenSource, which are
+    matched by terminal id. The builder's hooks are told about the parse. Its
+    expansions, if it has them, may encode a terminal t as ~(t + len(terminals) + 1):
+    the terminal is matched but not passed to the builder. With a lexer,
+    the builder's reuse hook, if it has one, may take over a non-terminal:
+    it returns the lexer to continue with after it, or None to parse it. For
+    a non-terminal that repeats it takes over whole iterations, after which
+    the repetition is expanded again.
+
+    drive is a generator. It only yields when it is lazy, after every token
+    and the nodes that token completes, unless that completes the parse;
+    otherwise it runs to the end on the first next().
+    """
+    rows, terminal_ids, unknown = table.rows, table.terminal_ids, table.unknown
+    expects, marker, inline, terminals = table.expects, table.marker, table.inline, table.terminals
+    repeats = table.repeats
+    expansions = builder.expansions if builder.expansions is not None else table.expansions
+    dropped = len(terminals) + 1
+    on_token, enter, exit, reuse = builder.token, builder.enter, builder.exit, builder.reuse
+
+    bulk = not isinstance(tokens, Lexer)
+    if bulk:
+        chunks = tokens
+        types, idx, count = (), 0, 0
+    else:
+        lexer = tokens
+
+    stack = [table.start if start is None else start]
+    pop, extend = stack.pop, stack.extend
+    while stack:
+        symbol = pop()
+        if symbol >= marker:
+            exit(symbol - marker)
+            continue
+        if bulk and idx == count:
+            chunk = next(chunks)
+            types, starts, ends, idx, count = chunk.types, chunk.starts, chunk.ends, 0, len(chunk.types)
+            text = chunk.source if chunk.tokens is None else None
+
+        if symbol < 0:
+            terminal = ~symbol
+            keep = terminal < dropped
+            if not keep:
+                terminal -= dropped
+            if not bulk:
+                token = lexer.expect(expects[terminal])
+                if keep:
+                    on_token(token)
+            else:
+                if types[idx] != terminal:
+                    raise UnexpectedToken(chunk.token(idx, terminals), expects[terminal])
+                if keep:
+                    if text is None:
+                        on_token(chunk.tokens[idx])
+                    else:
+                        pos = starts[idx]
+                        on_token(make_token(terminals[terminal], text[pos : ends[idx]], pos))
+                idx += 1
+            if lazy:
+                while stack and stack[-1] >= marker:
+                    exit(pop() - marker)
+                if stack:
+                    yield
+            continue
+
+        if not bulk:
+            token = lexer.peek()
+            if reuse is not None:
+                resumed = reuse(symbol, token)
+                if resumed is not None:
+                    lexer = resumed
+                    if repeats[symbol]:
+                        stack.append(symbol)
+                    continue
+            rule = rows[symbol].get(terminal_ids.get(token.type, unknown), ERROR)
+            if rule == ERROR:
+                raise UnexpectedToken(token, table.predict(symbol))
+            pos = token.pos
+        else:
+            rule = rows[symbol].get(types[idx], ERROR)
+            if rule == ERROR:
+                raise UnexpectedToken(chunk.token(idx, terminals), table.predict(symbol))
+            pos = starts[idx]
+        extend(expansions[rule])
+        if not inline[rule]:
+            enter(rule, pos)
+
+
+def build(
+    table: ParseTable,
+    tokens: Union[Lexer, Iterator[TokenChunk]],
+    builder: Builder,
+    start: Optional[int] = None,
+) -> object:
+    """Run drive to the end and return the builder's result."""
+    for _ in drive(table, tokens, builder, start):
+        pass
+    return builder.result()
@@ -0,0 +1,173 @@
+"""
+    Opt-in profiling of a parse.
+
+    profile_parse runs the explicit stack driver with a builder that times
+    every node, so Parser.parse and Parser.parse_iterative carry no
+    instrumentation at all and pay nothing when profiling is not used.
+
+    For every non-terminal ParseStats counts the expansions and measures the
+    cumulative time, from choosing the rule until the rule is complete, and
+    the self time, which excludes the time spent in nested non-terminals. Time
+    spent in the lexer is part of the self time of the non-terminal that asked
+    for the token. Lexer calls are counted per method and prediction hits per
+    rule. Self time is also kept per stack of non-terminals, which collapsed()
+    writes in the collapsed stack format read by flame graph tools. Stacks
+    are interned as frames of a trie, one per parent frame and non-terminal,
+    so an expansion costs one lookup whatever its depth; the names along a
+    stack are only joined when it is read. The tree is built by the builder
+    of the parser, so a ShapedParser's profile returns shaped trees.
+
+    ParseStats.record is called once for every completed expansion; subclasses
+    can override it to receive the measurements as they happen.
+"""
+from time import perf_counter_ns
+from typing import Union
+from def_parser.parser import Rule
+from parser.parser import Parser, Lexer, Token, ParseTree, Builder, build
+from parser.shape import ShapedParser
+from parser.table import ParseTable
+
+
+ROOT = -1
+
+
+class ParseStats:
+    def __init__(self) -> None:
+        self.expansions: dict[str, int] = {}
+        self.cumulative_ns: dict[str, int] = {}
+        self.self_ns: dict[str, int] = {}
+        self.predictions: dict[Rule, int] = {}
+        self.lexer_calls: dict[str, int] = {"peek": 0, "has": 0, "expect": 0}
+        # The trie of stacks: the frame of every (parent frame, non-terminal), and per frame its parent and name.
+        self._frames: dict[tuple[int, str], int] = {}
+        self._parents: list[int] = []
+        self._names: list[str] = []
+        self._frame_ns: dict[int, int] = {}
+
+    def frame(self, parent: int, name: str) -> int:
+        """Return the frame of the stack of parent followed by name; the empty stack is ROOT."""
+        key = (parent, name)
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self._frames[key] = len(self._names)
+            self._parents.append(parent)
+            self._names.append(name)
+        return frame
+
+    def stack(self, frame: int) -> tuple[str, ...]:
+        """Return the names of the non-terminals on the stack of a frame, outermost first."""
+        names = []
+        while frame != ROOT:
+            names.append(self._names[frame])
+            frame = self._parents[frame]
+        return tuple(reversed(names))
+
+    def record(self, frame: int, rule: Rule, cumulative_ns: int, self_ns: int, outermost: bool) -> None:
+        """
+        Record one completed expansion of rule. frame is the stack of the
+        non-terminals being expanded, ending with rule.id, see stack. outermost
+        is False for a recursive expansion whose time is already counted in the
+        cumulative time of an enclosing expansion of the same non-terminal.
+        """
+        name = rule.id
+        self.expansions[name] = self.expansions.get(name, 0) + 1
+        self.predictions[rule] = self.predictions.get(rule, 0) + 1
+        self.self_ns[name] = self.self_ns.get(name, 0) + self_ns
+        if outermost:
+            self.cumulative_ns[name] = self.cumulative_ns.get(name, 0) + cumulative_ns
+        self._frame_ns[frame] = self._frame_ns.get(frame, 0) + self_ns
+
+    @property
+    def stacks(self) -> dict[tuple[str, ...], int]:
+        """The self time per stack of non-terminals."""
+        paths = self._paths(tuple, lambda path, name: path + (name,))
+        return {paths[frame]: ns for frame, ns in self._frame_ns.items()}
+
+    def collapsed(self) -> str:
+        """Return the self time per stack in microseconds, one 'a;b;c count' line per stack."""
+        paths = self._paths(str, lambda path, name: f"{path};{name}" if path else name)
+        return "".join(
+            f"{stack} {ns // 1000}\n"
+            for stack, ns in sorted((paths[frame], ns) for frame, ns in self._frame_ns.items())
+        )
+
+    def _paths(self, empty, extend) -> list:
+        # A parent frame is always created before its children, so one pass builds every path.
+        paths: list = []
+        for parent, name in zip(self._parents, self._names):
+            paths.append(extend(paths[parent] if parent != ROOT else empty(), name))
+        return paths
+
+    def report(self, limit: int | None = None) -> str:
+        """Return a table of the non-terminals sorted by their self time."""
+        names = sorted(self.self_ns, key=self.self_ns.__getitem__, reverse=True)[:limit]
+        lines = [f"{'non-terminal':<30}{'count':>10}{'cumulative ms':>15}{'self ms':>12}"]
+        for name in names:
+            lines.append(
+                f"{name:<30}{self.expansions[name]:>10}"
+                f"{self.cumulative_ns.get(name, 0) / 1e6:>15.3f}{self.self_ns[name] / 1e6:>12.3f}"
+            )
+        calls = ", ".join(f"{method} {count}" for method, count in self.lexer_calls.items())
+        lines.append(f"lexer calls: {calls}")
+        return "\n".join(lines)
+
+
+class CountingLexer(Lexer):
+    """A lexer that counts the calls made to the lexer it wraps."""
+
+    def __init__(self, lexer: Lexer, calls: dict[str, int]) -> None:
+        self._lexer = lexer
+        self._calls = calls
+
+    def peek(self) -> Token:
+        self._calls["peek"] += 1
+        return self._lexer.peek()
+
+    def has(self, tokens: set[str]) -> bool:
+        self._calls["has"] += 1
+        return self._lexer.has(tokens)
+
+    def expect(self, tokens: set[str]) -> Token:
+        self._calls["expect"] += 1
+        return self._lexer.expect(tokens)
+
+
+class ProfileBuilder(Builder):
+    """Builds the tree of a parse with another builder while timing its expansions into a ParseStats."""
+
+    def __init__(self, table: ParseTable, stats: ParseStats, builder: Builder) -> None:
+        self._builder = builder
+        self.token = builder.token
+        self.result = builder.result
+        self.expansions = builder.expansions
+        self.names = table.names
+        self._rules = table.rules
+        self._stats = stats
+        # One frame per expansion in progress: its start time and the time spent in nested expansions.
+        self._starts: list[int] = []
+        self._nested: list[int] = [0]
+        self._frames: list[int] = [ROOT]
+        self._active: dict[str, int] = {}
+
+    def enter(self, rule: int, pos: int) -> None:
+        self._builder.enter(rule, pos)
+        name = self.names[rule]
+        self._starts.append(perf_counter_ns())
+        self._nested.append(0)
+        self._frames.append(self._stats.frame(self._frames[-1], name))
+        self._active[name] = self._active.get(name, 0) + 1
+
+    def exit(self, rule: int) -> None:
+        name = self.names[rule]
+        elapsed = perf_counter_ns() - self._starts.pop()
+        own = elapsed - self._nested.pop()
+        self._nested[-1] += elapsed
+        self._active[name] -= 1
+        self._stats.record(self._frames.pop(), self._rules[rule], elapsed, own, self._active[name] == 0)
+        self._builder.exit(rule)
+
+
+def profile_parse(parser: Union[Parser, ShapedParser], lexer: Lexer, stats: ParseStats) -> ParseTree:
+    """Parse like Parser.parse_iterative while recording into stats."""
+    lexer = CountingLexer(lexer, stats.lexer_calls)
+    return build(parser.table, lexer, ProfileBuilder(parser.table, stats, parser.builder()))
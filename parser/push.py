@@ -0,0 +1,168 @@
+"""
+    A push parser: the input is fed to it as it arrives instead of pulled
+    from a Lexer.
+
+    PushParser runs the driver of Parser.parse_iterative lazily, so it is
+    suspended between calls. push() takes one token and raises UnexpectedToken as soon as the
+    token cannot continue the parse; feed() takes raw text, lexes it with a
+    LexerSpec and pushes every token that is known to be complete. A token
+    that reaches the end of the text fed so far, or starts closer to it than
+    the length of the longest literal, could still grow, so it is held back
+    until more text arrives or the input is closed. Text that cannot be lexed
+    is held back the same way only while more text could still make it a
+    token or skipped text, see LexerSpec.incomplete; otherwise it is reported
+    by the feed() that brought it. Patterns must not depend on text beyond
+    the end of their match. Consumed text is dropped, so memory is bounded by
+    the pending text and the tree being built.
+
+    A PushParser builds its tree with the builder of its parser, so a
+    ShapedParser's PushParser returns shaped trees.
+
+    parse_stream drives a PushParser from an asyncio.StreamReader or an async
+    iterator of str or bytes chunks, so parsing overlaps with reading and many
+    streams can be parsed concurrently on one event loop.
+"""
+import asyncio
+import codecs
+from typing import AsyncIterable, Optional, Union
+from def_parser.lexer import UnexpectedCharacter
+from parser.parser import Parser, Lexer, ParseTree, Token, UnexpectedToken, drive
+from parser.lexer import LexerSpec
+from parser.shape import ShapedParser
+
+EOF = "EOF"
+
+
+class _Pushed(Lexer):
+    """The lexer of a PushParser's driver: the token pushed last, until it is matched."""
+
+    def __init__(self) -> None:
+        self.token: Optional[Token] = None
+
+    def peek(self) -> Token:
+        return self.token
+
+    def has(self, tokens: set[str]) -> bool:
+        return self.token.type in tokens
+
+    def expect(self, tokens: set[str]) -> Token:
+        token = self.token
+        if token.type not in tokens:
+            raise UnexpectedToken(token, tokens)
+        self.token = None
+        return token
+
+
+class PushParser:
+    def __init__(self, parser: Union[Parser, ShapedParser], spec: Optional[LexerSpec] = None) -> None:
+        self._table = parser.table
+        self._spec = spec
+        self._pushed = _Pushed()
+        self._builder = parser.builder()
+        self._driver = drive(self._table, self._pushed, self._builder, lazy=True)
+        self._done = False
+        self._error: Optional[Exception] = None
+        self._closed = False
+        self._text = ""
+        self._offset = 0
+
+    @property
+    def done(self) -> bool:
+        """True once the start symbol is complete, so only EOF may follow."""
+        return self._done
+
+    @property
+    def tree(self) -> Optional[ParseTree]:
+        return self._builder.result() if self.done else None
+
+    def push(self, token: Token) -> None:
+        """Advance the parse by one token, EOF included."""
+        if self._error is not None:
+            raise self._error
+        try:
+            self._push(token)
+        except UnexpectedToken as error:
+            self._error = error
+            raise
+
+    def _push(self, token: Token) -> None:
+        if not self._done:
+            self._pushed.token = token
+            try:
+                # The driver runs until it has matched the token.
+                next(self._driver)
+                return
+            except StopIteration:
+                self._done = True
+            if self._pushed.token is None:
+                return
+            self._pushed.token = None
+        if token.type != EOF:
+            raise UnexpectedToken(token, self._table.expects[self._table.terminal_ids[EOF]])
+
+    def feed(self, text: str) -> None:
+        """Lex text with the LexerSpec and push the tokens that are complete."""
+        if self._spec is None:
+            raise TypeError("feeding text needs a LexerSpec, push tokens instead")
+        if self._closed:
+            raise ValueError("the input is already closed")
+        self._text += text
+        self._lex()
+
+    def close(self) -> ParseTree:
+        """End the input: push the held back text and EOF, and return the tree."""
+        if not self._closed:
+            self._closed = True
+            if self._spec is not None:
+                self._lex()
+            end = self._offset + len(self._text)
+            self.push(Token(EOF, "", end))
+        if self._error is not None:
+            raise self._error
+        return self._builder.result()
+
+    def _lex(self) -> None:
+        spec, text, closed = self._spec, self._text, self._closed
+        pos = 0
+        try:
+            while True:
+                try:
+                    start, kind, end = spec.scan(text, pos)
+                except UnexpectedCharacter as error:
+                    # The text may be the prefix of a token that is not complete yet.
+                    if not closed and spec.incomplete(text, error.pos):
+                        break
+                    raise UnexpectedCharacter(error.char, self._offset + error.pos) from None
+                if kind is None:
+                    break
+                if not closed and (end == len(text) or len(text) - start < spec.longest_literal):
+                    break
+                self.push(Token(kind, text[start:end], self._offset + start))
+                pos = end
+        finally:
+            self._text = text[pos:]
+            self._offset += pos
+
+
+async def parse_stream(
+    parser: Union[Parser, ShapedParser],
+    spec: LexerSpec,
+    stream: Union[asyncio.StreamReader, AsyncIterable[Union[str, bytes]]],
+    encoding: str = "utf-8",
+    chunk_size: int = 65536,
+) -> ParseTree:
+    """
+    Parse the chunks of a stream as they arrive. Bytes are decoded
+    incrementally, so a multi-byte character may be split between chunks.
+    Token positions are character offsets into the decoded text.
+    """
+    push = PushParser(parser, spec)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    if isinstance(stream, asyncio.StreamReader):
+        while chunk := await stream.read(chunk_size):
+            push.feed(decoder.decode(chunk))
+    else:
+        async for chunk in stream:
+            push.feed(chunk if isinstance(chunk, str) else decoder.decode(chunk))
+    push.feed(decoder.decode(b"", final=True))
+    return push.close()
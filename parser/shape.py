@@ -0,0 +1,209 @@
+"""
+    Shaping of parse trees while they are built.
+
+    A Shape says how the nodes of a non-terminal are built: drop_empty leaves
+    out nodes without children, such as the expansions of epsilon rules,
+    collapse replaces a node with a single child by that child, inline splices
+    the children of the node into its parent, which flattens right-recursive
+    tail rules into one list, and drop_tokens discards the listed terminals
+    from the node's children. A Shaping holds the default Shape of a grammar
+    and the Shapes of single non-terminals, which replace the default for
+    their nodes and for the tokens of the groups, options and repetitions
+    written in their rules. The root of the
+    tree is always a ParseTree; only drop_tokens applies to it.
+
+    ShapedParser applies the shapes while the driver of Parser.parse_tokens
+    runs: discarded tokens are never turned into Token objects and discarded
+    nodes are never created. An inlined node adds its children straight to
+    the list of its parent, and a node that drop_empty discards because its
+    rule has nothing left to keep gets no list at all.
+
+    ShapedParser.shape shapes a tree that was built without shapes, such as
+    the trees kept by incremental and parallel parsing, which need every
+    token to find their way back into the text. The shaped tree is a
+    ShapedTree that shapes the children of a kept node when they are first
+    read, so only the parts of the tree that are read are shaped.
+"""
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, Union
+from def_parser.parser import SYNTHETIC
+from parser.parser import Parser, Lexer, LexerTokenSource, ParseTree, Token, TokenSource
+from parser.parser import TreeBuilder, build
+from parser.table import ParseTable
+
+# What happens to a node when its rule is complete. DROP is DROP_EMPTY for a
+# rule whose production is empty once its dropped tokens are left out.
+KEEP, DROP_EMPTY, COLLAPSE, DROP_EMPTY_COLLAPSE, INLINE, DROP = range(6)
+
+
+@dataclass(frozen=True)
+class Shape:
+    drop_empty: bool = False
+    collapse: bool = False
+    inline: bool = False
+    drop_tokens: frozenset[str] = frozenset()
+
+    @property
+    def action(self) -> int:
+        if self.inline:
+            return INLINE
+        if self.drop_empty:
+            return DROP_EMPTY_COLLAPSE if self.collapse else DROP_EMPTY
+        return COLLAPSE if self.collapse else KEEP
+
+
+@dataclass(frozen=True)
+class Shaping:
+    default: Shape = Shape()
+    rules: dict[str, Shape] = field(default_factory=dict)
+
+    def shape(self, non_terminal: str) -> Shape:
+        return self.rules.get(non_terminal, self.default)
+
+
+class ShapeBuilder(TreeBuilder):
+    """Builds the tree of a parse with the actions of a ShapedParser."""
+
+    def __init__(self, table: ParseTable, actions: list[int], expansions: list[tuple[int, ...]]) -> None:
+        super().__init__(table)
+        self._actions = actions
+        self.expansions = expansions
+
+    def enter(self, rule: int, pos: int) -> None:
+        parents = self.parents
+        parents.append(self.children)
+        action = self._actions[rule]
+        if action == INLINE and len(parents) > 1:
+            return
+        self.children = None if action == DROP and len(parents) > 1 else []
+
+    def exit(self, rule: int) -> None:
+        children = self.children
+        self.children = self.parents.pop()
+        action = self._actions[rule]
+        if not self.parents or action == KEEP:
+            self.children.append(ParseTree(self.names[rule], children))
+        elif action == INLINE or action == DROP:
+            pass
+        elif not children:
+            if action == COLLAPSE:
+                self.children.append(ParseTree(self.names[rule], children))
+        elif len(children) == 1 and action != DROP_EMPTY:
+            self.children.append(children[0])
+        else:
+            self.children.append(ParseTree(self.names[rule], children))
+
+
+class ShapedTree(ParseTree):
+    """
+    A node of a tree built without shapes, shaped by a ShapedParser. Its
+    children are shaped one kept node at a time when they are first read.
+    """
+
+    def __init__(self, tree: ParseTree, parser: "ShapedParser") -> None:
+        attributes = self.__dict__
+        attributes["id"] = tree.id
+        attributes["_pending"] = tree
+        attributes["_parser"] = parser
+
+    @property
+    def children(self) -> list[Union[Token, ParseTree]]:
+        attributes = self.__dict__
+        pending = attributes["_pending"]
+        if pending is not None:
+            attributes["_children"] = attributes["_parser"]._shape_children(pending)
+            attributes["_pending"] = attributes["_parser"] = None
+        return attributes["_children"]
+
+
+class ShapedParser:
+    """A Parser that builds its trees shaped by a Shaping."""
+
+    def __init__(self, parser: Parser, shaping: Shaping) -> None:
+        table = parser.table
+        self.parser = parser
+        self._table = table
+        # Per non-terminal name, for shaping trees that were built without shapes.
+        self._shapes = {
+            name: (shaping.shape(name).action, shaping.shape(name).drop_tokens)
+            for name in table.non_terminals
+            if SYNTHETIC not in name
+        }
+        # A dropped terminal t is encoded as ~(t + offset) in the expansions, see drive.
+        offset = len(table.terminals) + 1
+        # Groups, options and repetitions are shaped by the rule they are written in.
+        shapes = [shaping.shape(name.partition(SYNTHETIC)[0]) for name in table.names]
+        self._actions = [shape.action for shape in shapes]
+        self._expansions: list[tuple[int, ...]] = []
+        for idx, (shape, expansion) in enumerate(zip(shapes, table.expansions)):
+            dropped = {
+                table.terminal_ids[name]
+                for name in shape.drop_tokens
+                if name in table.terminal_ids
+            }
+            expansion = tuple(
+                ~(~symbol + offset) if symbol < 0 and ~symbol in dropped else symbol
+                for symbol in expansion
+            )
+            self._expansions.append(expansion)
+            if shape.action in (DROP_EMPTY, DROP_EMPTY_COLLAPSE) and all(
+                symbol >= table.marker or (symbol < 0 and ~symbol >= offset) for symbol in expansion
+            ):
+                self._actions[idx] = DROP
+
+    @property
+    def table(self) -> ParseTable:
+        return self._table
+
+    def builder(self) -> ShapeBuilder:
+        """Return a new builder of the trees this parser returns, for the drivers of other modules."""
+        return ShapeBuilder(self._table, self._actions, self._expansions)
+
+    def parse(self, source: Union[TokenSource, Lexer]) -> ParseTree:
+        """Parse like Parser.parse_tokens while shaping the tree."""
+        if not isinstance(source, TokenSource):
+            source = LexerTokenSource(source)
+        table = self._table
+        return build(table, source.chunks(table.terminal_ids, table.unknown), self.builder())
+
+    def shape(self, tree: ParseTree) -> ParseTree:
+        """Return the tree, built by the unshaped parser, as this parser would have built it."""
+        return ShapedTree(tree, self)
+
+    def _shape_children(self, tree: ParseTree) -> list[Union[Token, ParseTree]]:
+        # Shaped like ShapeBuilder.exit, with an explicit stack of the nodes whose
+        # children are not complete: (their children, dropped tokens, list, parent list).
+        shapes = self._shapes
+        result: list[Union[Token, ParseTree]] = []
+        stack: list[tuple[Iterator, frozenset[str], list, Optional[list], Optional[ParseTree]]] = [
+            (iter(tree.children), shapes[tree.id][1], result, None, None)
+        ]
+        while stack:
+            children, dropped, out, parent, node = stack[-1]
+            for child in children:
+                if not isinstance(child, ParseTree):
+                    if child.type not in dropped:
+                        out.append(child)
+                    continue
+                action, drop_tokens = shapes[child.id]
+                if action == KEEP:
+                    out.append(ShapedTree(child, self))
+                elif action == INLINE:
+                    stack.append((iter(child.children), drop_tokens, out, None, None))
+                    break
+                else:
+                    stack.append((iter(child.children), drop_tokens, [], out, child))
+                    break
+            else:
+                stack.pop()
+                if node is None:
+                    continue
+                action = shapes[node.id][0]
+                if not out:
+                    if action == COLLAPSE:
+                        parent.append(ParseTree(node.id, out))
+                elif len(out) == 1 and action != DROP_EMPTY:
+                    parent.append(out[0])
+                else:
+                    parent.append(ParseTree(node.id, out))
+        return result
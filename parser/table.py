@@ -0,0 +1,81 @@
+"""
+    A sparse ll(1) dispatch table compiled from the grammar analysis.
+
+    Non-terminals, terminals and rules are numbered as in the GrammarIR the
+    analysis ran on, so choosing an alternative is a single lookup:
+    rows[non_terminal].get(terminal, ERROR) gives the index of the rule to
+    expand, or ERROR if no rule predicts the terminal. A row only holds the
+    terminals its non-terminal predicts, so the table grows with the size of
+    the predict sets rather than with non-terminals times terminals.
+    Terminals the grammar does not know map to unknown, which is in no row.
+
+    Productions are the int tuples of the GrammarIR. A non-negative symbol is
+    a non-terminal id, a negative symbol ~t refers to the terminal with id t.
+
+    For stack based drivers every rule also has an expansion: the symbols of
+    its production in reverse order, preceded by an end marker. Markers are
+    numbered from len(non_terminals) upwards, so marker - len(non_terminals)
+    is the index of the rule that is completed when the marker is popped.
+
+    Rules of synthetic non-terminals, generated for groups, optional parts
+    and repetitions, are inline: their symbols become children of the
+    enclosing node, so their expansions have no marker and drivers do not
+    open a node for them. A rule loops if it is one iteration of a repetition,
+    that is if its production ends with its own synthetic non-terminal, and
+    a non-terminal repeats if one of its rules loops.
+"""
+from def_parser.parser import Rule, is_synthetic
+from analysis.analyzer import Analyzer
+from analysis.ir import terminal_set
+
+ERROR = -1
+
+
+class ParseTable:
+    def __init__(self, analysis: Analyzer) -> None:
+        ir = analysis.ir
+        self.non_terminals: list[str] = ir.non_terminals
+        self.terminals: list[str] = ir.terminals
+        self.non_terminal_ids: dict[str, int] = ir.non_terminal_ids
+        self.terminal_ids: dict[str, int] = ir.terminal_ids
+        self.unknown: int = len(self.terminals)
+        self.start: int = ir.start
+
+        self.rules: list[Rule] = ir.rules
+        self.names: list[str] = [ir.non_terminals[lhs] for lhs in ir.lhs]
+        self.productions: list[tuple[int, ...]] = ir.productions
+        self.marker: int = len(self.non_terminals)
+        self.synthetic: list[bool] = [is_synthetic(name) for name in self.non_terminals]
+        self.inline: list[bool] = [self.synthetic[lhs] for lhs in ir.lhs]
+        self.loops: list[bool] = [
+            inline and production[-1:] == (lhs,)
+            for inline, lhs, production in zip(self.inline, ir.lhs, self.productions)
+        ]
+        self.repeats: list[bool] = [False] * len(self.non_terminals)
+        for lhs, loops in zip(ir.lhs, self.loops):
+            self.repeats[lhs] = self.repeats[lhs] or loops
+        self.expansions: list[tuple[int, ...]] = [
+            tuple(reversed(production)) if inline else (self.marker + idx, *reversed(production))
+            for idx, (inline, production) in enumerate(zip(self.inline, self.productions))
+        ]
+        self.expects: list[frozenset[str]] = [
+            frozenset({terminal}) for terminal in self.terminals
+        ]
+        self._predict_bits: list[int] = analysis.predict_non_term_bits
+
+        self.rows: list[dict[int, int]] = [{} for _ in self.non_terminals]
+        for idx, (lhs, bits) in enumerate(zip(ir.lhs, analysis.predict_bits)):
+            row = self.rows[lhs]
+            # Only the set bits are visited, predict sets are usually small.
+            while bits:
+                low = bits & -bits
+                row.setdefault(low.bit_length() - 1, idx)
+                bits ^= low
+
+    def lookup(self, non_terminal: int, terminal: str) -> int:
+        """Return the index of the rule to expand, or ERROR."""
+        return self.rows[non_terminal].get(self.terminal_ids.get(terminal, self.unknown), ERROR)
+
+    def predict(self, non_terminal: int) -> set[str]:
+        """Return the names of the terminals non_terminal predicts, for error messages."""
+        return terminal_set(self.terminals, self._predict_bits[non_terminal])
@@ -0,0 +1,45 @@
+from parser.batch import parse_many
+from parser.parser import Parser, UnexpectedToken, Token
+from parser.shape import Shape, Shaping
+from parser.test_parser import TestLexer
+from def_parser.parser import parse
+from bnf import Grammar
+
+GRAMMAR = "e: p et; et: '+' p et | !; p: '1' | '(' e ')';"
+
+
+def test_parse_many_in_order() -> None:
+    parser = Parser(parse(GRAMMAR))
+    inputs = ["1", "1+1", "(1+1)+1", "1+", "(1)"] * 4
+    results = list(parse_many(parser, inputs, TestLexer, processes=2, chunksize=3))
+    assert [result.index for result in results] == list(range(len(inputs)))
+    for result, string in zip(results, inputs):
+        if string == "1+":
+            assert not result.ok
+            assert isinstance(result.error, UnexpectedToken)
+            assert result.error.token == Token("EOF", "", 2)
+        else:
+            assert result.ok
+            assert result.tree == parser.parse(TestLexer(string))
+
+
+def test_parse_many_unordered() -> None:
+    grammar = Grammar(GRAMMAR)
+    inputs = ["1+1"] * 10
+    results = list(grammar.parse_many(inputs, TestLexer, processes=2, ordered=False))
+    assert sorted(result.index for result in results) == list(range(10))
+    assert all(result.ok for result in results)
+
+
+def test_parse_many_builtin_lexer() -> None:
+    grammar = Grammar(GRAMMAR)
+    results = list(grammar.parse_many(["1 + 1", "(1)", "1 +"], processes=2))
+    assert [result.ok for result in results] == [True, True, False]
+    assert results[0].tree == grammar.parse("1 + 1")
+
+
+def test_parse_many_is_shaped() -> None:
+    grammar = Grammar(GRAMMAR, shaping=Shaping(Shape(collapse=True), {"et": Shape(inline=True)}))
+    inputs = ["1", "1+1", "(1+1)+1"]
+    results = list(grammar.parse_many(inputs, TestLexer, processes=2))
+    assert [result.tree for result in results] == [grammar.parse(TestLexer(string)) for string in inputs]
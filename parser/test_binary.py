@@ -0,0 +1,52 @@
+import pickle
+from parser.binary import BinaryTree, dump, dumps
+from parser.parser import Parser, ParseTree, Token
+from parser.test_parser import TestLexer
+from def_parser.parser import parse
+import pytest
+
+GRAMMAR = "e: p et; et: '+' p et | !; p: '1' | '(' e ')';"
+
+
+def test_round_trip() -> None:
+    parser = Parser(parse(GRAMMAR))
+    for string in ["1", "1+1", "(1+(1))+1"]:
+        tree = parser.parse(TestLexer(string))
+        assert BinaryTree(dumps(tree)).to_parse_tree() == tree
+    positions = [127, 128, 2**14 - 1, 2**14, 2**21 - 1, 2**21, 2**40]
+    tokens = [Token("word", "grüße" * (pos % 7), pos) for pos in positions]
+    tree = ParseTree("s", [*tokens, ParseTree("s", []), Token("", "", 0)])
+    assert BinaryTree(bytearray(dumps(tree))).to_parse_tree() == tree
+
+
+def test_lazy_navigation() -> None:
+    tree = BinaryTree(dumps(Parser(parse(GRAMMAR)).parse(TestLexer("(1)+1"))))
+    root = tree.root
+    assert root.id == "e"
+    p, et = root.children
+    open_paren, inner, close_paren = p.children
+    assert (open_paren.type, open_paren.value, open_paren.pos) == ("(", "(", 0)
+    assert inner.id == "e" and close_paren.to_token() == Token(")", ")", 2)
+    assert inner.to_parse_tree() == ParseTree(
+        "e", [ParseTree("p", [Token("1", "1", 1)]), ParseTree("et", [])]
+    )
+    plus, one, tail = et.children
+    assert (plus.value, one.id, tail.children) == ("+", "p", [])
+
+
+def test_file_and_size(tmp_path) -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1';"))
+    source = "+".join("1" * 50_000)
+    tree = parser.parse_iterative(TestLexer(source))
+    path = tmp_path / "tree.bin"
+    with open(path, "wb") as file:
+        dump(tree, file)
+    stored = BinaryTree.from_file(path)
+    assert stored.root.children[1].children[1].children[0].pos == 2
+    # Too deep for the recursive ==, so compare the encodings.
+    assert dumps(stored.to_parse_tree()) == path.read_bytes()
+    with pytest.raises(ValueError):
+        BinaryTree(b"not a tree")
+
+    tree = Parser(parse("list: 'x' { ',' 'x' } ;")).parse(TestLexer(",".join("x" * 10_000)))
+    assert len(dumps(tree)) * 3 < len(pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL))
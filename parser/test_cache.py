@@ -0,0 +1,93 @@
+import os
+from parser.cache import ParseCache, FrozenChildren
+from parser.parser import ParseTree, Token
+from parser.shape import Shape, Shaping
+from bnf import Grammar
+import pytest
+
+GRAMMAR = "e: p et; et: '+' p et | !; p: 'num' | '(' e ')';"
+PATTERNS = {"num": r"\d+"}
+
+
+def test_hits_skip_the_lexer(monkeypatch) -> None:
+    cache = ParseCache()
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS, parse_cache=cache)
+    tree = grammar.parse("1 + (2)")
+    assert tree == Grammar(GRAMMAR, patterns=PATTERNS).parse("1 + (2)")
+    assert (cache.stats.hits, cache.stats.misses) == (0, 1)
+
+    def fail(*args) -> None:
+        raise AssertionError("input lexed again")
+
+    monkeypatch.setattr(grammar._lexer_spec, "lexer", fail)
+    assert grammar.parse("1 + (2)") is tree
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+
+def test_trees_are_frozen() -> None:
+    tree = Grammar(GRAMMAR, patterns=PATTERNS, parse_cache=ParseCache()).parse("1+2")
+    assert isinstance(tree.children, FrozenChildren)
+    with pytest.raises(TypeError):
+        tree.children.append(Token("num", "3", 4))
+    with pytest.raises(TypeError):
+        tree.children[1].children[0] = None
+    assert hash(tree) == hash(tree)
+
+
+def test_size_counts_the_source() -> None:
+    cache = ParseCache()
+    text = " + ".join(["1"] * 10) + " " * 100000
+    Grammar(GRAMMAR, patterns=PATTERNS, parse_cache=cache).parse(text)
+    assert cache.size > len(text)
+
+    cache = ParseCache(max_bytes=len(text) // 2)
+    Grammar(GRAMMAR, patterns=PATTERNS, parse_cache=cache).parse(text)
+    assert len(cache) == 0
+
+
+def test_key_includes_grammar_and_start() -> None:
+    cache = ParseCache()
+    plain = Grammar(GRAMMAR, patterns=PATTERNS, parse_cache=cache)
+    shaped = Grammar(
+        GRAMMAR, patterns=PATTERNS, parse_cache=cache, shaping=Shaping(Shape(collapse=True))
+    )
+    assert plain.parse("1") != shaped.parse("1")
+    assert plain.parse("1", start="p") == ParseTree("p", [Token("num", "1", 0)])
+    assert cache.stats.misses == 3
+
+
+def test_eviction() -> None:
+    cache = ParseCache(max_entries=2)
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS, parse_cache=cache)
+    for text in ("1", "2", "1", "3", "2"):
+        grammar.parse(text)
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 4, 2)
+    assert len(cache) == 2
+
+    size = cache.size // 2
+    cache = ParseCache(max_bytes=size * 3)
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS, parse_cache=cache)
+    grammar.parse("1 + " * 100 + "1")
+    assert len(cache) == 0
+    for text in "12345":
+        grammar.parse(text)
+    assert len(cache) == 3 and cache.size <= size * 3
+
+
+def test_disk(tmp_path) -> None:
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS, parse_cache=ParseCache(directory=str(tmp_path)))
+    tree = grammar.parse("1 + 2")
+    assert len(os.listdir(tmp_path)) == 1
+
+    cache = ParseCache(directory=str(tmp_path))
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS, parse_cache=cache)
+    assert grammar.parse("1 + 2") == tree
+    assert cache.stats.disk_hits == 1
+    assert isinstance(grammar.parse("1 + 2").children, FrozenChildren)
+    assert grammar.parse("1 + 2").source_map.location(4) == (1, 5)
+    assert ParseCache(directory=str(tmp_path)).get(cache.key(grammar._identity, "e", "1 + 2")).source_map is None
+
+    path = tmp_path / os.listdir(tmp_path)[0]
+    path.write_bytes(b"garbage")
+    assert ParseCache(directory=str(tmp_path)).get(path.stem) is None
+    assert not path.exists()
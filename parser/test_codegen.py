@@ -0,0 +1,61 @@
+from types import ModuleType
+from typing import Union
+from parser.codegen import generate
+from parser.parser import Parser, ParseTree, Token
+from parser.test_parser import TestLexer
+from analysis.analyzer import Analyzer
+from def_parser.parser import parse
+from bnf import Grammar
+import pytest
+
+
+def load(grammar: str) -> ModuleType:
+    module = ModuleType("generated")
+    exec(generate(parse(grammar)), module.__dict__)
+    return module
+
+
+def plain(tree: Union[Token, ParseTree, object]) -> object:
+    """The ids, children and tokens of a tree built by either ParseTree class."""
+    if isinstance(tree, Token):
+        return tree
+    return (tree.id, [plain(child) for child in tree.children])
+
+
+def test_generated_matches_parser(grammar_inputs: tuple[str, list[str]]) -> None:
+    grammar, inputs = grammar_inputs
+    generated = load(grammar)
+    parser = Parser(parse(grammar))
+    for string in inputs:
+        assert plain(generated.parse(TestLexer(string))) == plain(parser.parse(TestLexer(string)))
+
+
+def test_generated_is_standalone() -> None:
+    source = generate(parse("e: p et; et: '+' p et | !; p: '1';"))
+    assert "Analyzer" not in source
+    assert "from parser" not in source and "import parser" not in source
+    assert "def parse_et(lexer):" in source
+    assert "class ParseTree" in source and "class Token" in source
+
+
+def test_generated_unexpected_token() -> None:
+    generated = load("e: p et; et: '+' p et | !; p: '1';")
+    with pytest.raises(generated.UnexpectedToken) as info:
+        generated.parse(TestLexer("1+x"))
+    assert info.value.expected == {"1"}
+
+
+def test_grammar_generate_uses_start() -> None:
+    grammar = Grammar("s: e ';' ; e: p et; et: '+' p et | !; p: '1';", start="e")
+    module = ModuleType("generated")
+    exec(grammar.generate(), module.__dict__)
+    assert "def parse_s(lexer):" not in grammar.generate()
+    assert plain(module.parse(TestLexer("1+1"))) == plain(grammar.parse(TestLexer("1+1")))
+
+
+def test_generate_start_with_analysis() -> None:
+    rules = parse("s: e ';' ; e: p et; et: '+' p et | !; p: '1';")
+    module = ModuleType("generated")
+    exec(generate(rules, "e", Analyzer(rules)), module.__dict__)
+    assert "def parse_s(lexer):" not in generate(rules, "e", Analyzer(rules))
+    assert plain(module.parse(TestLexer("1+1"))) == plain(Parser(rules, start="e").parse(TestLexer("1+1")))
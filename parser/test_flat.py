@@ -0,0 +1,40 @@
+from parser.flat import parse_flat
+from parser.parser import Parser
+from parser.test_parser import TestLexer
+from def_parser.parser import parse
+
+
+def test_flat_matches_parse_tree(grammar_inputs: tuple[str, list[str]]) -> None:
+    grammar, inputs = grammar_inputs
+    parser = Parser(parse(grammar))
+    for string in inputs:
+        tree = parse_flat(parser, TestLexer(string), string)
+        assert tree.to_parse_tree() == parser.parse(TestLexer(string))
+
+
+def test_flat_navigation() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1' | '(' e ')';"))
+    source = "(1)+1"
+    tree = parse_flat(parser, TestLexer(source), source)
+    root = tree.root
+    assert root.id == "e"
+    assert (root.start, root.end) == (0, 5)
+
+    p, et = root.children
+    assert p.id == "p" and (p.start, p.end) == (0, 3)
+    open_paren, inner, close_paren = p.children
+    assert (open_paren.type, open_paren.value, open_paren.pos) == ("(", "(", 0)
+    assert inner.id == "e" and (inner.start, inner.end) == (1, 2)
+    assert close_paren.value == ")"
+
+    plus, one, tail = et.children
+    assert (plus.value, one.id, one.children[0].pos) == ("+", "p", 4)
+    assert tail.children == [] and tail.start == tail.end == 5
+
+
+def test_flat_deep_input() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1';"))
+    source = "+".join("1" * 50_000)
+    tree = parse_flat(parser, TestLexer(source), source)
+    assert len(tree) == 1 + 3 * 50_000 + 50_000 - 1
+    assert tree.root.end == len(source)
@@ -0,0 +1,140 @@
+import random
+import time
+from parser.incremental import IncrementalParser, Edit, ShiftedTree
+from parser.parser import Parser, Lexer, Token, UnexpectedToken
+from def_parser.parser import parse
+from bnf import Grammar
+import pytest
+
+GRAMMAR = "e: p et; et: '+' p et | !; p: '1' | '2' | '(' e ')';"
+FLAT_GRAMMAR = "s: { t } ; t: '1' | '2' | '+' | '(' s ')' ;"
+
+
+class SpaceLexer(Lexer):
+    """Single character tokens, starting at pos and skipping spaces."""
+
+    def __init__(self, string: str, pos: int) -> None:
+        self._string = string
+        self._pos = pos
+        self._skip()
+
+    def _skip(self) -> None:
+        while self._pos < len(self._string) and self._string[self._pos] == " ":
+            self._pos += 1
+
+    def peek(self) -> Token:
+        if self._pos >= len(self._string):
+            return Token("EOF", "", self._pos)
+        return Token(self._string[self._pos], self._string[self._pos], self._pos)
+
+    def has(self, tokens: set[str]) -> bool:
+        return self.peek().type in tokens
+
+    def expect(self, tokens: set[str]) -> Token:
+        token = self.peek()
+        if token.type not in tokens:
+            raise UnexpectedToken(token, tokens)
+        self._pos += 1
+        self._skip()
+        return token
+
+
+def full_parse(parser: Parser, text: str):
+    return parser.parse_iterative(SpaceLexer(text, 0))
+
+
+def test_edit_reuses_subtrees() -> None:
+    parser = Parser(parse(GRAMMAR))
+    incremental = IncrementalParser(parser, SpaceLexer)
+    text = " + ".join(["(1+2)"] * 20)
+    incremental.parse(text)
+
+    offset = text.index("2", len(text) // 2)
+    tree = incremental.edit(Edit(offset, 1, "1 + 2"))
+    assert incremental.text == text[:offset] + "1 + 2" + text[offset + 1 :]
+    assert tree == full_parse(parser, incremental.text)
+    assert incremental.reused > 0
+
+
+@pytest.mark.parametrize("grammar", [GRAMMAR, FLAT_GRAMMAR])
+def test_random_edits(grammar: str) -> None:
+    parser = Parser(parse(grammar))
+    incremental = IncrementalParser(parser, SpaceLexer)
+    rng = random.Random(4)
+    text = " + ".join(["1 + (2 + 1) + 2"] * 4)
+    incremental.parse(text)
+    replacements = ["1", "2", " + 1", "(2)", "+ (1 + 2) ", " ", ""]
+    applied = 0
+    while applied < 200:
+        offset = rng.randrange(len(incremental.text) + 1)
+        removed = rng.randrange(min(3, len(incremental.text) - offset) + 1)
+        edit = Edit(offset, removed, rng.choice(replacements))
+        new_text = incremental.text[:offset] + edit.inserted + incremental.text[offset + removed :]
+        try:
+            expected = full_parse(parser, new_text)
+        except UnexpectedToken:
+            with pytest.raises(UnexpectedToken):
+                incremental.edit(edit)
+            continue
+        assert incremental.edit(edit) == expected
+        applied += 1
+
+
+def test_edit_before_parse() -> None:
+    incremental = IncrementalParser(Parser(parse(GRAMMAR)), SpaceLexer)
+    with pytest.raises(ValueError):
+        incremental.edit(Edit(0, 0, "1"))
+
+
+def test_edit_reuses_with_builtin_lexer() -> None:
+    grammar = Grammar(GRAMMAR)
+    incremental = grammar.incremental()
+    text = " + ".join(["(1+2)"] * 10)
+    incremental.parse(text)
+    tree = incremental.edit(Edit(text.index("2", len(text) // 2), 1, "1"))
+    assert tree == grammar.parse(incremental.text)
+    assert incremental.reused > 0
+
+
+def test_shift_is_applied_when_read() -> None:
+    parser = Parser(parse(GRAMMAR))
+    incremental = IncrementalParser(parser, SpaceLexer)
+    text = " + ".join(["(1+2)"] * 20)
+    incremental.parse(text)
+    tree = incremental.edit(Edit(1, 0, "2+"))
+    shifted = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ShiftedTree):
+            shifted.append(node)
+        else:
+            stack.extend(child for child in node.children if not isinstance(child, Token))
+    assert shifted and all(node._pending is not None for node in shifted)
+    assert tree == full_parse(parser, incremental.text)
+    assert all(node._pending is None for node in shifted)
+
+
+def test_edit_at_end_of_flat_list() -> None:
+    grammar = Grammar("prog: { stmt } ; stmt: 'id' '=' 'num' ';' ;", patterns={"id": r"[a-z]+", "num": r"\d+"})
+    text = "".join(f"x = {idx};\n" for idx in range(20000))
+    lexers = []
+
+    def lexer_factory(text: str, pos: int) -> Lexer:
+        lexers.append(pos)
+        return grammar.lexer(text, pos)
+
+    incremental = grammar.incremental(lexer_factory)
+    start = time.perf_counter()
+    incremental.parse(text)
+    full = time.perf_counter() - start
+
+    lexers.clear()
+    start = time.perf_counter()
+    tree = incremental.edit(Edit(len(text) - 3, 1, "42"))
+    elapsed = time.perf_counter() - start
+    # The statements before the edit are taken in one step, with one lexer after them.
+    assert len(lexers) <= 3
+    assert elapsed < full / 10
+    assert incremental.reused == 19999
+    assert tree == grammar.parse(incremental.text)
@@ -0,0 +1,178 @@
+from parser.lexer import LexerSpec
+from parser.parser import Token, ParseTree, UnexpectedToken
+from def_parser.lexer import UnexpectedCharacter
+from analysis.ir import UndefinedNonTerminal
+from bnf import Grammar
+import pytest
+
+
+def tokens(spec: LexerSpec, text: str) -> list[Token]:
+    lexer = spec.lexer(text)
+    result = []
+    while lexer.peek().type != "EOF":
+        result.append(lexer.expect({lexer.peek().type}))
+    return result
+
+
+def test_maximal_munch() -> None:
+    spec = LexerSpec(["=", "==", "<", "<="])
+    assert tokens(spec, "== = <= <") == [
+        Token("==", "==", 0),
+        Token("=", "=", 3),
+        Token("<=", "<=", 5),
+        Token("<", "<", 8),
+    ]
+
+
+def test_skip_patterns() -> None:
+    spec = LexerSpec(["a", "b"], skip=[r"\s+", r"#[^\n]*"])
+    assert tokens(spec, "a # comment\n  b#") == [Token("a", "a", 0), Token("b", "b", 14)]
+
+
+def test_patterns_and_keywords() -> None:
+    spec = LexerSpec(["if", "x", "num"], patterns={"x": r"[a-z]+", "num": r"[0-9]+"})
+    assert tokens(spec, "if iffy 42") == [
+        Token("if", "if", 0),
+        Token("x", "iffy", 3),
+        Token("num", "42", 8),
+    ]
+
+
+def test_start_position_and_errors() -> None:
+    spec = LexerSpec(["a"])
+    assert spec.lexer("a a", 1).peek() == Token("a", "a", 2)
+    with pytest.raises(UnexpectedCharacter):
+        tokens(spec, "a ?")
+    with pytest.raises(UnexpectedToken):
+        spec.lexer("a").expect({"b"})
+
+
+def test_chunks() -> None:
+    spec = LexerSpec(["if", "x", "num"], patterns={"x": r"[a-z]+", "num": r"[0-9]+"})
+    ids = {"EOF": 0, "if": 1, "num": 2, "x": 3}
+    chunks = list(spec.lexer(" if iffy 42 if ").chunks(ids, 4, size=2))
+    assert [list(chunk.types) for chunk in chunks] == [[1, 3], [2, 1], [0]]
+    assert [list(chunk.starts) for chunk in chunks] == [[1, 4], [9, 12], [15]]
+    assert chunks[0].token(1, ["EOF", "if", "num", "x"]) == Token("x", "iffy", 4)
+    with pytest.raises(UnexpectedCharacter):
+        list(spec.lexer("if ?").chunks(ids, 4))
+
+    chunks = spec.lexer("if 42 ?").chunks({"EOF": 0, "if": 1}, 2)
+    chunk = next(chunks)
+    assert list(chunk.types) == [1, 2]
+    assert chunk.token(1, ["EOF", "if"]) == Token("num", "42", 3)
+    with pytest.raises(UnexpectedCharacter):
+        next(chunks)
+
+
+def test_unknown_terminals_are_unexpected() -> None:
+    grammar = Grammar("s: e ';' ; e: 'a' 'a';", start="e")
+    with pytest.raises(UnexpectedToken) as error:
+        grammar.parse("a ;")
+    assert error.value.token == Token(";", ";", 2)
+    with pytest.raises(UnexpectedToken) as error:
+        Grammar("s: e ';' ; e: 'a' 'a';").parse("a ;", start="e")
+    assert error.value.token == Token(";", ";", 2)
+
+
+def test_syntax_error_before_lexical_error() -> None:
+    grammar = Grammar("e: p et; et: '+' p et | !; p: 'num' | '(' e ')';", patterns={"num": r"\d+"})
+    for source in ("1 + + 1 $", grammar._lexer_spec.lexer("1 + + 1 $")):
+        with pytest.raises(UnexpectedToken) as error:
+            grammar.parse(source)
+        assert error.value.token == Token("+", "+", 4)
+
+
+def test_grammar_parses_text() -> None:
+    grammar = Grammar("e: p et; et: '+' p et | !; p: 'num' | '(' e ')';", patterns={"num": r"\d+"})
+    assert grammar.parse("12 + 3") == ParseTree(
+        "e",
+        [
+            ParseTree("p", [Token("num", "12", 0)]),
+            ParseTree(
+                "et",
+                [Token("+", "+", 3), ParseTree("p", [Token("num", "3", 5)]), ParseTree("et", [])],
+            ),
+        ],
+    )
+
+
+def test_grammar_parses_deep_input() -> None:
+    grammar = Grammar("e: p et; et: '+' p et | !; p: 'num' | '(' e ')';", patterns={"num": r"\d+"})
+    text = "+".join("1" * 20000)
+    for source in (grammar.lexer(text), text.encode()):
+        token = grammar.parse(source).children[0].children[0]
+        assert (token.type, token.value, token.pos) == ("num", "1", 0)
+
+
+def test_grammar_start_symbols() -> None:
+    source = "s: 'let' 'id' '=' e ; e: 'num' | '(' 'num' ')' ; t: 'num' '+' 'num' ;"
+    grammar = Grammar(source, patterns={"num": r"\d+", "id": r"[a-z]+"})
+    tree = ParseTree("t", [Token("num", "1", 0), Token("+", "+", 2), Token("num", "2", 4)])
+    assert grammar.parse("1 + 2", start="t") == tree
+    assert grammar.for_start("t") is grammar.for_start("t")
+    assert grammar.for_start("t").for_start("s") is grammar
+    assert Grammar(source, patterns={"num": r"\d+"}, start="t").parse("1 + 2") == tree
+    with pytest.raises(UnexpectedToken):
+        grammar.parse("1 + 2")
+
+
+def test_source_maps(tmp_path) -> None:
+    grammar = Grammar("e: p et; et: '+' p et | !; p: 'num' | '(' e ')';", patterns={"num": r"\d+"})
+    tree = grammar.parse("1 +\n (2)")
+    assert tree.source_map.location(tree.children[1].children[1].children[0].pos) == (2, 2)
+    assert tree.children[0].source_map is None
+
+    with pytest.raises(UnexpectedToken) as error:
+        grammar.parse("1 +\n (2 3")
+    assert error.value.location == (2, 5)
+    path = tmp_path / "input"
+    path.write_bytes("ä +\n(".encode())
+    with pytest.raises(UnexpectedCharacter) as char_error:
+        grammar.parse_file(str(path))
+    assert char_error.value.location == (1, 1)
+    with pytest.raises(UnexpectedToken) as error:
+        grammar.parse(b"1 +\n(")
+    assert error.value.location == (2, 2)
+
+    with pytest.raises(UndefinedNonTerminal) as undefined:
+        Grammar("e: p ;\np: q ;")
+    assert undefined.value.location == (2, 4)
+
+
+def test_bytes_lexer_offsets() -> None:
+    spec = LexerSpec(["é", "+", "num"], patterns={"num": r"[0-9]+"})
+    for buffer in [b"\xc3\xa9 + 12", bytearray(b"\xc3\xa9 + 12"), memoryview(b"\xc3\xa9 + 12")]:
+        lexer = spec.bytes_lexer(buffer)
+        first = lexer.expect({"é"})
+        second = lexer.expect({"+"})
+        third = lexer.expect({"num"})
+        assert [(t.type, t.pos, t.end, t.value) for t in (first, second, third)] == [
+            ("é", 0, 2, "é"),
+            ("+", 3, 4, "+"),
+            ("num", 5, 7, "12"),
+        ]
+        assert lexer.peek().type == "EOF"
+
+
+def test_grammar_parses_mmap_file(tmp_path) -> None:
+    grammar = Grammar("e: p et; et: '+' p et | !; p: 'num' | '(' e ')';", patterns={"num": r"\d+"})
+    path = tmp_path / "input.txt"
+    path.write_bytes(b"(1 + 22) + 333")
+    tree = grammar.parse_file(str(path))
+    text_tree = grammar.parse("(1 + 22) + 333")
+
+    def leaves(tree) -> list[tuple[str, str, int]]:
+        result = []
+        for child in tree.children:
+            if isinstance(child, ParseTree):
+                result.extend(leaves(child))
+            else:
+                result.append((child.type, child.value, child.pos))
+        return result
+
+    assert leaves(tree) == leaves(text_tree)
+
+    path.write_bytes(b"")
+    with pytest.raises(UnexpectedToken):
+        grammar.parse_file(str(path))
@@ -0,0 +1,69 @@
+from parser.parallel import boundaries
+from parser.lexer import LexerSpec
+from parser.parser import Token, UnexpectedToken
+from parser.shape import Shape, Shaping
+from bnf import Grammar
+import pytest
+
+GRAMMAR = """
+file: { record } ;
+record: 'begin' 'name' { field } 'end' ;
+field: 'name' '=' val ';' ;
+val: 'num' | 'str' ;
+"""
+PATTERNS = {"name": r"[a-z_]\w*", "num": r"\d+", "str": r'"[^"]*"'}
+
+
+def source(count: int) -> str:
+    return "".join(
+        f'begin r{idx} a = {idx}; b = "not a begin";\nend\n' for idx in range(count)
+    )
+
+
+def test_boundaries() -> None:
+    text = source(10)
+    starts = boundaries(text, LexerSpec(["begin"], patterns=PATTERNS), "begin", 4)
+    assert starts[0] == 0 and starts == sorted(set(starts))
+    assert all(text.startswith("begin", start) for start in starts)
+
+
+def test_parallel_matches_serial() -> None:
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS)
+    text = source(50)
+    # Many parts, so some cuts fall on the 'begin' inside a string.
+    tree = grammar.parse_parallel(text, "record", "begin", processes=2, parts=37)
+    assert tree == grammar.parse(text)
+    assert len(tree.children) == 50
+
+
+def test_parallel_is_shaped() -> None:
+    grammar = Grammar(
+        GRAMMAR,
+        patterns=PATTERNS,
+        shaping=Shaping(
+            Shape(collapse=True, drop_tokens=frozenset({"begin", "end", "=", ";"})),
+            {"record": Shape(drop_tokens=frozenset({"begin", "end"}))},
+        ),
+    )
+    text = source(20)
+    assert grammar.parse_parallel(text, "record", "begin", processes=2, parts=9) == grammar.parse(text)
+
+
+def test_parallel_with_separators() -> None:
+    grammar = Grammar(
+        "file: record { ';' record } ; record: 'begin' 'num' { 'num' } ;", patterns={"num": r"\d+"}
+    )
+    text = " ; ".join(f"begin {idx} 1 2" for idx in range(40))
+    assert grammar.parse_parallel(text, "record", "begin", processes=2, parts=9) == grammar.parse(text)
+    with pytest.raises(UnexpectedToken):
+        grammar.parse_parallel(text + " ; ;", "record", "begin", processes=2, parts=9)
+
+
+def test_parallel_file(tmp_path) -> None:
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS)
+    path = tmp_path / "records.txt"
+    text = source(20)
+    path.write_text(text)
+    tree = grammar.parse_parallel(path, "record", "begin", processes=2, parts=7)
+    assert tree == grammar.parse(text)
+    assert tree.children[1].children[0] == Token("begin", "begin", text.index("begin r1"))
@@ -1,5 +1,8 @@
-from parser.parser import Parser, Lexer, Token, ParseTree, UnexpectedToken
+from parser.parser import Parser, Lexer, Token, ParseTree, UnexpectedToken, Event, EventType
+from parser.parser import LexerTokenSource, AmbiguousGrammarError
+from parser.table import ERROR
 from def_parser.parser import parse
+import pytest
 
 class TestLexer(Lexer):
     def __init__(self, string: str) -> None:
@@ -60,4 +63,179 @@ def test_parser2() -> None:
                 ]
             )
         ]
-    )
\ No newline at end of file
+    )
+
+def test_compiled_matches_interpreted(grammar_inputs: tuple[str, list[str]]) -> None:
+    grammar, inputs = grammar_inputs
+    rules = parse(grammar)
+    compiled = Parser(rules)
+    interpreted = Parser(rules, compiled=False)
+    for string in inputs:
+        assert compiled.parse(TestLexer(string)) == interpreted.parse(TestLexer(string))
+
+
+def test_table_is_built_on_first_use() -> None:
+    rules = parse("e: p et; et: '+' p et | !; p: '1';")
+    interpreted = Parser(rules, compiled=False)
+    interpreted.parse(TestLexer("1+1"))
+    assert interpreted._table is None
+    assert interpreted.parse_iterative(TestLexer("1+1")) == interpreted.parse(TestLexer("1+1"))
+    assert interpreted._table is interpreted.table
+
+
+def test_compiled_unexpected_token() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1';"))
+    with pytest.raises(UnexpectedToken) as info:
+        parser.parse(TestLexer("1+x"))
+    assert info.value.token == Token("x", "x", 2)
+    assert info.value.expected == {"1"}
+
+
+def test_iterative_matches_recursive(grammar_inputs: tuple[str, list[str]]) -> None:
+    grammar, inputs = grammar_inputs
+    parser = Parser(parse(grammar))
+    for string in inputs:
+        expected = parser.parse_recursive(TestLexer(string))
+        assert parser.parse(TestLexer(string)) == expected
+        assert parser.parse_iterative(TestLexer(string)) == expected
+        assert parser.parse_tokens(TestLexer(string)) == expected
+
+
+def test_iterative_deep_input() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1';"))
+    count = 100_000
+    tree = parser.parse_iterative(TestLexer("+".join("1" * count)))
+    depth = 0
+    node = tree.children[1]
+    while node.children:
+        depth += 1
+        node = node.children[2]
+    assert depth == count - 1
+
+
+def test_parse_deep_input() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1';"))
+    text = "+".join("1" * 20_000)
+    assert parser.parse(TestLexer(text)).children[0] == ParseTree("p", [Token("1", "1", 0)])
+    with pytest.raises(RecursionError):
+        parser.parse_recursive(TestLexer(text))
+
+
+def test_iterative_unexpected_token() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1';"))
+    with pytest.raises(UnexpectedToken):
+        parser.parse_iterative(TestLexer("1++1"))
+
+
+def test_parse_tokens_through_adapter() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1' | '(' e ')';"))
+    for string in ["1", "1+1", "(1+1)+(1)"]:
+        expected = parser.parse(TestLexer(string))
+        assert parser.parse_tokens(TestLexer(string)) == expected
+        assert parser.parse_tokens(LexerTokenSource(TestLexer(string), size=2)) == expected
+    with pytest.raises(UnexpectedToken) as error:
+        parser.parse_tokens(LexerTokenSource(TestLexer("1+)"), size=2))
+    assert error.value.token == Token(")", ")", 2)
+
+
+def test_token_offsets_past_2_gib() -> None:
+    far = 2**32
+
+    class FarLexer(TestLexer):
+        def peek(self) -> Token:
+            token = super().peek()
+            return Token(token.type, token.value, token.pos + far)
+
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1';"))
+    tree = parser.parse_tokens(LexerTokenSource(FarLexer("1+1"), size=2))
+    assert tree.children[0].children[0] == Token("1", "1", far)
+
+
+EBNF = "list: '[' [ item { ',' item } ] ']' ; item: 'x' | ( 'a' | 'b' ) [ 'c' ] ;"
+
+
+def test_ebnf_children_are_flat() -> None:
+    compiled = Parser(parse(EBNF))
+    interpreted = Parser(parse(EBNF), compiled=False)
+    assert compiled.parse(TestLexer("[x,ac,b]")) == ParseTree(
+        "list",
+        [
+            Token("[", "[", 0),
+            ParseTree("item", [Token("x", "x", 1)]),
+            Token(",", ",", 2),
+            ParseTree("item", [Token("a", "a", 3), Token("c", "c", 4)]),
+            Token(",", ",", 5),
+            ParseTree("item", [Token("b", "b", 6)]),
+            Token("]", "]", 7),
+        ],
+    )
+    for string in ["[]", "[x]", "[x,ac,b]"]:
+        expected = compiled.parse(TestLexer(string))
+        assert interpreted.parse(TestLexer(string)) == expected
+        assert compiled.parse_iterative(TestLexer(string)) == expected
+        assert compiled.parse_tokens(TestLexer(string)) == expected
+    with pytest.raises(UnexpectedToken):
+        compiled.parse(TestLexer("[x,]"))
+
+
+def test_ebnf_repetition_is_a_loop() -> None:
+    parser = Parser(parse("list: 'x' { ',' 'x' } ;"))
+    count = 10_000
+    tree = parser.parse(TestLexer(",".join("x" * count)))
+    assert len(tree.children) == 2 * count - 1
+
+
+def test_for_start() -> None:
+    rules = parse("s: e ';' ; e: p et; et: '+' p et | !; p: '1' | '(' e ')'; x: 'a' | 'a' ;")
+    for compiled in (True, False):
+        parser = Parser(rules, compiled)
+        assert parser.start == "s"
+        expression = parser.for_start("e")
+        assert expression is parser.for_start("e")
+        assert expression.for_start("s") is parser
+        assert expression.table.non_terminals == ["e", "et", "p"]
+        assert expression.parse(TestLexer("(1)+1")) == parser.parse(TestLexer("(1)+1;")).children[0]
+        with pytest.raises(UnexpectedToken):
+            expression.parse(TestLexer("1;"))
+        with pytest.raises(AmbiguousGrammarError):
+            parser.for_start("x")
+
+
+def test_events() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1';"))
+    events = list(parser.events(TestLexer("1+1")))
+    assert events == [
+        Event(EventType.ENTER, "e"),
+        Event(EventType.ENTER, "p"),
+        Event(EventType.TOKEN, Token("1", "1", 0)),
+        Event(EventType.EXIT, "p"),
+        Event(EventType.ENTER, "et"),
+        Event(EventType.TOKEN, Token("+", "+", 1)),
+        Event(EventType.ENTER, "p"),
+        Event(EventType.TOKEN, Token("1", "1", 2)),
+        Event(EventType.EXIT, "p"),
+        Event(EventType.ENTER, "et"),
+        Event(EventType.EXIT, "et"),
+        Event(EventType.EXIT, "et"),
+        Event(EventType.EXIT, "e"),
+    ]
+
+
+def test_events_are_lazy() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1';"))
+    events = parser.events(TestLexer("1+1+x"))
+    assert next(events) == Event(EventType.ENTER, "e")
+    assert next(events) == Event(EventType.ENTER, "p")
+    assert next(events) == Event(EventType.TOKEN, Token("1", "1", 0))
+    with pytest.raises(UnexpectedToken):
+        list(events)
+
+
+def test_table_rows_are_sparse() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1' | '(' e ')';"))
+    table = parser.table
+    et = table.non_terminal_ids["et"]
+    assert {table.terminals[terminal] for terminal in table.rows[et]} == {"+", ")", "EOF"}
+    assert table.lookup(et, "1") == ERROR
+    assert table.lookup(et, "unknown") == ERROR
+    assert table.predict(et) == {"+", ")", "EOF"}
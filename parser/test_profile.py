@@ -0,0 +1,70 @@
+from parser.profile import ParseStats, profile_parse
+from parser.parser import Parser, UnexpectedToken
+from parser.test_parser import TestLexer
+from def_parser.parser import parse
+from bnf import Grammar
+import pytest
+
+GRAMMAR = "e: p et; et: '+' p et | !; p: '1' | '(' e ')';"
+
+
+def test_profile_matches_parse(grammar_inputs: tuple[str, list[str]]) -> None:
+    grammar, inputs = grammar_inputs
+    parser = Parser(parse(grammar))
+    for string in inputs:
+        tree = profile_parse(parser, TestLexer(string), ParseStats())
+        assert tree == parser.parse(TestLexer(string))
+
+
+def test_profile_counts() -> None:
+    rules = parse(GRAMMAR)
+    parser = Parser(rules)
+    stats = ParseStats()
+    profile_parse(parser, TestLexer("(1+1)+1"), stats)
+    assert stats.expansions == {"e": 2, "p": 4, "et": 4}
+    assert stats.predictions[rules[1]] == 2
+    assert stats.predictions[rules[2]] == 2
+    assert stats.predictions[rules[3]] == 3
+    assert stats.predictions[rules[4]] == 1
+    assert stats.lexer_calls["expect"] == 7
+    assert stats.lexer_calls["peek"] == 10
+
+    assert stats.cumulative_ns["e"] >= stats.cumulative_ns["p"]
+    assert stats.cumulative_ns["e"] >= sum(stats.self_ns.values()) - stats.self_ns["e"]
+    assert sum(stats.stacks.values()) == sum(stats.self_ns.values())
+    assert ("e", "p", "e", "et", "et") in stats.stacks
+
+
+def test_profile_interns_stacks() -> None:
+    recorded = []
+
+    class Recording(ParseStats):
+        def record(self, frame, rule, cumulative_ns, self_ns, outermost) -> None:
+            super().record(frame, rule, cumulative_ns, self_ns, outermost)
+            recorded.append((frame, rule.id))
+
+    stats = Recording()
+    profile_parse(Parser(parse(GRAMMAR)), TestLexer("1+1+1"), stats)
+    assert all(stats.stack(frame)[-1] == name for frame, name in recorded)
+    # e, e;p, then per nested et its own stack and the stack of its p.
+    assert len({frame for frame, _ in recorded}) == len(stats.stacks) == 7
+
+
+def test_profile_collapsed() -> None:
+    stats = ParseStats()
+    profile_parse(Parser(parse(GRAMMAR)), TestLexer("1+1"), stats)
+    lines = stats.collapsed().splitlines()
+    stacks = [line.rsplit(" ", 1)[0] for line in lines]
+    assert stacks == ["e", "e;et", "e;et;et", "e;et;p", "e;p"]
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert "lexer calls" in stats.report()
+
+
+def test_profile_accumulates_and_raises() -> None:
+    grammar = Grammar(GRAMMAR)
+    tree, stats = grammar.profile("1 + 1")
+    assert tree == grammar.parse("1 + 1")
+    grammar.profile("1", stats)
+    assert stats.expansions["e"] == 2
+    with pytest.raises(UnexpectedToken):
+        grammar.profile("1 +", stats)
@@ -0,0 +1,114 @@
+import asyncio
+from parser.push import PushParser
+from parser.parser import Parser, Token, UnexpectedToken
+from parser.test_parser import TestLexer
+from def_parser.parser import parse
+from def_parser.lexer import UnexpectedCharacter
+from bnf import Grammar
+import pytest
+
+GRAMMAR = "e: p et; et: '+' p et | !; p: 'num' | '(' e ')' | 'if' | 'iffy';"
+PATTERNS = {"num": r"\d+"}
+
+
+def test_push_tokens() -> None:
+    parser = Parser(parse("e: p et; et: '+' p et | !; p: '1' | '(' e ')';"))
+    push = PushParser(parser)
+    lexer = TestLexer("(1+1)")
+    while lexer.peek().type != "EOF":
+        push.push(lexer.expect({lexer.peek().type}))
+    assert not push.done
+    assert push.close() == parser.parse(TestLexer("(1+1)"))
+    assert push.done
+
+
+def test_push_matches_parse(grammar_inputs: tuple[str, list[str]]) -> None:
+    grammar, inputs = grammar_inputs
+    parser = Parser(parse(grammar))
+    for string in inputs:
+        push = PushParser(parser)
+        lexer = TestLexer(string)
+        while lexer.peek().type != "EOF":
+            push.push(lexer.expect({lexer.peek().type}))
+        assert push.close() == parser.parse(TestLexer(string))
+
+
+def test_push_reports_errors_early() -> None:
+    push = PushParser(Parser(parse("e: p et; et: '+' p et | !; p: '1';")))
+    push.push(Token("1", "1", 0))
+    push.push(Token("+", "+", 1))
+    with pytest.raises(UnexpectedToken) as error:
+        push.push(Token("+", "+", 2))
+    assert error.value.token == Token("+", "+", 2)
+    with pytest.raises(UnexpectedToken):
+        push.close()
+
+
+def test_push_done_before_eof() -> None:
+    push = PushParser(Parser(parse("s: 'a' 'b';")))
+    push.push(Token("a", "a", 0))
+    push.push(Token("b", "b", 1))
+    assert push.done and push.tree is not None
+    with pytest.raises(UnexpectedToken):
+        push.push(Token("a", "a", 2))
+
+
+def test_feed_splits_tokens() -> None:
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS)
+    text = "(12 + iffy) + if + 345"
+    expected = grammar.parse(text)
+    for size in range(1, 6):
+        push = grammar.push_parser()
+        for idx in range(0, len(text), size):
+            push.feed(text[idx : idx + size])
+        assert push.close() == expected
+
+
+def test_feed_errors() -> None:
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS)
+    push = grammar.push_parser()
+    with pytest.raises(UnexpectedToken) as error:
+        push.feed("1 + + 2 + 3")
+    assert error.value.token == Token("+", "+", 4)
+
+    push = grammar.push_parser()
+    push.feed("1 + ")
+    with pytest.raises(UnexpectedCharacter) as char_error:
+        push.feed("? ")
+    assert char_error.value.pos == 4
+
+
+def test_feed_holds_back_incomplete_text() -> None:
+    grammar = Grammar("s: 'str' 'str' ;", patterns={"str": r'"[^"]*"'})
+    push = grammar.push_parser()
+    push.feed('"a b')
+    push.feed(' c" "d')
+    push.feed('"')
+    assert [token.value for token in push.close().children] == ['"a b c"', '"d"']
+
+    push = grammar.push_parser()
+    push.feed('"a" ')
+    with pytest.raises(UnexpectedCharacter) as char_error:
+        push.feed('? "b')
+    assert char_error.value.pos == 4
+
+
+def test_parse_stream() -> None:
+    grammar = Grammar(GRAMMAR, patterns=PATTERNS)
+    text = "(1 + 22) + 333 + (iffy)"
+
+    async def chunks():
+        for idx in range(0, len(text), 3):
+            await asyncio.sleep(0)
+            yield text[idx : idx + 3]
+
+    async def reader() -> asyncio.StreamReader:
+        stream = asyncio.StreamReader()
+        stream.feed_data(text.encode())
+        stream.feed_eof()
+        return await grammar.parse_stream(stream)
+
+    async def both():
+        return await asyncio.gather(grammar.parse_stream(chunks()), reader())
+
+    assert asyncio.run(both()) == [grammar.parse(text)] * 2
@@ -0,0 +1,152 @@
+import asyncio
+from parser.incremental import Edit
+from parser.shape import Shape, Shaping, ShapedParser
+from parser.parser import Parser, ParseTree, Token, UnexpectedToken
+from parser.test_parser import TestLexer
+from def_parser.parser import parse
+from bnf import Grammar
+import pytest
+
+GRAMMAR = "e: p et; et: '+' p et | !; p: '1' | '(' e ')';"
+
+
+def shaped(shaping: Shaping, string: str) -> ParseTree:
+    return ShapedParser(Parser(parse(GRAMMAR)), shaping).parse(TestLexer(string))
+
+
+def test_default_shape_keeps_tree() -> None:
+    parser = Parser(parse(GRAMMAR))
+    for string in ["1", "1+1", "(1+1)+1"]:
+        assert ShapedParser(parser, Shaping()).parse(TestLexer(string)) == parser.parse(TestLexer(string))
+
+
+def test_drop_empty_and_collapse() -> None:
+    tree = shaped(Shaping(Shape(drop_empty=True, collapse=True)), "1+1")
+    assert tree == ParseTree(
+        "e", [Token("1", "1", 0), ParseTree("et", [Token("+", "+", 1), Token("1", "1", 2)])]
+    )
+    tree = shaped(Shaping(Shape(drop_empty=True)), "1")
+    assert tree == ParseTree("e", [ParseTree("p", [Token("1", "1", 0)])])
+    tree = shaped(Shaping(Shape(collapse=True)), "1")
+    assert tree == ParseTree("e", [Token("1", "1", 0), ParseTree("et", [])])
+
+
+def test_inline_tail_and_drop_tokens() -> None:
+    shaping = Shaping(
+        Shape(collapse=True, drop_tokens=frozenset({"(", ")"})),
+        {"et": Shape(inline=True, drop_tokens=frozenset({"+"}))},
+    )
+    tree = shaped(shaping, "(1+1)+1+1")
+    assert tree == ParseTree(
+        "e",
+        [
+            ParseTree("e", [Token("1", "1", 1), Token("1", "1", 3)]),
+            Token("1", "1", 6),
+            Token("1", "1", 8),
+        ],
+    )
+
+
+def test_dropped_tokens_are_checked() -> None:
+    shaping = Shaping(Shape(drop_tokens=frozenset({"(", ")"})))
+    with pytest.raises(UnexpectedToken) as error:
+        shaped(shaping, "(1+1")
+    assert error.value.token == Token("EOF", "", 4)
+
+
+def test_grammar_shaping() -> None:
+    grammar = Grammar(
+        "list: '[' items ']'; items: 'num' tail | !; tail: ',' 'num' tail | !;",
+        patterns={"num": r"\d+"},
+        shaping=Shaping(
+            Shape(drop_tokens=frozenset({"[", "]"})),
+            {"items": Shape(inline=True), "tail": Shape(inline=True, drop_tokens=frozenset({","}))},
+        ),
+    )
+    assert grammar.parse("[1, 2, 3]") == ParseTree(
+        "list", [Token("num", "1", 1), Token("num", "2", 4), Token("num", "3", 7)]
+    )
+    assert grammar.parse("[]") == ParseTree("list", [])
+
+
+def test_drop_empty_rules_without_kept_tokens() -> None:
+    grammar = Grammar(
+        "s: 'a' sep s | !; sep: ',';",
+        shaping=Shaping(Shape(drop_empty=True), {"sep": Shape(drop_empty=True, drop_tokens=frozenset({","}))}),
+    )
+    assert grammar.parse("a,a,") == ParseTree(
+        "s", [Token("a", "a", 0), ParseTree("s", [Token("a", "a", 2)])]
+    )
+    assert grammar.parse("") == ParseTree("s", [])
+
+
+def test_parse_file_is_shaped(tmp_path) -> None:
+    grammar = Grammar(
+        "list: '[' items ']'; items: 'num' tail | !; tail: ',' 'num' tail | !;",
+        patterns={"num": r"\d+"},
+        shaping=Shaping(Shape(drop_tokens=frozenset({"[", "]"})), {"items": Shape(inline=True)}),
+    )
+    path = tmp_path / "input"
+    path.write_bytes(b"[1, 2]")
+    tree = grammar.parse_file(str(path))
+    assert tree.id == "list"
+    assert [child.type for child in tree.children[:1]] == ["num"]
+    assert tree.children[1].id == "tail" and tree.children[1].children[1].value == "2"
+
+
+def test_drop_tokens_inside_ebnf() -> None:
+    grammar = Grammar(
+        "list: '[' [ 'x' { ',' 'x' } ] ']' ;",
+        shaping=Shaping(rules={"list": Shape(drop_tokens=frozenset({",", "[", "]"}))}),
+    )
+    assert grammar.parse("[x, x, x]") == ParseTree(
+        "list", [Token("x", "x", 1), Token("x", "x", 4), Token("x", "x", 7)]
+    )
+    assert grammar.parse("[]") == ParseTree("list", [])
+
+
+def test_shape_matches_shaped_parse() -> None:
+    parser = Parser(parse(GRAMMAR))
+    shapings = [
+        Shaping(Shape(drop_empty=True, collapse=True)),
+        Shaping(Shape(collapse=True), {"p": Shape(drop_empty=True)}),
+        Shaping(
+            Shape(collapse=True, drop_tokens=frozenset({"(", ")"})),
+            {"et": Shape(inline=True, drop_tokens=frozenset({"+"}))},
+        ),
+    ]
+    for shaping in shapings:
+        shaped_parser = ShapedParser(parser, shaping)
+        for string in ["1", "1+1", "((1+1)+1)+1"]:
+            assert shaped_parser.shape(parser.parse_iterative(TestLexer(string))) == shaped_parser.parse(
+                TestLexer(string)
+            )
+
+
+def test_grammar_apis_are_shaped() -> None:
+    grammar = Grammar(
+        "e: p et; et: '+' p et | !; p: 'num' | '(' e ')';",
+        patterns={"num": r"\d+"},
+        shaping=Shaping(
+            Shape(collapse=True, drop_tokens=frozenset({"(", ")"})),
+            {"et": Shape(inline=True, drop_tokens=frozenset({"+"}))},
+        ),
+    )
+    text = "(1 + 2) + 3"
+    tree = grammar.parse(text)
+    assert grammar.profile(text)[0] == tree
+
+    push = grammar.push_parser()
+    push.feed(text)
+    assert push.close() == tree
+
+    async def chunks():
+        yield text[:4]
+        yield text[4:]
+
+    assert asyncio.run(grammar.parse_stream(chunks())) == tree
+
+    incremental = grammar.incremental()
+    assert incremental.parse("(1 + 2) + 4") == grammar.parse("(1 + 2) + 4")
+    assert incremental.edit(Edit(10, 1, "3")) == tree
+    assert incremental.tree == tree